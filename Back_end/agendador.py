@@ -0,0 +1,277 @@
+"""
+Agendador de tarefas periódicas dentro do servidor web
+
+O deploy (Railway) não tem cron, e o servidor pode rodar em várias
+réplicas. Cada réplica roda este agendador numa thread, mas só uma executa
+cada tarefa por vez:
+- antes de executar, a réplica tenta pg_try_advisory_lock(chave da tarefa);
+  quem não consegue o lock pula a rodada;
+- com o lock, confere na tabela tarefa_agendada se a execução já venceu
+  (outra réplica pode ter acabado de rodar) e grava a próxima ao terminar;
+- após um período sem servidor no ar, a tarefa atrasada roda uma vez logo
+  na subida (execuções perdidas são condensadas em uma).
+
+Uso:
+    python -m Back_end.agendador            # lista as tarefas e o estado no banco
+    python -m Back_end.agendador run NOME   # executa uma tarefa agora (sem lock)
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from Back_end.config import settings
+from Back_end.database import get_connection
+
+# ===== CONFIGURAÇÕES =====
+# Frequência com que a thread confere se alguma tarefa venceu
+TICK_SEGUNDOS = float(os.getenv("AGENDADOR_TICK", "15"))
+# Variação aleatória (fração do intervalo) para as réplicas não baterem juntas
+JITTER = float(os.getenv("AGENDADOR_JITTER", "0.1"))
+# Primeiro argumento do advisory lock de dois inteiros: separa estes locks de outros usos
+NAMESPACE_LOCK = 5150
+
+
+class Tarefa:
+    """Tarefa periódica registrada no agendador, com métricas deste processo."""
+
+    def __init__(self, nome, funcao, intervalo):
+        self.nome = nome
+        self.funcao = funcao
+        self.intervalo = intervalo
+        self.chave = chave_lock(nome)
+        self.proxima_verificacao = 0.0
+        self.execucoes = 0
+        self.falhas = 0
+        self.puladas = 0
+        self.duracao_total_ms = 0.0
+        self.duracao_max_ms = 0.0
+        self.ultima_duracao_ms = None
+        self.ultima_execucao_em = None
+        self.ultimo_erro = None
+
+    def registrar_execucao(self, duracao_ms, erro=None):
+        self.execucoes += 1
+        self.duracao_total_ms += duracao_ms
+        self.duracao_max_ms = max(self.duracao_max_ms, duracao_ms)
+        self.ultima_duracao_ms = duracao_ms
+        self.ultima_execucao_em = datetime.now().isoformat(timespec="seconds")
+        if erro is not None:
+            self.falhas += 1
+            self.ultimo_erro = str(erro)[:200]
+
+    def como_dict(self):
+        media = self.duracao_total_ms / self.execucoes if self.execucoes else 0.0
+        return {
+            "intervalo_s": self.intervalo,
+            "execucoes": self.execucoes,
+            "falhas": self.falhas,
+            "puladas": self.puladas,
+            "duracao_media_ms": round(media, 2),
+            "duracao_max_ms": round(self.duracao_max_ms, 2),
+            "ultima_duracao_ms": round(self.ultima_duracao_ms, 2) if self.ultima_duracao_ms is not None else None,
+            "ultima_execucao_em": self.ultima_execucao_em,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+def chave_lock(nome):
+    """Chave int4 estável (entre processos e deploys) para o advisory lock da tarefa."""
+    chave = zlib.crc32(nome.encode("utf-8"))
+    return chave - 2 ** 32 if chave >= 2 ** 31 else chave
+
+
+class Agendador:
+    def __init__(self, relogio=time.monotonic):
+        self.tarefas = {}
+        self._relogio = relogio
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, funcao, intervalo):
+        """Registra `funcao` (sem argumentos) para rodar a cada `intervalo` segundos."""
+        with self._lock:
+            self.tarefas[nome] = Tarefa(nome, funcao, intervalo)
+
+    def _agendar_verificacao(self, tarefa):
+        variacao = random.uniform(1 - JITTER, 1 + JITTER)
+        tarefa.proxima_verificacao = self._relogio() + tarefa.intervalo * variacao
+
+    def executar_pendentes(self):
+        """Uma rodada: tenta executar as tarefas cuja verificação local venceu."""
+        agora = self._relogio()
+        for tarefa in list(self.tarefas.values()):
+            if tarefa.proxima_verificacao > agora:
+                continue
+            try:
+                if not executar_com_lock(tarefa):
+                    tarefa.puladas += 1
+            except Exception as e:
+                print(f"Erro no agendador ({tarefa.nome}): {e}")
+            self._agendar_verificacao(tarefa)
+
+    def executar(self, parar=None, tick=TICK_SEGUNDOS):
+        parar = parar or threading.Event()
+        while not parar.is_set():
+            self.executar_pendentes()
+            parar.wait(tick * random.uniform(1 - JITTER, 1 + JITTER))
+
+    def estatisticas(self):
+        """Métricas de cada tarefa neste processo, para /health."""
+        with self._lock:
+            return {nome: tarefa.como_dict() for nome, tarefa in self.tarefas.items()}
+
+
+def executar_com_lock(tarefa):
+    """
+    Executa a tarefa se esta réplica obtiver o advisory lock e a execução
+    tiver vencido. Retorna True se executou.
+    """
+    conn = get_connection()
+    if not conn:
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (NAMESPACE_LOCK, tarefa.chave))
+        obteve = cursor.fetchone()[0]
+        conn.commit()
+        if not obteve:
+            return False
+        try:
+            cursor.execute(
+                "SELECT proxima_execucao_em <= NOW() FROM tarefa_agendada WHERE nome = %s",
+                (tarefa.nome,),
+            )
+            linha = cursor.fetchone()
+            conn.commit()
+            if linha is not None and not linha[0]:
+                return False  # Outra réplica já executou nesta rodada
+
+            inicio = time.perf_counter()
+            erro = None
+            try:
+                tarefa.funcao()
+            except Exception as e:
+                erro = e
+                print(f"❌ Tarefa {tarefa.nome} falhou: {e}")
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            tarefa.registrar_execucao(duracao_ms, erro)
+
+            cursor.execute("""
+                INSERT INTO tarefa_agendada
+                    (nome, ultima_execucao_em, proxima_execucao_em, ultima_duracao_ms,
+                     ultimo_erro, execucoes, falhas)
+                VALUES (%s, NOW(), NOW() + make_interval(secs => %s), %s, %s, 1, %s)
+                ON CONFLICT (nome) DO UPDATE SET
+                    ultima_execucao_em = EXCLUDED.ultima_execucao_em,
+                    proxima_execucao_em = EXCLUDED.proxima_execucao_em,
+                    ultima_duracao_ms = EXCLUDED.ultima_duracao_ms,
+                    ultimo_erro = EXCLUDED.ultimo_erro,
+                    execucoes = tarefa_agendada.execucoes + 1,
+                    falhas = tarefa_agendada.falhas + EXCLUDED.falhas
+            """, (tarefa.nome, tarefa.intervalo, duracao_ms,
+                  str(erro)[:1000] if erro else None, 1 if erro else 0))
+            conn.commit()
+            return True
+        finally:
+            # O lock é da sessão: precisa ser liberado antes de a conexão voltar ao pool
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (NAMESPACE_LOCK, tarefa.chave))
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ===== TAREFAS DO SERVIDOR =====
+def _tarefa_lembretes():
+    from Back_end.lembretes_whatsapp import enviar_lembretes_diarios
+    enviar_lembretes_diarios()
+
+
+def _tarefa_outbox():
+    from Back_end.outbox_worker import drenar
+    drenar()
+
+
+def _tarefa_limpeza():
+    from Back_end import outbox
+    conn = get_connection()
+    if not conn:
+        return
+    try:
+        removidos = outbox.limpar_enviados(conn)
+        if removidos:
+            print(f"🧹 {removidos} e-mail(s) antigo(s) removido(s) da outbox")
+    finally:
+        conn.close()
+
+
+agendador = Agendador()
+if settings.whatsapp_habilitado:
+    agendador.registrar("lembretes_whatsapp", _tarefa_lembretes, int(os.getenv("AGENDADOR_LEMBRETES_INTERVALO", "300")))
+agendador.registrar("outbox", _tarefa_outbox, int(os.getenv("AGENDADOR_OUTBOX_INTERVALO", "60")))
+agendador.registrar("limpeza", _tarefa_limpeza, int(os.getenv("AGENDADOR_LIMPEZA_INTERVALO", "86400")))
+
+
+# ===== EXECUÇÃO EM THREAD (DENTRO DO SERVIDOR WEB) =====
+_thread = None
+_parar_thread = threading.Event()
+
+
+def iniciar_em_thread():
+    """Inicia o agendador como thread daemon (uma por processo)."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return _thread
+    _parar_thread.clear()
+    _thread = threading.Thread(target=agendador.executar, args=(_parar_thread,), name="agendador", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def parar_thread(timeout=5.0):
+    global _thread
+    _parar_thread.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    _thread = None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "run" and len(argv) == 2 and argv[1] in agendador.tarefas:
+        tarefa = agendador.tarefas[argv[1]]
+        tarefa.funcao()
+        return 0
+    if argv:
+        print(__doc__)
+        return 2
+
+    conn = get_connection()
+    if not conn:
+        print("❌ Erro: Não foi possível conectar ao banco de dados")
+        return 1
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT nome, ultima_execucao_em, proxima_execucao_em, ultima_duracao_ms, execucoes, falhas
+            FROM tarefa_agendada
+        """)
+        no_banco = {linha[0]: linha[1:] for linha in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+    for nome, tarefa in agendador.tarefas.items():
+        ultima, proxima, duracao, execucoes, falhas = no_banco.get(nome, (None, None, None, 0, 0))
+        print(f"{nome}: a cada {tarefa.intervalo}s | última {ultima} | próxima {proxima} | "
+              f"{execucoes} execuções, {falhas} falhas | última duração {duracao} ms")
+    return 0
+
+
+# ===== EXECUÇÃO DIRETA =====
+if __name__ == "__main__":
+    sys.exit(main())
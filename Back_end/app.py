@@ -1,98 +1,183 @@
-import os
-print("CWD:", os.getcwd())
-print("Back_end contents:", os.listdir(os.path.join(os.getcwd(), "Back_end")))
 # ===== IMPORTS =====
 # Flask: Framework web para Python - cria o servidor HTTP
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 # CORS: Permite que o frontend (React) se comunique com o backend
 from flask_cors import CORS
 # JWT: Sistema de autenticação por tokens (login seguro)
 from flask_jwt_extended import JWTManager
 from flask_jwt_extended.exceptions import NoAuthorizationError
-# dotenv: Carrega variáveis do arquivo .env
-from dotenv import load_dotenv
+import hmac
 import sys
 import os
 
 # Adiciona o diretório Back_end ao path para imports funcionarem
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Configurações: carrega o .env uma única vez (antes dos demais módulos)
+from Back_end.config import settings
+
 # Rotas: Importa todas as URLs/endpoints da aplicação
 from Back_end.rota_clientes import rota_clientes         # APIs para clientes
 from Back_end.rota_massoterapeuta import rota_massoterapeuta  # APIs para massoterapeutas
 from Back_end.rota_contato import rota_contato           # APIs para formulário de contato
+from Back_end.database import pool_stats, ssl_mode       # Estatísticas do pool e modo SSL negociado
+from Back_end import database                            # Unidade de trabalho por requisição
+from Back_end import http_client                         # Contadores dos provedores externos
+from Back_end import email_api                           # Estado dos provedores de e-mail
+from Back_end import metricas                            # Métricas por rota (Prometheus)
+from Back_end import perfilador                          # Perfilador opcional de requisições
 
-# ===== CARREGAMENTO DE VARIÁVEIS DE AMBIENTE =====
-load_dotenv()  # Carrega todas as variáveis do arquivo .env
-
-# ===== CRIAÇÃO DA APLICAÇÃO =====
-# Cria a instância principal do servidor Flask
+# ===== CONFIGURAÇÕES DA APLICAÇÃO =====
+FRONTEND_URL = settings.frontend_url
+WHATSAPP_HABILITADO = settings.whatsapp_habilitado
 
-app = Flask(__name__)
+# ===== ROTAS E TRATAMENTO DE ERROS =====
+# Funções registradas na aplicação por create_app()
 
 # Rota raiz para status do backend
-@app.route("/")
 def index():
     return "API Massoterapia HM rodando!", 200
 
-# ===== CONFIGURAÇÃO DE SEGURANÇA =====
-# 🔑 Chave secreta para assinar tokens JWT (senha do sistema)
-# IMPORTANTE: Em produção, usar uma chave mais complexa e secreta
-app.config["JWT_SECRET_KEY"] = "minha_chave_super_secreta"
-
-# ===== INICIALIZAÇÃO DO JWT =====
-# Ativa o sistema de autenticação por tokens na aplicação
-jwt = JWTManager(app)
-
-# ===== CONFIGURAÇÃO CORS =====
-# Permite que o frontend React acesse as APIs (desenvolvimento e produção)
-# Sem isso, o navegador bloqueia as requisições por segurança
-import os
-FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
-CORS(app, resources={r"/api/*": {"origins": [
-    FRONTEND_URL,
-    "http://localhost:5173",
-    "https://pfc-frontend-delta.vercel.app",
-    "https://hmmassoterapia.com.br",
-    "https://www.hmmassoterapia.com.br"
-]}})
-
-# ===== TRATAMENTO DE ERROS =====
 # Captura erros HTTP 422 (dados inválidos) e retorna JSON padronizado
-@app.errorhandler(422)
 def handle_422(err):
     return jsonify({"erro": "Erro 422: " + str(err)}), 422
 
 # Captura erros de token inválido/ausente e retorna erro 401
-@app.errorhandler(NoAuthorizationError)
 def handle_no_auth(err):
     return jsonify({"erro": "Token ausente ou inválido"}), 401
 
-# ===== REGISTRO DAS ROTAS =====
-# Conecta todas as URLs/endpoints à aplicação principal
-app.register_blueprint(rota_clientes)        # /api/clientes/*
-app.register_blueprint(rota_massoterapeuta)  # /api/massoterapeuta/*
-app.register_blueprint(rota_contato)         # /api/contato/*
+def _estatisticas_agendador():
+    from Back_end.agendador import agendador
+    return agendador.estatisticas()
 
 # ===== ROTA DE HEALTH CHECK =====
-@app.route('/health')
 def health_check():
     """Endpoint para verificar se a API está funcionando"""
     return jsonify({
         "status": "healthy",
         "message": "API está funcionando!",
-        "version": "1.0"
+        "version": "1.0",
+        "database_pool": pool_stats(),  # em uso, ociosas, aguardando, tempo de espera
+        "database_ssl_mode": ssl_mode(),
+        "http_providers": http_client.estatisticas(),  # latência e erros por provedor externo
+        "email_providers": email_api.estado_provedores(),  # circuit breaker de cada provedor de e-mail
+        "scheduled_jobs": _estatisticas_agendador()  # execuções e duração das tarefas periódicas
     })
 
-# ===== EXECUÇÃO DO SERVIDOR =====
-# Se este arquivo for executado diretamente, inicia o servidor
+# ===== ROTA DE MÉTRICAS =====
+def metrics():
+    """Contadores e histogramas por rota, somados entre os workers (formato Prometheus)"""
+    token = settings.metricas_token
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return jsonify({"erro": "Token ausente ou inválido"}), 401
+    texto = metricas.formatar_prometheus(metricas.registro.agregar())
+    return Response(texto, mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+# ===== FÁBRICA DA APLICAÇÃO =====
+def create_app():
+    """
+    Cria e configura a aplicação Flask (rotas, JWT, CORS, erros, banco).
+    Não inicia threads em segundo plano: isso é feito por processo servidor
+    (iniciar_servicos_de_fundo), depois do fork dos workers do gunicorn.
+    """
+    app = Flask(__name__)
+    app.add_url_rule("/", "index", index)
+
+    # ===== CONFIGURAÇÃO DE SEGURANÇA =====
+    # 🔑 Chave secreta para assinar tokens JWT (senha do sistema)
+    # IMPORTANTE: Em produção, usar uma chave mais complexa e secreta
+    app.config["JWT_SECRET_KEY"] = "minha_chave_super_secreta"
+
+    # ===== INICIALIZAÇÃO DO JWT =====
+    # Ativa o sistema de autenticação por tokens na aplicação
+    JWTManager(app)
+
+    # ===== CONFIGURAÇÃO CORS =====
+    # Permite que o frontend React acesse as APIs (desenvolvimento e produção)
+    # Sem isso, o navegador bloqueia as requisições por segurança
+    CORS(app, resources={r"/api/*": {"origins": [
+        FRONTEND_URL,
+        "http://localhost:5173",
+        "https://pfc-frontend-delta.vercel.app",
+        "https://hmmassoterapia.com.br",
+        "https://www.hmmassoterapia.com.br"
+    ], "expose_headers": ["X-Next-Cursor", "Link"]}})  # Cabeçalhos da paginação legíveis pelo frontend
+
+    # ===== TRATAMENTO DE ERROS =====
+    app.register_error_handler(422, handle_422)
+    app.register_error_handler(NoAuthorizationError, handle_no_auth)
+
+    # ===== REGISTRO DAS ROTAS =====
+    # Conecta todas as URLs/endpoints à aplicação principal
+    app.register_blueprint(rota_clientes)        # /api/clientes/*
+    app.register_blueprint(rota_massoterapeuta)  # /api/massoterapeuta/*
+    app.register_blueprint(rota_contato)         # /api/contato/*
+
+    # WhatsApp Cloud API (webhook + envio): só com WHATSAPP_HABILITADO=1
+    if WHATSAPP_HABILITADO:
+        from Back_end.rota_whatsapp import rota_whatsapp
+        app.register_blueprint(rota_whatsapp)    # /api/whatsapp/*
+
+    # ===== MÉTRICAS E UNIDADE DE TRABALHO =====
+    # Métricas antes do banco: a medição enxerga o commit e o status final
+    metricas.init_app(app)
+    # Uma conexão e uma transação por requisição, confirmada ao final
+    database.init_app(app)
+
+    app.add_url_rule("/health", "health_check", health_check)
+    app.add_url_rule("/metrics", "metrics", metrics)
+
+    # ===== PERFILADOR (OPCIONAL) =====
+    # Só instalado com PERFIL_AMOSTRAGEM > 0 ou PERFIL_SEGREDO definido
+    perfilador.init_app(app)
+    return app
+
+# ===== SERVIÇOS EM SEGUNDO PLANO =====
+def iniciar_servicos_de_fundo():
+    """Inicia as threads de segundo plano deste processo (uma vez por worker)."""
+    if not os.getenv("DATABASE_URL"):
+        return
+
+    # Worker da caixa de saída: envia os emails gravados pelas rotas (tabela email_outbox).
+    # Com um processo dedicado (python -m Back_end.outbox_worker), use EMAIL_OUTBOX_THREAD=0.
+    if settings.email_outbox_thread:
+        from Back_end import outbox_worker
+        outbox_worker.iniciar_em_thread()
+
+    # Worker dos webhooks do WhatsApp (tabela whatsapp_webhook_fila)
+    if WHATSAPP_HABILITADO and settings.whatsapp_webhook_thread:
+        from Back_end import whatsapp_webhook
+        whatsapp_webhook.iniciar_em_thread()
+
+    # Agendador: lembretes de WhatsApp, varredura da outbox e limpeza. Roda em
+    # todos os processos; um advisory lock no Postgres garante uma execução por vez.
+    if settings.agendador_thread:
+        from Back_end import agendador
+        agendador.iniciar_em_thread()
+
+def encerrar_servicos_de_fundo():
+    """Para as threads e fecha conexões (pool do banco, HTTP, SMTP) deste processo."""
+    from Back_end import agendador, outbox_worker, whatsapp_webhook
+    agendador.parar_thread()
+    whatsapp_webhook.parar_thread()
+    outbox_worker.parar_thread()
+    http_client.fechar()
+    email_api._pool_smtp.fechar()
+    database.close_pool()
+    metricas.registro.encerrar_processo()  # Contadores deste worker somados em metricas_encerrados.json
+
+# ===== CRIAÇÃO DA APLICAÇÃO =====
+# Instância usada pelo gunicorn (Back_end.app:app) e pelos testes
+app = create_app()
+jwt = app.extensions["flask-jwt-extended"]
+
+# ===== EXECUÇÃO DO SERVIDOR (DESENVOLVIMENTO) =====
+# Produção: gunicorn -c python:Back_end.servidor Back_end.app:app (ver Procfile)
 if __name__ == '__main__':
-    # Configura porta para produção (Railway) ou desenvolvimento
-    port = int(os.getenv("PORT", 5000))
-    debug = os.getenv("FLASK_DEBUG", "0") == "1"
-    
+    metricas.registro.limpar()  # Descarta métricas de execuções anteriores
+    iniciar_servicos_de_fundo()
     app.run(
         host="0.0.0.0",  # Permite acesso externo (necessário para Railway)
-        port=port,
-        debug=debug
-    )
\ No newline at end of file
+        port=settings.porta,  # Porta de produção (Railway) ou desenvolvimento
+        debug=settings.flask_debug
+    )
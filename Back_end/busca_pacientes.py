@@ -0,0 +1,76 @@
+"""
+Busca de pacientes sem acento e por similaridade
+
+Os nomes são comparados com f_unaccent(lower(...)) (migração 0005), de modo
+que "joao" encontra "João". Os índices GIN de trigramas da migração 0006
+atendem o LIKE '%termo%' e a ordenação por similarity(), então a busca
+não percorre a tabela cliente inteira.
+"""
+
+import re
+
+from psycopg2 import DatabaseError
+
+from Back_end.database import get_connection
+
+# ===== CONFIGURAÇÕES =====
+MIN_CARACTERES = 2
+MAX_CARACTERES = 100
+LIMITE_AUTOCOMPLETE = 10
+LIMITE_MAXIMO_AUTOCOMPLETE = 25
+
+# Expressões SQL compartilhadas (idênticas às dos índices da migração 0006)
+NOME_NORMALIZADO = "f_unaccent(lower(c.nome))"
+EMAIL_NORMALIZADO = "lower(c.email)"
+CONDICAO_NOME = f"{NOME_NORMALIZADO} LIKE f_unaccent(lower(%s))"
+ORDEM_SIMILARIDADE = f"similarity({NOME_NORMALIZADO}, f_unaccent(lower(%s))) DESC"
+
+
+def normalizar_termo(termo):
+    """Remove espaços extras e corta termos longos demais."""
+    return re.sub(r"\s+", " ", (termo or "").strip())[:MAX_CARACTERES]
+
+
+def padrao_like(termo):
+    """'%termo%' com os curingas do LIKE (%, _ e \\) escapados."""
+    escapado = termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escapado}%"
+
+
+def autocomplete_pacientes(massoterapeuta_id, termo, limite=LIMITE_AUTOCOMPLETE):
+    """
+    Pares id/nome dos pacientes do massoterapeuta que casam com o termo,
+    mais parecidos primeiro. Não carrega histórico.
+    Retorna lista (vazia para termos curtos) ou None em erro de banco.
+    """
+    termo = normalizar_termo(termo)
+    if len(termo) < MIN_CARACTERES:
+        return []
+    limite = max(1, min(int(limite), LIMITE_MAXIMO_AUTOCOMPLETE))
+
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        padrao = padrao_like(termo)
+        cursor.execute(f"""
+            SELECT c.id, c.nome
+            FROM cliente c
+            WHERE ({CONDICAO_NOME} OR {EMAIL_NORMALIZADO} LIKE lower(%s))
+              AND EXISTS (
+                  SELECT 1 FROM agendamento a
+                  WHERE a.cliente_id = c.id AND a.massoterapeuta_id = %s
+              )
+            ORDER BY {ORDEM_SIMILARIDADE}, c.nome ASC, c.id ASC
+            LIMIT %s
+        """, (padrao, padrao, massoterapeuta_id, termo, limite))
+        return [{"id": linha[0], "nome": linha[1]} for linha in cursor.fetchall()]
+    except DatabaseError as e:
+        print(f"Erro no autocomplete de pacientes: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
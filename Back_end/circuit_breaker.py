@@ -0,0 +1,133 @@
+"""
+Circuit breaker por provedor externo
+
+Estados:
+- fechado: chamadas passam; o resultado das últimas `janela` chamadas é
+  acompanhado. Se a taxa de falha passar de `taxa_falha` (com pelo menos
+  `minimo_chamadas`), o circuito abre.
+- aberto: chamadas são recusadas na hora (o roteador vai direto para o
+  próximo provedor). Depois de `tempo_aberto` segundos, uma sonda em
+  segundo plano (se configurada) testa o provedor; sem sonda, a próxima
+  chamada real faz o papel de teste.
+- meio_aberto: uma única chamada de teste por vez. Sucesso fecha o
+  circuito; falha reabre e reinicia a espera.
+"""
+
+import threading
+import time
+from collections import deque
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class CircuitBreaker:
+    def __init__(self, nome, janela=20, taxa_falha=0.5, minimo_chamadas=5,
+                 tempo_aberto=30.0, sonda=None, relogio=time.monotonic):
+        self.nome = nome
+        self.taxa_falha = taxa_falha
+        self.minimo_chamadas = minimo_chamadas
+        self.tempo_aberto = tempo_aberto
+        self.sonda = sonda
+        self._relogio = relogio
+        self._resultados = deque(maxlen=janela)  # True = falha
+        self._estado = FECHADO
+        self._aberto_em = None
+        self._teste_em_andamento = False
+        self._aberturas = 0
+        self._recusadas = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    # ===== ESTADO =====
+    @property
+    def estado(self):
+        with self._lock:
+            self._atualizar()
+            return self._estado
+
+    def _atualizar(self):
+        """aberto -> meio_aberto quando o tempo de espera acaba (chamar com o lock)."""
+        if self._estado == ABERTO and self._relogio() - self._aberto_em >= self.tempo_aberto:
+            self._estado = MEIO_ABERTO
+            self._teste_em_andamento = False
+
+    def _abrir(self):
+        self._estado = ABERTO
+        self._aberto_em = self._relogio()
+        self._teste_em_andamento = False
+        self._aberturas += 1
+        self._resultados.clear()
+        self._agendar_sonda()
+
+    def _fechar(self):
+        self._estado = FECHADO
+        self._teste_em_andamento = False
+        self._resultados.clear()
+
+    # ===== CHAMADAS =====
+    def permite(self):
+        """True se a chamada pode seguir para o provedor agora."""
+        with self._lock:
+            self._atualizar()
+            if self._estado == FECHADO:
+                return True
+            if self._estado == MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            self._recusadas += 1
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self._estado == MEIO_ABERTO:
+                self._fechar()
+            else:
+                self._resultados.append(False)
+
+    def registrar_falha(self):
+        with self._lock:
+            if self._estado == MEIO_ABERTO:
+                self._abrir()
+                return
+            self._resultados.append(True)
+            if self._estado == FECHADO and len(self._resultados) >= self.minimo_chamadas:
+                if sum(self._resultados) / len(self._resultados) >= self.taxa_falha:
+                    self._abrir()
+
+    # ===== SONDA EM SEGUNDO PLANO =====
+    def _agendar_sonda(self):
+        if self.sonda is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.tempo_aberto, self._executar_sonda)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _executar_sonda(self):
+        if not self.permite():
+            return
+        try:
+            saudavel = bool(self.sonda())
+        except Exception as e:
+            print(f"Sonda do provedor {self.nome} falhou: {e}")
+            saudavel = False
+        if saudavel:
+            print(f"✅ Provedor {self.nome} respondeu à sonda; circuito fechado")
+            self.registrar_sucesso()
+        else:
+            self.registrar_falha()
+
+    def como_dict(self):
+        with self._lock:
+            self._atualizar()
+            falhas = sum(self._resultados)
+            return {
+                "estado": self._estado,
+                "chamadas_na_janela": len(self._resultados),
+                "taxa_falha": round(falhas / len(self._resultados), 2) if self._resultados else 0.0,
+                "aberturas": self._aberturas,
+                "recusadas": self._recusadas,
+            }
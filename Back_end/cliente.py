@@ -6,6 +6,12 @@ from psycopg2 import DatabaseError, errors
 from psycopg2.extras import RealDictCursor  # Retorna dados como dicionário
 # datetime: Manipulação de datas e horários
 from datetime import datetime, time
+# disponibilidade: Regras de funcionamento da clínica e cache de horários livres
+from Back_end.disponibilidade import dia_de_funcionamento, horario_de_funcionamento, invalidar_disponibilidade
+# outbox: E-mails gravados na transação e enviados em segundo plano
+from Back_end.outbox import enfileirar_email
+# telefones: Normalização para E.164 (checagem de duplicidade e envios de WhatsApp)
+from Back_end.telefones import normalizar_telefone
 # werkzeug: Criptografia de senhas (hash + verificação)
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -70,7 +76,12 @@ def cadastrar_cliente(nome, telefone, sexo, data_nascimento, email, senha):
             
             # ===== VERIFICAÇÃO DE TELEFONE DUPLICADO =====
             # Garante que cada telefone seja único no sistema
-            cursor.execute("SELECT id FROM cliente WHERE telefone = %s", (telefone,))
+            # Compara a forma E.164: "(11) 98765-4321" e "11987654321" são o mesmo número
+            telefone_e164 = normalizar_telefone(telefone)
+            if telefone_e164:
+                cursor.execute("SELECT id FROM cliente WHERE telefone_e164 = %s", (telefone_e164,))
+            else:
+                cursor.execute("SELECT id FROM cliente WHERE telefone = %s", (telefone,))
             if cursor.fetchone():
                 print(f"Erro: Telefone '{telefone}' já cadastrado")
                 return {"erro": "Já existe uma conta com este número de telefone."}
@@ -81,28 +92,26 @@ def cadastrar_cliente(nome, telefone, sexo, data_nascimento, email, senha):
             
             # ===== INSERÇÃO NO BANCO =====
             sql = """
-                INSERT INTO cliente (nome, telefone, sexo, data_nascimento, email, senha_hash, email_confirmado)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO cliente (nome, telefone, telefone_e164, sexo, data_nascimento, email, senha_hash, email_confirmado)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id;
             """
             # email_confirmado=False: Cliente precisa confirmar email antes de usar
-            cursor.execute(sql, (nome, telefone, sexo, data_nascimento, email, senha_hash, False))
+            cursor.execute(sql, (nome, telefone, telefone_e164, sexo, data_nascimento, email, senha_hash, False))
             
             # ===== OBTENÇÃO DO ID GERADO =====
             cliente_id = cursor.fetchone()[0]
             
+            # ===== EMAIL DE CONFIRMAÇÃO (CAIXA DE SAÍDA) =====
+            # Gravado na mesma transação; o worker da outbox faz o envio
+            from Back_end.email_api import montar_email_confirmacao
+            assunto, conteudo = montar_email_confirmacao(email)
+            enfileirar_email(cursor, email, assunto, conteudo, tipo="confirmacao_cadastro")
+            
             # ===== CONFIRMAÇÃO DA TRANSAÇÃO =====
             # commit() torna as mudanças permanentes no banco
             conn.commit()
             print(f"Cliente inserido com sucesso! ID: {cliente_id}")
-            
-            # ===== ENVIO DE EMAIL DE CONFIRMAÇÃO =====
-            try:
-                from Back_end.email_api import send_confirmation_email
-                status, resp = send_confirmation_email(email)
-                print(f"Status envio e-mail: {status}, resposta: {resp}")
-            except Exception as e:
-                print(f"Erro ao enviar e-mail de confirmação: {e}")
             return cliente_id
         except Exception as e:
             conn.rollback()
@@ -199,18 +208,14 @@ def cadastrar_agendamento(cliente_id, massoterapeuta_id, data_hora, sintomas=Non
 
     # ===== VALIDAÇÃO: DIAS DE FUNCIONAMENTO =====
     # weekday(): 0=segunda, 1=terça, 2=quarta, 3=quinta, 4=sexta, 5=sábado, 6=domingo
-    # ===== VALIDAÇÃO: DIAS DE FUNCIONAMENTO =====
-    # weekday(): 0=segunda, 1=terça, 2=quarta, 3=quinta, 4=sexta, 5=sábado, 6=domingo
-    dia_semana = data_hora.weekday()
-    if dia_semana < 0 or dia_semana > 3:  # 0-3 = segunda a quinta
+    # Regras compartilhadas com o motor de disponibilidade (Back_end/disponibilidade.py)
+    if not dia_de_funcionamento(data_hora):  # 0-3 = segunda a quinta
         print("Erro: Agendamentos só podem ser feitos de segunda a quinta-feira")
         return {"erro": "Agendamentos só podem ser feitos de segunda a quinta-feira"}
 
     # ===== VALIDAÇÃO: HORÁRIO DE FUNCIONAMENTO =====
     # Clínica funciona das 8:00 às 18:00, sessões de 1h
-    hora_inicio = time(8, 0)
-    hora_fim = time(18, 0)
-    if not (hora_inicio <= data_hora.time() <= hora_fim):
+    if not horario_de_funcionamento(data_hora.time()):
         print("Erro: Horário fora do funcionamento da clínica (8:00 às 18:00)")
         return None
 
@@ -221,30 +226,12 @@ def cadastrar_agendamento(cliente_id, massoterapeuta_id, data_hora, sintomas=Non
         try:
             cursor = conn.cursor()
             
-            # ===== VERIFICAÇÃO DE CONFLITOS - MASSOTERAPEUTA =====
-            # Impede que massoterapeuta tenha 2 agendamentos no mesmo horário
-            cursor.execute("""
-                SELECT * FROM agendamento
-                WHERE massoterapeuta_id = %s AND data_hora = %s AND status IN ('marcado', 'confirmado', 'pendente')
-            """, (massoterapeuta_id, data_hora))
-            masso_conf = cursor.fetchone()
-            if masso_conf:
-                print(f"Erro: Massoterapeuta já tem agendamento neste horário")
-                return {"erro": "Massoterapeuta já tem agendamento neste horário", "agendamento": masso_conf}
-
-            # ===== VERIFICAÇÃO DE CONFLITOS - CLIENTE =====
-            # Impede que cliente tenha 2 agendamentos no mesmo horário
-            cursor.execute("""
-                SELECT * FROM agendamento
-                WHERE cliente_id = %s AND data_hora = %s AND status IN ('marcado', 'confirmado', 'pendente')
-            """, (cliente_id, data_hora))
-            cliente_conf = cursor.fetchone()
-            if cliente_conf:
-                print(f"Erro: Cliente já tem agendamento neste horário")
-                return {"erro": "Cliente já tem agendamento neste horário", "agendamento": cliente_conf}
-
-            # ===== INSERÇÃO DO AGENDAMENTO =====
+            # ===== INSERÇÃO DO AGENDAMENTO (COMANDO ÚNICO) =====
             # IMPORTANTE: Campo 'sintomas' é a nova funcionalidade implementada
+            # Conflitos de horário (massoterapeuta ou cliente) são barrados pelas
+            # constraints de exclusão sobre agendamento.periodo (migração 0003):
+            # sem SELECT prévio, sem corrida entre reservas simultâneas, e sessões
+            # sobrepostas que começam em minutos diferentes também são detectadas.
             sql = """
                 INSERT INTO agendamento (cliente_id, massoterapeuta_id, data_hora, sintomas, status)
                 VALUES (%s, %s, %s, %s, %s)
@@ -253,38 +240,26 @@ def cadastrar_agendamento(cliente_id, massoterapeuta_id, data_hora, sintomas=Non
             cursor.execute(sql, (cliente_id, massoterapeuta_id, data_hora, sintomas, status))
             agendamento = cursor.fetchone()
             
+            # ===== NOTIFICAÇÃO POR EMAIL (CAIXA DE SAÍDA) =====
+            # Gravada na mesma transação do agendamento; o worker da outbox faz o envio
+            cursor.execute("SELECT email, nome FROM cliente WHERE id = %s", (cliente_id,))
+            cliente = cursor.fetchone()
+            if cliente:
+                destinatario, nome_cliente = cliente[0], cliente[1]
+                assunto = "Solicitação de Agendamento Recebida"
+                conteudo = f"Olá {nome_cliente}, sua solicitação de agendamento para {data_hora} foi recebida e está aguardando confirmação da clínica. Você será notificado quando o agendamento for confirmado."
+                enfileirar_email(cursor, destinatario, assunto, conteudo, tipo="agendamento_solicitado")
+            # NOTIFICAÇÕES POR WHATSAPP removidas: passamos a usar apenas envio por e-mail
+            
             # ===== CONFIRMAÇÃO DA TRANSAÇÃO =====
             conn.commit()
             print(f"Agendamento inserido com sucesso: {agendamento}")
-            
-            # ===== NOTIFICAÇÕES (EMAIL + WHATSAPP) =====
-            try:
-                # ===== BUSCAR DADOS DO CLIENTE =====
-                cursor.execute("SELECT email, nome, telefone FROM cliente WHERE id = %s", (cliente_id,))
-                cliente = cursor.fetchone()
-                
-                if cliente:
-                    destinatario = cliente[0]  # email
-                    nome_cliente = cliente[1]  # nome
-                    telefone_cliente = cliente[2]  # telefone
-                    
-                    # ===== NOTIFICAÇÃO POR EMAIL =====
-                    try:
-                        from Back_end.email_api import sendgrid_email_api_massoterapia
-                        assunto = "Solicitação de Agendamento Recebida"
-                        conteudo = f"Olá {nome_cliente}, sua solicitação de agendamento para {data_hora} foi recebida e está aguardando confirmação da clínica. Você será notificado quando o agendamento for confirmado."
-                        status, resp = sendgrid_email_api_massoterapia(destinatario, assunto, conteudo)
-                        print(f"Status envio e-mail agendamento: {status}, resposta: {resp}")
-                    except Exception as e:
-                        print(f"Erro ao enviar e-mail de agendamento: {e}")
-                    
-                    # ===== NOTIFICAÇÃO POR WHATSAPP =====
-                    # NOTIFICAÇÕES POR WHATSAPP removidas: passamos a usar apenas envio por e-mail (SendGrid)
-                    # Caso queira reativar notificações via outro canal, implemente aqui.
-                        
-            except Exception as e:
-                print(f"Erro ao enviar notificações de agendamento: {e}")
+            invalidar_disponibilidade(massoterapeuta_id, data_hora)
             return agendamento
+        except errors.ExclusionViolation as e:
+            # ===== CONFLITO DE HORÁRIO =====
+            conn.rollback()
+            return _conflito_agendamento(cursor, e, cliente_id, massoterapeuta_id, data_hora)
         except Exception as e:
             conn.rollback()
             print(f"Erro ao inserir agendamento: {e}")
@@ -294,6 +269,39 @@ def cadastrar_agendamento(cliente_id, massoterapeuta_id, data_hora, sintomas=Non
                 cursor.close()
             conn.close()
 
+# Nomes das constraints de exclusão criadas na migração 0003
+RESTRICAO_CONFLITO_MASSOTERAPEUTA = "agendamento_sem_sobreposicao_massoterapeuta"
+RESTRICAO_CONFLITO_CLIENTE = "agendamento_sem_sobreposicao_cliente"
+
+def _conflito_agendamento(cursor, erro, cliente_id, massoterapeuta_id, data_hora):
+    """
+    Converte a violação da constraint de exclusão na resposta de erro de
+    sempre, incluindo o agendamento que ocupa o horário. Só roda no caminho
+    de conflito; o caminho feliz continua sendo um único INSERT.
+    """
+    if erro.diag.constraint_name == RESTRICAO_CONFLITO_CLIENTE:
+        coluna, dono_id = "cliente_id", cliente_id
+        mensagem = "Cliente já tem agendamento neste horário"
+    else:
+        coluna, dono_id = "massoterapeuta_id", massoterapeuta_id
+        mensagem = "Massoterapeuta já tem agendamento neste horário"
+    print(f"Erro: {mensagem}")
+
+    conflitante = None
+    try:
+        cursor.execute(f"""
+            SELECT id, cliente_id, massoterapeuta_id, data_hora, sintomas, status
+            FROM agendamento
+            WHERE {coluna} = %s
+              AND periodo && tstzrange(%s, %s + INTERVAL '1 hour', '[)')
+              AND status IN ('marcado', 'confirmado', 'pendente')
+            LIMIT 1
+        """, (dono_id, data_hora, data_hora))
+        conflitante = cursor.fetchone()
+    except Exception as e:
+        print(f"Erro ao buscar agendamento conflitante: {e}")
+    return {"erro": mensagem, "agendamento": conflitante}
+
 # -------------------------------
 # Função para atualizar dados do cliente
 # -------------------------------
@@ -307,8 +315,8 @@ def atualizar_conta(id, nome, telefone, email):
             if cursor.fetchone():
                 print(f"Erro: email '{email}' já cadastrado por outro cliente")
                 return
-            sql = "UPDATE cliente SET nome = %s, telefone = %s, email = %s WHERE id = %s"
-            cursor.execute(sql, (nome, telefone, email, id))
+            sql = "UPDATE cliente SET nome = %s, telefone = %s, telefone_e164 = %s, email = %s WHERE id = %s"
+            cursor.execute(sql, (nome, telefone, normalizar_telefone(telefone), email, id))
             conn.commit()
             print(f"Cliente {id} atualizado com sucesso!")
         except Exception as e:
@@ -332,6 +340,7 @@ def excluir_cliente(id):
             cursor.execute(sql, (id,))
             conn.commit()
             print(f"Cliente {id} excluído com sucesso!")
+            invalidar_disponibilidade()  # Horários do cliente podem ter sido liberados
         except Exception as e:
             conn.rollback()
             print(f"Erro ao excluir cliente: {e}")
@@ -343,7 +352,12 @@ def excluir_cliente(id):
 # -------------------------------
 # Função para obter histórico de sessões do cliente
 # -------------------------------
-def historico_sessoes_cliente(cliente_id, incluir_futuros=True):
+def historico_sessoes_cliente(cliente_id, incluir_futuros=True, after=None, limit=None):
+    """
+    Agendamentos do cliente do mais recente ao mais antigo.
+    after: chave (data_hora, id) do último item da página anterior (paginação keyset)
+    limit: máximo de linhas (None = todos)
+    """
     conn = get_connection()
     historico = []
     if conn:
@@ -356,10 +370,17 @@ def historico_sessoes_cliente(cliente_id, incluir_futuros=True):
                 JOIN massoterapeuta m ON a.massoterapeuta_id = m.id
                 WHERE a.cliente_id = %s
             """
+            params = [cliente_id]
             if not incluir_futuros:
                 sql += " AND status IN ('realizado', 'cancelado')"
-            sql += " ORDER BY data_hora DESC"
-            cursor.execute(sql, (cliente_id,))
+            if after:
+                sql += " AND (a.data_hora, a.id) < (%s, %s)"
+                params.extend(after)
+            sql += " ORDER BY a.data_hora DESC, a.id DESC"
+            if limit:
+                sql += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(sql, params)
             historico = cursor.fetchall()
         except Exception as e:
             print(f"Erro ao buscar histórico de sessões do cliente: {e}")
@@ -0,0 +1,70 @@
+"""
+Configurações centralizadas da aplicação
+
+O .env é lido uma única vez, na primeira importação deste módulo (antes
+cada módulo chamava load_dotenv por conta própria, alguns com caminho
+relativo ao diretório de trabalho). Os módulos importam `settings` no
+lugar de load_dotenv; como a importação acontece antes das constantes de
+módulo, os os.getenv dos ajustes finos (pool, timeouts, lotes) continuam
+enxergando as variáveis do .env.
+
+Variáveis que não estão no .env nem no ambiente ficam com o padrão abaixo.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+# Procura o .env a partir deste diretório e sobe até a raiz do projeto;
+# variáveis já definidas no ambiente (Railway) têm prioridade
+load_dotenv()
+
+
+def _flag(nome, padrao):
+    return os.getenv(nome, padrao) == "1"
+
+
+class Configuracoes:
+    """Valores lidos do ambiente uma vez, na inicialização do processo."""
+
+    def __init__(self):
+        # ===== SERVIDOR =====
+        self.porta = int(os.getenv("PORT", "5000"))
+        self.flask_debug = _flag("FLASK_DEBUG", "0")
+        self.ambiente = os.getenv("ENV", "prod")
+        self.frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
+        self.frontend_url_local = os.getenv("FRONTEND_URL_LOCAL", "http://localhost:5173")
+        self.frontend_url_prod = os.getenv("FRONTEND_URL_PROD", "https://hmmassoterapia.com.br")
+        # Se definido, GET /metrics exige "Authorization: Bearer <METRICAS_TOKEN>"
+        self.metricas_token = os.getenv("METRICAS_TOKEN")
+        # Assina os tokens do cabeçalho X-Profile (perfilador por requisição)
+        self.perfil_segredo = os.getenv("PERFIL_SEGREDO")
+
+        # ===== THREADS EM SEGUNDO PLANO =====
+        self.email_outbox_thread = _flag("EMAIL_OUTBOX_THREAD", "1")
+        self.whatsapp_webhook_thread = _flag("WHATSAPP_WEBHOOK_THREAD", "1")
+        self.agendador_thread = _flag("AGENDADOR_THREAD", "1")
+
+        # ===== E-MAIL =====
+        self.sendgrid_api_key = os.getenv("SENDGRID_API_KEY")
+        self.gmail_user = os.getenv("GMAIL_USER")
+        self.gmail_password = os.getenv("GMAIL_APP_PASSWORD")
+        self.sender_email = os.getenv("SENDER_EMAIL")
+        self.sender_name = os.getenv("SENDER_NAME", "Massoterapia TCC")
+        self.email_secret = os.getenv("EMAIL_SECRET", "supersecret")
+        # Caixa da clínica: mensagens de contato e avisos de cancelamento
+        self.email_clinica = os.getenv("EMAIL_CLINICA", "hmmassoterapia7@gmail.com")
+
+        # ===== WHATSAPP =====
+        self.whatsapp_habilitado = _flag("WHATSAPP_HABILITADO", "0")
+        self.whatsapp_access_token = os.getenv("WHATSAPP_ACCESS_TOKEN")
+        self.whatsapp_phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+        self.whatsapp_webhook_verify_token = os.getenv("WHATSAPP_WEBHOOK_VERIFY_TOKEN")
+        self.facebook_app_secret = os.getenv("FACEBOOK_APP_SECRET")
+
+    def url_frontend_links(self):
+        """Base dos links enviados por e-mail (confirmação, redefinição de senha)."""
+        return self.frontend_url_local if self.ambiente == "local" else self.frontend_url_prod
+
+
+settings = Configuracoes()
@@ -0,0 +1,157 @@
+"""
+Contador de consultas por requisição e log de consultas lentas
+
+Os cursores do pool (database.CursorCronometrado) contam cada comando da
+requisição e somam o tempo total e o maior tempo. Ao fim da requisição:
+- uma linha de log estruturada (JSON) com a rota, o status e esses
+  números, para achar rotas com N+1 ou consultas repetidas
+  (DB_QUERY_LOG=0 desliga);
+- em modo debug (ou com DB_QUERY_HEADERS=1), os mesmos números nos
+  cabeçalhos X-DB-Query-Count, X-DB-Query-Time-Ms e X-DB-Query-Max-Ms.
+
+Comandos acima de DB_SLOW_QUERY_MS são registrados com os parâmetros
+redigidos (só tipo e tamanho, nunca o valor: e-mails, telefones, hashes
+de senha). Com DB_SLOW_QUERY_EXPLAIN_FILE definido, SELECTs lentos são
+repetidos com EXPLAIN (ANALYZE, BUFFERS), num savepoint da mesma
+transação, e o plano é anexado ao arquivo (rotacionado ao passar de
+DB_SLOW_QUERY_EXPLAIN_MAX_BYTES).
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+# ===== CONFIGURAÇÕES =====
+LIMITE_LENTA_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+LOG_POR_REQUISICAO = os.getenv("DB_QUERY_LOG", "1") == "1"
+CABECALHOS = os.getenv("DB_QUERY_HEADERS", "0") == "1"
+ARQUIVO_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN_FILE")
+MAX_BYTES_EXPLAIN = int(os.getenv("DB_SLOW_QUERY_EXPLAIN_MAX_BYTES", str(5 * 1024 * 1024)))
+MAX_CARACTERES_SQL = 2000
+
+_ESPACOS = re.compile(r"\s+")
+_lock_arquivo = threading.Lock()
+
+
+# ===== REDAÇÃO DE PARÂMETROS =====
+def _redigir(valor):
+    if valor is None or isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (str, bytes, list, tuple)):
+        return f"<{type(valor).__name__}:{len(valor)}>"
+    return f"<{type(valor).__name__}>"
+
+
+def redigir_parametros(parametros):
+    """Troca cada valor pelo tipo (e tamanho); mantém a estrutura e as chaves."""
+    if parametros is None:
+        return None
+    if isinstance(parametros, dict):
+        return {chave: _redigir(valor) for chave, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        return [_redigir(valor) for valor in parametros]
+    return _redigir(parametros)
+
+
+def _como_texto(sql, conn=None):
+    """SQL como str (aceita str, bytes e psycopg2.sql.Composed)."""
+    if isinstance(sql, bytes):
+        return sql.decode("utf-8", "replace")
+    if not isinstance(sql, str):
+        return sql.as_string(conn)
+    return sql
+
+
+def texto_sql(sql, conn=None):
+    """SQL em uma linha, para o log."""
+    return _ESPACOS.sub(" ", _como_texto(sql, conn)).strip()
+
+
+# ===== CONSULTAS LENTAS =====
+def _rota_atual():
+    from flask import has_request_context, request
+    return f"{request.method} {request.path}" if has_request_context() else None
+
+
+def _explicar(conn, sql, parametros):
+    """EXPLAIN (ANALYZE, BUFFERS) num savepoint: uma falha não aborta a transação de quem chamou."""
+    cursor = conn.cursor()
+    savepoint = not conn.autocommit
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT explicar_consulta_lenta")
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, parametros)
+        plano = "\n".join(linha[0] for linha in cursor.fetchall())
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT explicar_consulta_lenta")
+        return plano
+    except Exception as e:
+        if savepoint:
+            try:
+                cursor.execute("ROLLBACK TO SAVEPOINT explicar_consulta_lenta")
+            except Exception:
+                pass
+        return f"(EXPLAIN falhou: {e})"
+    finally:
+        cursor.close()
+
+
+def _anexar_plano(registro, plano, arquivo=None):
+    arquivo = arquivo or ARQUIVO_EXPLAIN
+    bloco = (f"-- {registro['em']} | {registro['duracao_ms']} ms | {registro['rota'] or 'fora de requisição'}\n"
+             f"{registro['sql']}\n{plano}\n\n")
+    with _lock_arquivo:
+        try:
+            if os.path.exists(arquivo) and os.path.getsize(arquivo) >= MAX_BYTES_EXPLAIN:
+                os.replace(arquivo, f"{arquivo}.1")
+            with open(arquivo, "a", encoding="utf-8") as saida:
+                saida.write(bloco)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o EXPLAIN em {arquivo}: {e}")
+
+
+def registrar_consulta_lenta(cursor, sql, parametros, duracao_s, lote=False):
+    """
+    Registra um comando lento. `cursor` é o cursor psycopg2 real que o
+    executou (o EXPLAIN usa outro cursor da mesma conexão).
+    """
+    conn = getattr(cursor, "connection", None)
+    texto = texto_sql(sql, conn)
+    registro = {
+        "evento": "consulta_lenta",
+        "em": datetime.now().isoformat(timespec="seconds"),
+        "duracao_ms": round(duracao_s * 1000, 2),
+        "rota": _rota_atual(),
+        "sql": texto[:MAX_CARACTERES_SQL],
+        "parametros": "<lote>" if lote else redigir_parametros(parametros),
+    }
+    print(json.dumps(registro, ensure_ascii=False, default=str))
+
+    # Só SELECT: EXPLAIN ANALYZE executa o comando de novo
+    if ARQUIVO_EXPLAIN and conn is not None and not lote:
+        maiusculo = texto.lstrip("(").upper()
+        if maiusculo.startswith("SELECT") and "FOR UPDATE" not in maiusculo:
+            _anexar_plano(registro, _explicar(conn, _como_texto(sql, conn), parametros))
+
+
+# ===== RESUMO POR REQUISIÇÃO =====
+def anotar_resposta(response, medicao, metodo, rota, debug=False):
+    """Cabeçalhos de debug e linha de log com as consultas da requisição."""
+    total_ms = round(medicao.tempo_banco * 1000, 2)
+    maior_ms = round(medicao.maior_consulta * 1000, 2)
+    if debug or CABECALHOS:
+        response.headers["X-DB-Query-Count"] = str(medicao.consultas)
+        response.headers["X-DB-Query-Time-Ms"] = str(total_ms)
+        response.headers["X-DB-Query-Max-Ms"] = str(maior_ms)
+    if LOG_POR_REQUISICAO and medicao.consultas:
+        print(json.dumps({
+            "evento": "consultas_requisicao",
+            "metodo": metodo,
+            "rota": rota,
+            "status": response.status_code,
+            "consultas": medicao.consultas,
+            "tempo_total_ms": total_ms,
+            "tempo_max_ms": maior_ms,
+        }, ensure_ascii=False))
@@ -1,25 +1,746 @@
 # ===== IMPORTS =====
 # os: Para acessar variáveis de ambiente do sistema
 import os
-# dotenv: Carrega variáveis do arquivo .env (senhas, URLs de banco, etc.)
-from dotenv import load_dotenv
+# threading/time/collections: Controle de concorrência e tempos do pool
+import threading
+import time
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+# config: Carrega o arquivo .env (senhas, URLs de banco, etc.) uma única vez
+from Back_end.config import settings  # noqa: F401
 # psycopg2: Driver para conectar Python com PostgreSQL
 import psycopg2
-from psycopg2 import OperationalError
+from psycopg2 import OperationalError, InterfaceError
+from psycopg2 import extensions
+# metricas/consultas: Tempo e contagem de comandos por requisição, log de consultas lentas
+from Back_end import consultas, metricas
+
+
+# ================================================================
+# POOL DE CONEXÕES
+# ================================================================
+# Abrir uma conexão nova a cada chamada custa handshake TLS + autenticação
+# (20-80 ms no Postgres hospedado). O pool mantém conexões abertas e as
+# empresta para as funções de acesso a dados. Quem chama get_connection()
+# continua usando conn.close() normalmente: o close() devolve a conexão
+# ao pool em vez de encerrá-la.
+
+class PoolTimeout(OperationalError):
+    """Nenhuma conexão ficou livre dentro do tempo limite de checkout."""
+
+
+class _EntradaPool:
+    """Conexão física guardada no pool, com seus tempos de criação e uso."""
+
+    __slots__ = ("conn", "criada_em", "usada_em")
+
+    def __init__(self, conn):
+        agora = time.monotonic()
+        self.conn = conn
+        self.criada_em = agora
+        self.usada_em = agora
+
+
+class CursorCronometrado:
+    """
+    Cursor psycopg2 com execute/executemany cronometrados.
+
+    Cada comando é contado e seu tempo somado à requisição em andamento
+    (métricas por rota e contagem de consultas); comandos acima de
+    DB_SLOW_QUERY_MS vão para o log de consultas lentas. O resto é
+    repassado ao cursor real.
+    """
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+    def __setattr__(self, nome, valor):
+        setattr(self._cursor, nome, valor)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def _cronometrar(self, metodo, sql, parametros, lote=False):
+        inicio = time.perf_counter()
+        try:
+            resultado = metodo(sql, parametros)
+        finally:
+            duracao = time.perf_counter() - inicio
+            metricas.registrar_tempo_banco(duracao)
+        if duracao * 1000 >= consultas.LIMITE_LENTA_MS:
+            try:
+                consultas.registrar_consulta_lenta(self._cursor, sql, parametros, duracao, lote=lote)
+            except Exception as e:
+                print(f"⚠️ Erro ao registrar consulta lenta: {e}")
+        return resultado
+
+    def execute(self, query, vars=None):
+        return self._cronometrar(self._cursor.execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._cronometrar(self._cursor.executemany, query, vars_list, lote=True)
+
+
+class PooledConnection:
+    """
+    Conexão emprestada pelo pool.
+
+    Repassa tudo para a conexão psycopg2 real (commit, rollback...), mas
+    close() devolve a conexão ao pool e cursor() devolve um cursor
+    cronometrado. Se a conexão for esquecida sem close(), ela volta ao
+    pool quando o objeto for coletado.
+    """
+
+    def __init__(self, pool, entrada):
+        self._pool = pool
+        self._entrada = entrada
+        self._conn = entrada.conn
+
+    def __getattr__(self, nome):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise InterfaceError("conexão já devolvida ao pool")
+        return getattr(conn, nome)
+
+    def __setattr__(self, nome, valor):
+        # Atributos públicos (ex.: autocommit) vão para a conexão real
+        if nome.startswith("_"):
+            object.__setattr__(self, nome, valor)
+        else:
+            setattr(self._conn, nome, valor)
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            raise InterfaceError("conexão já devolvida ao pool")
+        return CursorCronometrado(self._conn.cursor(*args, **kwargs))
+
+    @property
+    def closed(self):
+        # Para quem usa a conexão, "fechada" significa já devolvida ao pool
+        if self._conn is None:
+            return 1
+        return self._conn.closed
+
+    def close(self):
+        """Devolve a conexão ao pool (não encerra a conexão física)."""
+        if self._conn is not None:
+            self._conn = None
+            self._pool.putconn(self._entrada)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexões thread-safe.
+
+    - min_size: conexões ociosas mantidas abertas mesmo sem uso
+    - max_size: limite de conexões abertas (em uso + ociosas)
+    - timeout: segundos de espera por uma conexão livre antes de PoolTimeout
+    - max_idle: conexões ociosas além de min_size são fechadas após esse tempo
+    - max_lifetime: conexões mais velhas que isso são recicladas no checkout
+    - check_interval: conexões paradas há mais tempo que isso passam por
+      um "SELECT 1" antes de serem emprestadas
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10.0,
+                 max_idle=300.0, max_lifetime=1800.0, check_interval=10.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Configuração inválida do pool de conexões")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+
+        self._cond = threading.Condition()
+        self._ociosas = deque()  # LIFO: a conexão mais "quente" sai primeiro
+        self._em_uso = 0
+        self._aguardando = 0
+        self._fechado = False
+
+        # Estatísticas acumuladas
+        self._checkouts = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._timeouts = 0
+        self._criadas = 0
+        self._descartadas = 0
+
+    # ----- checkout -----
+    def getconn(self):
+        """Empresta uma conexão do pool (ou abre uma nova se houver vaga)."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        with self._cond:
+            while True:
+                if self._fechado:
+                    raise InterfaceError("pool de conexões fechado")
+                if self._ociosas:
+                    entrada = self._ociosas.pop()
+                    break
+                if self._em_uso + len(self._ociosas) < self.max_size:
+                    entrada = None  # vaga reservada para uma conexão nova
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Nenhuma conexão livre após {self.timeout:.1f}s "
+                        f"({self._em_uso} em uso, máximo {self.max_size})"
+                    )
+                self._aguardando += 1
+                try:
+                    self._cond.wait(restante)
+                finally:
+                    self._aguardando -= 1
+            self._em_uso += 1
+
+        # Validação e abertura acontecem fora do lock
+        try:
+            if entrada is not None:
+                entrada = self._validar(entrada)
+            if entrada is None:
+                entrada = _EntradaPool(self._connect())
+                with self._cond:
+                    self._criadas += 1
+        except Exception:
+            with self._cond:
+                self._em_uso -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._checkouts += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        return PooledConnection(self, entrada)
+
+    def _validar(self, entrada):
+        """Retorna a entrada se a conexão estiver viva, ou None se foi descartada."""
+        agora = time.monotonic()
+        conn = entrada.conn
+        saudavel = not conn.closed and agora - entrada.criada_em < self.max_lifetime
+        if saudavel and agora - entrada.usada_em >= self.check_interval:
+            # Teste de vida: conexões paradas podem ter sido derrubadas pelo servidor
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conn.rollback()
+            except Exception:
+                saudavel = False
+        if saudavel:
+            return entrada
+        self._descartar(conn)
+        return None
+
+    # ----- devolução -----
+    def putconn(self, entrada):
+        """Recebe a conexão de volta; descarta se estiver quebrada."""
+        conn = entrada.conn
+        reutilizar = not conn.closed
+        if reutilizar:
+            try:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    reutilizar = False
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    # Transação esquecida aberta: desfaz antes de reaproveitar
+                    conn.rollback()
+            except Exception:
+                reutilizar = False
+
+        excedentes = []
+        with self._cond:
+            self._em_uso -= 1
+            if reutilizar and not self._fechado:
+                entrada.usada_em = time.monotonic()
+                self._ociosas.append(entrada)
+                excedentes = self._recolher_ociosas()
+            else:
+                excedentes = [entrada]
+            self._cond.notify()
+
+        for velha in excedentes:
+            self._descartar(velha.conn)
+
+    def _recolher_ociosas(self):
+        """Remove (sob lock) ociosas além de min_size paradas há mais de max_idle."""
+        agora = time.monotonic()
+        removidas = []
+        while (self._ociosas
+               and len(self._ociosas) + self._em_uso > self.min_size
+               and agora - self._ociosas[0].usada_em > self.max_idle):
+            removidas.append(self._ociosas.popleft())
+        return removidas
+
+    def _descartar(self, conn):
+        with self._cond:
+            self._descartadas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ----- utilidades -----
+    def warm(self):
+        """Abre conexões até ter min_size ociosas (aquecimento na inicialização)."""
+        while True:
+            with self._cond:
+                total = self._em_uso + len(self._ociosas)
+                if self._fechado or len(self._ociosas) >= self.min_size or total >= self.max_size:
+                    return
+                self._em_uso += 1
+            try:
+                entrada = _EntradaPool(self._connect())
+            except Exception:
+                with self._cond:
+                    self._em_uso -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._criadas += 1
+            self.putconn(entrada)
+
+    def close(self):
+        """Fecha todas as conexões ociosas; as emprestadas são fechadas na devolução."""
+        with self._cond:
+            self._fechado = True
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+            self._cond.notify_all()
+        for entrada in ociosas:
+            self._descartar(entrada.conn)
+
+    def stats(self):
+        """Retorna um retrato do pool: conexões em uso, ociosas, espera etc."""
+        with self._cond:
+            media = self._espera_total / self._checkouts if self._checkouts else 0.0
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._em_uso,
+                "idle": len(self._ociosas),
+                "waiters": self._aguardando,
+                "checkouts": self._checkouts,
+                "wait_time_total_ms": round(self._espera_total * 1000, 3),
+                "wait_time_avg_ms": round(media * 1000, 3),
+                "wait_time_max_ms": round(self._espera_max * 1000, 3),
+                "timeouts": self._timeouts,
+                "connections_created": self._criadas,
+                "connections_discarded": self._descartadas,
+            }
+
+
+# ================================================================
+# POOL GLOBAL DA APLICAÇÃO
+# ================================================================
+_pool = None
+_pool_dsn = None
+_pool_pid = None
+_pools_herdados = []  # pools herdados de um fork: nunca fechar sockets do processo pai
+_pool_lock = threading.Lock()
+
+
+def _config_float(nome, padrao):
+    valor = os.getenv(nome)
+    return float(valor) if valor else padrao
+
+
+# ================================================================
+# NEGOCIAÇÃO DO MODO SSL
+# ================================================================
+# Antes, toda conexão tentava sslmode='require' e, se falhasse, 'disable'.
+# Em ambientes sem SSL isso custava um handshake TLS perdido por conexão.
+# O negociador descobre uma vez qual modo funciona, guarda o modo e os
+# parâmetros do DSN, e só refaz a sondagem depois de um intervalo
+# configurável ou de uma sequência de falhas com o modo guardado.
+
+class NegociadorSSL:
+    """Descobre e memoriza o sslmode que funciona para um DATABASE_URL."""
+
+    MODOS = ("require", "disable")  # ordem de preferência
+
+    def __init__(self, DATABASE_URL, intervalo_resondagem=3600.0, limite_falhas=3,
+                 connect_timeout=10):
+        # parse_dsn aceita tanto URL (postgres://...) quanto "chave=valor"
+        self.parametros = extensions.parse_dsn(DATABASE_URL)
+        self.parametros.setdefault("connect_timeout", str(connect_timeout))
+        # Se o próprio DSN fixa o sslmode, respeita e não sonda
+        modo_fixo = self.parametros.pop("sslmode", None)
+        self.modos = (modo_fixo,) if modo_fixo else self.MODOS
+        self.intervalo_resondagem = intervalo_resondagem
+        self.limite_falhas = limite_falhas
+        self._lock = threading.Lock()
+        self._modo = None
+        self._negociado_em = 0.0
+        self._falhas = 0
+
+    @property
+    def modo(self):
+        """Modo SSL em uso (None enquanto não negociado)."""
+        return self._modo
+
+    def _modo_valido(self):
+        if self._modo is None:
+            return None
+        if time.monotonic() - self._negociado_em >= self.intervalo_resondagem:
+            return None
+        return self._modo
+
+    def conectar(self):
+        """Abre uma conexão física usando o modo memorizado (ou sondando)."""
+        modo = self._modo_valido()
+        if modo is None:
+            return self._sondar()
+        try:
+            conn = psycopg2.connect(sslmode=modo, **self.parametros)
+        except OperationalError as e:
+            with self._lock:
+                self._falhas += 1
+                esgotou = self._falhas >= self.limite_falhas
+                if esgotou and self._modo == modo:
+                    print(f"⚠️ {self._falhas} falhas seguidas com sslmode='{modo}', refazendo negociação")
+                    self._modo = None
+            if esgotou:
+                return self._sondar()
+            raise e
+        self._falhas = 0
+        return conn
+
+    def _sondar(self):
+        # Apenas uma thread sonda por vez; as outras reaproveitam o resultado
+        with self._lock:
+            modo = self._modo_valido()
+            if modo is not None:
+                return psycopg2.connect(sslmode=modo, **self.parametros)
+            ultimo_erro = None
+            for modo in self.modos:
+                try:
+                    print(f"🔗 Tentando conectar ao banco (sslmode='{modo}')...")
+                    conn = psycopg2.connect(sslmode=modo, **self.parametros)
+                except OperationalError as e:
+                    print(f"❌ Erro de conexão com sslmode='{modo}': {e}")
+                    ultimo_erro = e
+                    continue
+                self._modo = modo
+                self._negociado_em = time.monotonic()
+                self._falhas = 0
+                print(f"✅ Conexão estabelecida! Modo SSL ativo: '{modo}'")
+                return conn
+            raise ultimo_erro
+
+
+_negociador = None
+
+
+def ssl_mode():
+    """Modo SSL negociado com o banco (None se ainda não houve conexão)."""
+    return _negociador.modo if _negociador is not None else None
+
+
+def get_pool(DATABASE_URL=None):
+    """
+    Retorna o pool global, criando-o na primeira chamada.
+
+    Configuração via .env:
+    - DB_POOL_MIN_SIZE (1), DB_POOL_MAX_SIZE (10)
+    - DB_POOL_TIMEOUT (10 s de espera por conexão livre)
+    - DB_POOL_MAX_IDLE (300 s), DB_POOL_MAX_LIFETIME (1800 s)
+    - DB_POOL_CHECK_INTERVAL (10 s parada antes do teste de vida)
+    - DB_SSL_REPROBE_INTERVAL (3600 s até renegociar o modo SSL)
+    - DB_SSL_FAILURE_THRESHOLD (3 falhas seguidas forçam nova negociação)
+    - DB_CONNECT_TIMEOUT (10 s para abrir uma conexão física)
+    """
+    global _pool, _pool_dsn, _pool_pid, _negociador
+    DATABASE_URL = DATABASE_URL or os.getenv("DATABASE_URL")
+    with _pool_lock:
+        if _pool is not None and _pool_pid != os.getpid():
+            # Processo filho de um fork: as conexões pertencem ao pai
+            _pools_herdados.append(_pool)
+            _pool = None
+        if _pool is not None and _pool_dsn != DATABASE_URL:
+            _pool.close()
+            _pool = None
+        if _pool is None:
+            _negociador = NegociadorSSL(
+                DATABASE_URL,
+                intervalo_resondagem=_config_float("DB_SSL_REPROBE_INTERVAL", 3600.0),
+                limite_falhas=int(_config_float("DB_SSL_FAILURE_THRESHOLD", 3)),
+                connect_timeout=int(_config_float("DB_CONNECT_TIMEOUT", 10)),
+            )
+            _pool = ConnectionPool(
+                _negociador.conectar,
+                min_size=int(_config_float("DB_POOL_MIN_SIZE", 1)),
+                max_size=int(_config_float("DB_POOL_MAX_SIZE", 10)),
+                timeout=_config_float("DB_POOL_TIMEOUT", 10.0),
+                max_idle=_config_float("DB_POOL_MAX_IDLE", 300.0),
+                max_lifetime=_config_float("DB_POOL_MAX_LIFETIME", 1800.0),
+                check_interval=_config_float("DB_POOL_CHECK_INTERVAL", 10.0),
+            )
+            _pool_dsn = DATABASE_URL
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def pool_stats():
+    """Estatísticas do pool global (None se o pool ainda não foi criado)."""
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+def close_pool():
+    """Fecha o pool global (usado no encerramento do servidor)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+# ================================================================
+# UNIDADE DE TRABALHO (UMA CONEXÃO/TRANSAÇÃO POR REQUISIÇÃO)
+# ================================================================
+# Dentro de uma unidade de trabalho, todas as chamadas a get_connection()
+# recebem a MESMA conexão física e participam da MESMA transação, que é
+# confirmada uma única vez no final. Cada função continua chamando
+# commit()/rollback()/close() como sempre; esses comandos passam a atuar
+# sobre um SAVEPOINT próprio da função, preservando o comportamento de
+# cada uma (um rollback desfaz só o que aquela função fez).
+
+_unidade_atual = contextvars.ContextVar("unidade_de_trabalho", default=None)
+
+
+class ConexaoCompartilhada:
+    """Visão de uma função sobre a conexão da unidade de trabalho."""
+
+    def __init__(self, unidade, savepoint):
+        self._unidade = unidade
+        self._savepoint = savepoint
+        self._aberta = True
+
+    def __getattr__(self, nome):
+        if not self.__dict__.get("_aberta"):
+            raise InterfaceError("conexão já fechada")
+        return getattr(self._unidade.conn, nome)
+
+    @property
+    def closed(self):
+        return 0 if self._aberta else 1
+
+    def commit(self):
+        # "Confirma" o trecho da função e já abre o próximo savepoint
+        self._unidade.executar(f"RELEASE SAVEPOINT {self._savepoint}; SAVEPOINT {self._savepoint}")
+
+    def rollback(self):
+        self._unidade.executar(f"ROLLBACK TO SAVEPOINT {self._savepoint}")
+
+    def close(self):
+        # Fechar sem commit descarta o que não foi confirmado, como no psycopg2.
+        # Os comandos ficam pendentes e seguem junto com o próximo comando da unidade.
+        if self._aberta:
+            self._aberta = False
+            self._unidade.adiar(
+                f"ROLLBACK TO SAVEPOINT {self._savepoint}; RELEASE SAVEPOINT {self._savepoint}"
+            )
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class UnidadeDeTrabalho:
+    """
+    Empresta uma conexão/transação para todas as chamadas de get_connection().
+
+    A conexão só é retirada do pool no primeiro uso, então requisições que
+    não acessam o banco não ocupam conexão.
+
+    O conn.commit() das funções só libera o savepoint; o que depende da
+    transação confirmada (ex.: invalidar caches) é registrado com
+    apos_commit e roda depois do COMMIT real, em finalizar.
+    """
+
+    def __init__(self, pool=None):
+        self._pool = pool
+        self.conn = None
+        self._contador = 0
+        self._pendentes = []
+        self._apos_commit = []
+        self.finalizada = False
+
+    def conexao(self):
+        """Nova visão (com savepoint próprio) sobre a conexão compartilhada."""
+        if self.finalizada:
+            raise InterfaceError("unidade de trabalho já finalizada")
+        if self.conn is None:
+            self.conn = (self._pool or get_pool()).getconn()
+        self._contador += 1
+        savepoint = f"uow_{self._contador}"
+        self.executar(f"SAVEPOINT {savepoint}")
+        return ConexaoCompartilhada(self, savepoint)
+
+    def adiar(self, sql):
+        self._pendentes.append(sql)
+
+    def apos_commit(self, funcao, *args, **kwargs):
+        """Agenda `funcao` para depois do COMMIT; descartada se a transação for desfeita."""
+        self._apos_commit.append((funcao, args, kwargs))
+
+    def executar(self, sql):
+        pendentes = self._pendentes
+        self._pendentes = []
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("; ".join(pendentes + [sql]))
+        finally:
+            cursor.close()
+
+    def finalizar(self, commit=True):
+        """Confirma (ou desfaz) a transação e devolve a conexão ao pool."""
+        if self.finalizada:
+            return
+        self.finalizada = True
+        conn, self.conn = self.conn, None
+        acoes, self._apos_commit = self._apos_commit, []
+        if conn is not None:
+            try:
+                if commit:
+                    if self._pendentes:
+                        cursor = conn.cursor()
+                        cursor.execute("; ".join(self._pendentes))
+                        cursor.close()
+                    conn.commit()
+                else:
+                    conn.rollback()
+            finally:
+                self._pendentes = []
+                conn.close()
+        if commit:
+            for funcao, args, kwargs in acoes:
+                try:
+                    funcao(*args, **kwargs)
+                except Exception as e:
+                    print(f"⚠️ Erro em ação pós-commit {getattr(funcao, '__name__', funcao)}: {e}")
+
+
+@contextmanager
+def unidade_de_trabalho():
+    """
+    Context manager: tudo que usar get_connection() dentro do bloco
+    compartilha uma conexão e uma transação, confirmada ao sair do bloco
+    (ou desfeita se houver exceção). Blocos aninhados reaproveitam a
+    unidade externa.
+    """
+    atual = _unidade_atual.get()
+    if atual is not None and not atual.finalizada:
+        yield atual
+        return
+    unidade = UnidadeDeTrabalho()
+    token = _unidade_atual.set(unidade)
+    try:
+        yield unidade
+    except BaseException:
+        unidade.finalizar(commit=False)
+        raise
+    else:
+        unidade.finalizar(commit=True)
+    finally:
+        _unidade_atual.reset(token)
+
+
+def apos_commit(funcao, *args, **kwargs):
+    """
+    Executa `funcao` depois que a transação atual for confirmada de fato:
+    ao fim da unidade de trabalho ativa ou, sem unidade, imediatamente
+    (quem chama já fez o commit da própria conexão).
+    """
+    unidade = _unidade_atual.get()
+    if unidade is not None and not unidade.finalizada:
+        unidade.apos_commit(funcao, *args, **kwargs)
+    else:
+        funcao(*args, **kwargs)
+
+
+def init_app(app):
+    """
+    Registra os ganchos do Flask que abrem uma unidade de trabalho por
+    requisição. A transação é confirmada quando a resposta tem status < 500
+    e desfeita em erros 5xx ou exceções. Desative com DB_UNIT_OF_WORK=0.
+    """
+    if os.getenv("DB_UNIT_OF_WORK", "1") != "1":
+        return
+    from flask import g, jsonify
+
+    @app.before_request
+    def _abrir_unidade_de_trabalho():
+        g._uow_token = _unidade_atual.set(UnidadeDeTrabalho())
+
+    @app.after_request
+    def _confirmar_unidade_de_trabalho(response):
+        unidade = _unidade_atual.get()
+        if unidade is not None:
+            try:
+                unidade.finalizar(commit=response.status_code < 500)
+            except Exception as e:
+                print(f"❌ Erro ao confirmar transação da requisição: {e}")
+                return jsonify({"erro": "Erro ao salvar alterações"}), 500
+        return response
+
+    @app.teardown_request
+    def _encerrar_unidade_de_trabalho(exc):
+        unidade = _unidade_atual.get()
+        if unidade is not None:
+            try:
+                unidade.finalizar(commit=False)  # no-op se já confirmada
+            except Exception as e:
+                print(f"❌ Erro ao desfazer transação da requisição: {e}")
+        token = g.pop("_uow_token", None)
+        if token is not None:
+            _unidade_atual.reset(token)
 
-# ===== CARREGAMENTO DE CONFIGURAÇÕES =====
-# Carrega todas as variáveis do arquivo .env para uso seguro
-load_dotenv()
 
 def get_connection():
     """
     FUNÇÃO PRINCIPAL: Conecta ao banco de dados PostgreSQL
-    
+
     Como funciona:
     1. Pega a URL do banco do arquivo .env
-    2. Tenta conectar com SSL (segurança)
-    3. Se falhar, tenta sem SSL
-    4. Retorna a conexão ou None se falhar
+    2. Empresta uma conexão do pool (abrindo uma nova, no modo SSL negociado, se preciso)
+    3. Retorna a conexão ou None se falhar
+
+    IMPORTANTE: conn.close() devolve a conexão ao pool. Dentro de uma
+    unidade de trabalho, a conexão é compartilhada (ver UnidadeDeTrabalho).
     """
     try:
         # ===== OBTER URL DO BANCO =====
@@ -28,28 +749,23 @@ def get_connection():
         if not DATABASE_URL:
             print("❌ Erro: DATABASE_URL não encontrada no arquivo .env")
             return None
-            
-        # ===== TENTATIVA DE CONEXÃO COM SSL =====
-        print(f"🔗 Tentando conectar ao banco...")
-        # sslmode='require': Força conexão segura (criptografada)
-        conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-        print("✅ Conexão estabelecida com sucesso!")
-        return conn
-        
+
+        # ===== UNIDADE DE TRABALHO ATIVA =====
+        unidade = _unidade_atual.get()
+        if unidade is not None and not unidade.finalizada:
+            return unidade.conexao()
+
+        # ===== EMPRÉSTIMO DO POOL =====
+        return get_pool(DATABASE_URL).getconn()
+
+    except PoolTimeout as e:
+        print(f"❌ Pool de conexões esgotado: {e}")
+        return None
+
     except OperationalError as e:
         print(f"❌ Erro de conexão ao banco de dados: {e}")
-        
-        # ===== TENTATIVA ALTERNATIVA SEM SSL =====
-        # Se SSL falhar, tenta conectar sem criptografia
-        try:
-            print("🔄 Tentando conectar sem SSL...")
-            conn = psycopg2.connect(DATABASE_URL, sslmode='disable')
-            print("✅ Conexão estabelecida sem SSL!")
-            return conn
-        except Exception as e2:
-            print(f"❌ Erro mesmo sem SSL: {e2}")
-            return None
-            
+        return None
+
     except Exception as e:
         print(f"❌ Erro geral ao conectar: {e}")
         return None
@@ -57,7 +773,7 @@ def get_connection():
 def test_connection():
     """
     FUNÇÃO DE TESTE: Verifica se a conexão está funcionando
-    
+
     Útil para:
     - Testar configuração do banco
     - Debugar problemas de conexão
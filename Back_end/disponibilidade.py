@@ -0,0 +1,408 @@
+"""
+Motor de disponibilidade de horários
+
+Calcula os horários livres de um massoterapeuta a partir das regras de
+funcionamento da clínica (as mesmas usadas em cadastrar_agendamento)
+menos os agendamentos ativos que ocupam cada faixa.
+
+Cada dia é representado por um bitmap (int): o bit i ligado significa que
+o horário HORA_ABERTURA + i * DURACAO_SESSAO está livre. Os bitmaps são
+calculados por semana (segunda a domingo) e guardados num cache em memória
+com TTL, invalidado quando um agendamento é criado, cancelado ou muda de
+status neste processo. Em outros processos o dado pode ficar defasado por
+até DISPONIBILIDADE_CACHE_TTL segundos, o que não permite reservas duplas:
+a constraint de exclusão do banco continua sendo a palavra final.
+"""
+
+import os
+import threading
+import time as _relogio
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from Back_end.database import apos_commit, get_connection
+
+# ===== REGRAS DE FUNCIONAMENTO DA CLÍNICA =====
+@lru_cache(maxsize=None)
+def fuso_clinica():
+    """Fuso da clínica. pytz é importado no primeiro uso, não na subida do servidor."""
+    import pytz
+    return pytz.timezone('America/Sao_Paulo')
+
+
+# weekday(): 0=segunda ... 3=quinta
+DIAS_FUNCIONAMENTO = (0, 1, 2, 3)
+HORA_ABERTURA = time(8, 0)
+# Último início aceito (sessão das 18:00 inclusive)
+HORA_ULTIMO_INICIO = time(18, 0)
+DURACAO_SESSAO = timedelta(hours=1)
+STATUS_ATIVOS = ('marcado', 'confirmado', 'pendente')
+
+_MINUTOS_ABERTURA = HORA_ABERTURA.hour * 60 + HORA_ABERTURA.minute
+_MINUTOS_SESSAO = int(DURACAO_SESSAO.total_seconds() // 60)
+SLOTS_POR_DIA = (
+    (HORA_ULTIMO_INICIO.hour * 60 + HORA_ULTIMO_INICIO.minute - _MINUTOS_ABERTURA) // _MINUTOS_SESSAO + 1
+)
+DIA_TODO_LIVRE = (1 << SLOTS_POR_DIA) - 1
+
+# Intervalo máximo aceito em uma consulta (limita trabalho e payload)
+MAX_DIAS_CONSULTA = int(os.getenv("DISPONIBILIDADE_MAX_DIAS", "31"))
+
+
+def dia_de_funcionamento(dia):
+    return dia.weekday() in DIAS_FUNCIONAMENTO
+
+
+def horario_de_funcionamento(hora):
+    """True se a sessão pode começar neste horário (8:00 às 18:00)."""
+    return HORA_ABERTURA <= hora <= HORA_ULTIMO_INICIO
+
+
+def inicio_do_slot(dia, indice):
+    """Datetime (fuso da clínica) em que começa o slot `indice` do dia."""
+    ingenuo = datetime.combine(dia, HORA_ABERTURA) + indice * DURACAO_SESSAO
+    return fuso_clinica().localize(ingenuo)
+
+
+def _minutos_do_dia(momento, dia):
+    """Minutos desde a meia-noite de `dia` (pode ser negativo ou passar de 24h)."""
+    local = momento.astimezone(fuso_clinica())
+    delta = datetime.combine(local.date(), local.time()) - datetime.combine(dia, time(0, 0))
+    return int(delta.total_seconds() // 60)
+
+
+def mascara_ocupada(dia, inicio, fim):
+    """Bits dos slots de `dia` que se sobrepõem ao intervalo [inicio, fim)."""
+    m_inicio = _minutos_do_dia(inicio, dia) - _MINUTOS_ABERTURA
+    m_fim = _minutos_do_dia(fim, dia) - _MINUTOS_ABERTURA
+    primeiro = max(0, m_inicio // _MINUTOS_SESSAO)
+    ultimo = min(SLOTS_POR_DIA, -(-m_fim // _MINUTOS_SESSAO))  # teto
+    if ultimo <= primeiro:
+        return 0
+    return ((1 << (ultimo - primeiro)) - 1) << primeiro
+
+
+def mapa_do_dia(dia, ocupados):
+    """
+    Bitmap de slots livres do dia, descontando os intervalos ocupados.
+    Dias sem funcionamento retornam 0.
+    """
+    if not dia_de_funcionamento(dia):
+        return 0
+    mapa = DIA_TODO_LIVRE
+    for inicio, fim in ocupados:
+        mapa &= ~mascara_ocupada(dia, inicio, fim)
+    return mapa
+
+
+def slots_livres(dia, mapa):
+    """Converte o bitmap do dia na lista de datetimes de início livres."""
+    return [inicio_do_slot(dia, i) for i in range(SLOTS_POR_DIA) if mapa >> i & 1]
+
+
+def segunda_da_semana(dia):
+    return dia - timedelta(days=dia.weekday())
+
+
+# ===== CACHE POR MASSOTERAPEUTA E SEMANA =====
+class CacheSemanas:
+    """Cache (massoterapeuta_id, segunda-feira) -> {data: bitmap} com TTL."""
+
+    def __init__(self, ttl=60.0, relogio=_relogio.monotonic):
+        self.ttl = ttl
+        self._relogio = relogio
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def obter(self, massoterapeuta_id, segunda):
+        with self._lock:
+            entrada = self._dados.get((massoterapeuta_id, segunda))
+            if entrada is None:
+                return None
+            expira_em, mapas = entrada
+            if self._relogio() >= expira_em:
+                del self._dados[(massoterapeuta_id, segunda)]
+                return None
+            return mapas
+
+    def guardar(self, massoterapeuta_id, segunda, mapas):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._dados[(massoterapeuta_id, segunda)] = (self._relogio() + self.ttl, mapas)
+
+    def invalidar(self, massoterapeuta_id=None, segunda=None):
+        """Sem argumentos limpa tudo; com massoterapeuta_id limpa só as semanas dele."""
+        with self._lock:
+            if massoterapeuta_id is None:
+                self._dados.clear()
+                return
+            for chave in list(self._dados):
+                if chave[0] == massoterapeuta_id and segunda in (None, chave[1]):
+                    del self._dados[chave]
+
+
+_cache = CacheSemanas(ttl=float(os.getenv("DISPONIBILIDADE_CACHE_TTL", "60")))
+
+
+def invalidar_disponibilidade(massoterapeuta_id=None, data_hora=None):
+    """
+    Descarta a disponibilidade em cache após mudanças na agenda.
+    Com data_hora, limpa só a semana afetada; sem massoterapeuta_id, limpa tudo.
+    Dentro de uma unidade de trabalho, roda só depois do COMMIT real: antes
+    dele, outra requisição recalcularia o cache com a agenda antiga.
+    """
+    apos_commit(_invalidar, massoterapeuta_id, data_hora)
+
+
+def _invalidar(massoterapeuta_id, data_hora):
+    segunda = None
+    if massoterapeuta_id is not None and isinstance(data_hora, datetime):
+        if data_hora.tzinfo is not None:
+            data_hora = data_hora.astimezone(fuso_clinica())
+        segunda = segunda_da_semana(data_hora.date())
+    _cache.invalidar(massoterapeuta_id, segunda)
+
+
+def _buscar_ocupados(massoterapeuta_id, inicio, fim):
+    """
+    Intervalos ocupados do massoterapeuta entre as datas [inicio, fim).
+    Só lê o trecho pedido (usa idx_agendamento_massoterapeuta_data_ativo).
+    Retorna None em caso de erro de banco.
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        limite_inferior = fuso_clinica().localize(datetime.combine(inicio, time(0, 0))) - DURACAO_SESSAO
+        limite_superior = fuso_clinica().localize(datetime.combine(fim, time(0, 0)))
+        cursor.execute("""
+            SELECT data_hora FROM agendamento
+            WHERE massoterapeuta_id = %s
+              AND status IN ('marcado', 'confirmado', 'pendente')
+              AND data_hora >= %s AND data_hora < %s
+        """, (massoterapeuta_id, limite_inferior, limite_superior))
+        return [(linha[0], linha[0] + DURACAO_SESSAO) for linha in cursor.fetchall()]
+    except Exception as e:
+        print(f"Erro ao buscar agendamentos para disponibilidade: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def mapas_da_semana(ocupados, segunda):
+    """Bitmaps dos 7 dias da semana iniciada em `segunda`."""
+    mapas = {}
+    for deslocamento in range(7):
+        dia = segunda + timedelta(days=deslocamento)
+        mapas[dia] = mapa_do_dia(dia, ocupados)
+    return mapas
+
+
+def calcular_disponibilidade(massoterapeuta_id, inicio, fim):
+    """
+    Bitmaps de slots livres por dia no intervalo de datas [inicio, fim] (inclusive).
+    Semanas em cache não vão ao banco; as demais são lidas numa única consulta.
+    Retorna {data: bitmap} ou None se o banco falhar.
+    """
+    segundas = []
+    segunda = segunda_da_semana(inicio)
+    while segunda <= fim:
+        segundas.append(segunda)
+        segunda += timedelta(days=7)
+
+    mapas = {}
+    faltantes = []
+    for segunda in segundas:
+        em_cache = _cache.obter(massoterapeuta_id, segunda)
+        if em_cache is None:
+            faltantes.append(segunda)
+        else:
+            mapas.update(em_cache)
+
+    if faltantes:
+        ocupados = _buscar_ocupados(massoterapeuta_id, faltantes[0], faltantes[-1] + timedelta(days=7))
+        if ocupados is None:
+            return None
+        for segunda in faltantes:
+            da_semana = mapas_da_semana(ocupados, segunda)
+            _cache.guardar(massoterapeuta_id, segunda, da_semana)
+            mapas.update(da_semana)
+
+    return {dia: mapa for dia, mapa in mapas.items() if inicio <= dia <= fim}
+
+
+def horarios_livres(massoterapeuta_id, inicio, fim, agora=None):
+    """
+    Horários livres por dia, já sem os que estão no passado.
+    Retorna lista [{"data": "YYYY-MM-DD", "horarios": ["YYYY-MM-DDTHH:MM:SS", ...]}]
+    apenas com dias de funcionamento, ou None se o banco falhar.
+    """
+    mapas = calcular_disponibilidade(massoterapeuta_id, inicio, fim)
+    if mapas is None:
+        return None
+    agora = agora or datetime.now(fuso_clinica())
+    dias = []
+    for dia in sorted(mapas):
+        if not dia_de_funcionamento(dia):
+            continue
+        horarios = [
+            slot.strftime("%Y-%m-%dT%H:%M:%S")
+            for slot in slots_livres(dia, mapas[dia])
+            if slot >= agora
+        ]
+        dias.append({"data": dia.isoformat(), "horarios": horarios})
+    return dias
+
+
+# ===== MATRIZ DA CLÍNICA (TODOS OS MASSOTERAPEUTAS) =====
+# A semana de cada massoterapeuta vira um único int: os dias de funcionamento
+# ficam lado a lado, SLOTS_POR_DIA bits cada (coluna = posição do dia * SLOTS_POR_DIA + slot).
+# "Algum massoterapeuta livre" é um OR entre as linhas; filtrar o passado é um AND.
+COLUNAS_POR_SEMANA = len(DIAS_FUNCIONAMENTO) * SLOTS_POR_DIA
+MAX_PRIMEIROS = 50
+# Quantas semanas o modo "primeiros horários" percorre antes de desistir
+MAX_SEMANAS_PRIMEIROS = int(os.getenv("DISPONIBILIDADE_MAX_SEMANAS_PRIMEIROS", "4"))
+
+
+def dias_da_semana_util(segunda):
+    return [segunda + timedelta(days=d) for d in DIAS_FUNCIONAMENTO]
+
+
+def compactar_semana(mapas, segunda):
+    """Junta os bitmaps diários dos dias de funcionamento num int da semana."""
+    semana = 0
+    for posicao, dia in enumerate(dias_da_semana_util(segunda)):
+        semana |= mapas.get(dia, 0) << (posicao * SLOTS_POR_DIA)
+    return semana
+
+
+def horario_da_coluna(segunda, coluna):
+    posicao, indice = divmod(coluna, SLOTS_POR_DIA)
+    return inicio_do_slot(dias_da_semana_util(segunda)[posicao], indice)
+
+
+def mascara_futuro(segunda, agora):
+    """Bits das colunas da semana cujo início ainda não passou."""
+    mascara = 0
+    for coluna in range(COLUNAS_POR_SEMANA):
+        if horario_da_coluna(segunda, coluna) >= agora:
+            mascara |= 1 << coluna
+    return mascara
+
+
+def _buscar_agenda_clinica(segunda):
+    """
+    Todos os massoterapeutas com os agendamentos ativos da semana, numa única
+    consulta (LEFT JOIN para incluir quem está com a agenda vazia).
+    Retorna [(id, nome, [(inicio, fim), ...])] na ordem de nome, ou None em erro.
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        limite_inferior = fuso_clinica().localize(datetime.combine(segunda, time(0, 0))) - DURACAO_SESSAO
+        limite_superior = fuso_clinica().localize(datetime.combine(segunda + timedelta(days=7), time(0, 0)))
+        cursor.execute("""
+            SELECT m.id, m.nome, a.data_hora
+            FROM massoterapeuta m
+            LEFT JOIN agendamento a
+              ON a.massoterapeuta_id = m.id
+             AND a.status IN ('marcado', 'confirmado', 'pendente')
+             AND a.data_hora >= %s AND a.data_hora < %s
+            ORDER BY m.nome ASC, m.id ASC
+        """, (limite_inferior, limite_superior))
+        agenda = []
+        for massoterapeuta_id, nome, data_hora in cursor.fetchall():
+            if not agenda or agenda[-1][0] != massoterapeuta_id:
+                agenda.append((massoterapeuta_id, nome, []))
+            if data_hora is not None:
+                agenda[-1][2].append((data_hora, data_hora + DURACAO_SESSAO))
+        return agenda
+    except Exception as e:
+        print(f"Erro ao buscar agenda da clínica: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def matriz_semana(segunda, agora=None):
+    """
+    Disponibilidade de todos os massoterapeutas na semana iniciada em `segunda`.
+    Retorna [(id, nome, bits_da_semana)] já sem horários passados, ou None em erro.
+    Aproveita a consulta para aquecer o cache por massoterapeuta.
+    """
+    agenda = _buscar_agenda_clinica(segunda)
+    if agenda is None:
+        return None
+    futuro = mascara_futuro(segunda, agora or datetime.now(fuso_clinica()))
+    matriz = []
+    for massoterapeuta_id, nome, ocupados in agenda:
+        mapas = mapas_da_semana(ocupados, segunda)
+        _cache.guardar(massoterapeuta_id, segunda, mapas)
+        matriz.append((massoterapeuta_id, nome, compactar_semana(mapas, segunda) & futuro))
+    return matriz
+
+
+def matriz_disponibilidade(segunda, agora=None):
+    """
+    Formato da API: colunas com os horários da semana e, por massoterapeuta,
+    uma lista de booleanos alinhada às colunas. Retorna None em erro.
+    """
+    matriz = matriz_semana(segunda, agora)
+    if matriz is None:
+        return None
+    return {
+        "semana": segunda.isoformat(),
+        "horarios": [
+            horario_da_coluna(segunda, c).strftime("%Y-%m-%dT%H:%M:%S")
+            for c in range(COLUNAS_POR_SEMANA)
+        ],
+        "massoterapeutas": [
+            {
+                "id": massoterapeuta_id,
+                "nome": nome,
+                "disponivel": [bool(bits >> c & 1) for c in range(COLUNAS_POR_SEMANA)],
+            }
+            for massoterapeuta_id, nome, bits in matriz
+        ],
+    }
+
+
+def primeiros_livres(segunda, quantidade, agora=None):
+    """
+    Os `quantidade` primeiros horários em que algum massoterapeuta está livre,
+    a partir da semana `segunda` (até MAX_SEMANAS_PRIMEIROS semanas).
+    Retorna [{"data_hora": ..., "massoterapeutas": [{"id", "nome"}]}] ou None em erro.
+    """
+    encontrados = []
+    for _ in range(MAX_SEMANAS_PRIMEIROS):
+        matriz = matriz_semana(segunda, agora)
+        if matriz is None:
+            return None
+        algum_livre = 0
+        for _, _, bits in matriz:
+            algum_livre |= bits
+        while algum_livre and len(encontrados) < quantidade:
+            coluna = (algum_livre & -algum_livre).bit_length() - 1  # bit mais baixo = mais cedo
+            algum_livre &= algum_livre - 1
+            encontrados.append({
+                "data_hora": horario_da_coluna(segunda, coluna).strftime("%Y-%m-%dT%H:%M:%S"),
+                "massoterapeutas": [
+                    {"id": massoterapeuta_id, "nome": nome}
+                    for massoterapeuta_id, nome, bits in matriz
+                    if bits >> coluna & 1
+                ],
+            })
+        if len(encontrados) >= quantidade:
+            break
+        segunda += timedelta(days=7)
+    return encontrados
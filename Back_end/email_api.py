@@ -2,104 +2,298 @@
 
 # ===== IMPORTS NECESSÁRIOS =====
 import os  # Para acessar variáveis de ambiente do sistema
-import requests  # Para fazer requisições HTTP (SendGrid API)
-import smtplib  # Para envio via SMTP (Gmail)
-from email.mime.text import MIMEText  # Para formatar emails SMTP
-from email.mime.multipart import MIMEMultipart  # Para emails multipart
-from dotenv import load_dotenv  # Carrega variáveis do arquivo .env
+from Back_end import http_client  # Cliente HTTP compartilhado (keep-alive, timeouts, novas tentativas)
+from Back_end.circuit_breaker import CircuitBreaker  # Pula provedores degradados
+from Back_end.smtp_pool import PoolSMTP  # Sessões SMTP autenticadas reaproveitadas
+from Back_end.config import settings  # Configurações do .env, carregadas uma vez
 import jwt  # Para gerar e verificar tokens JWT
 from datetime import datetime, timedelta  # Manipulação de datas
 
-# ===== CARREGAMENTO DE CONFIGURAÇÕES =====
-load_dotenv()  # Carrega todas as variáveis do arquivo .env
-
 # ===== CONFIGURAÇÕES DO SENDGRID =====
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")  # Chave da API SendGrid
+SENDGRID_API_KEY = settings.sendgrid_api_key  # Chave da API SendGrid
 SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"  # URL da API SendGrid
 
 # ===== CONFIGURAÇÕES DO GMAIL SMTP (FALLBACK) =====
-GMAIL_USER = os.getenv("GMAIL_USER")  # Email Gmail para envio
-GMAIL_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")  # Senha de app do Gmail
+GMAIL_USER = settings.gmail_user  # Email Gmail para envio
+GMAIL_PASSWORD = settings.gmail_password  # Senha de app do Gmail
 SMTP_SERVER = "smtp.gmail.com"  # Servidor SMTP do Gmail
 SMTP_PORT = 587  # Porta SMTP (TLS)
 
 # ===== CONFIGURAÇÕES DE EMAIL =====
-SENDER_EMAIL = os.getenv("SENDER_EMAIL")  # Email remetente (configurado no SendGrid)
-SENDER_NAME = os.getenv("SENDER_NAME", "Massoterapia TCC")  # Nome do remetente
-EMAIL_SECRET = os.getenv("EMAIL_SECRET", "supersecret")  # Chave secreta para tokens JWT
+SENDER_EMAIL = settings.sender_email  # Email remetente (configurado no SendGrid)
+SENDER_NAME = settings.sender_name  # Nome do remetente
+EMAIL_SECRET = settings.email_secret  # Chave secreta para tokens JWT
+
+# ===== CIRCUIT BREAKERS DOS PROVEDORES =====
+# Respostas que indicam provedor degradado (abrem o circuito); outros erros
+# 4xx são problema da mensagem e só passam para o próximo provedor
+STATUS_FALHA_PROVEDOR = frozenset({401, 403, 429, 500, 502, 503, 504})
+SENDGRID_SONDA_URL = "https://api.sendgrid.com/v3/scopes"  # GET barato para testar a chave/API
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))  # Segundos para conectar/responder no SMTP
+
+
+def _sendgrid_configurado():
+    return bool(SENDGRID_API_KEY) and SENDGRID_API_KEY != "SG.xxxxxx_SUBSTITUA_PELA_CHAVE_REAL_xxxx"
+
+
+def _smtp_configurado():
+    return bool(GMAIL_USER and GMAIL_PASSWORD)
+
+
+def _sondar_sendgrid():
+    """Sonda de recuperação: a API responde e aceita a chave?"""
+    response = http_client.get(
+        SENDGRID_SONDA_URL, "sendgrid_sonda",
+        headers={"Authorization": f"Bearer {SENDGRID_API_KEY}"},
+    )
+    return response.status_code == 200
+
+
+def _sondar_smtp():
+    """Sonda de recuperação: o servidor SMTP aceita conexão e responde ao NOOP?"""
+    import smtplib  # Só no fallback: smtplib não entra na subida do servidor
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    try:
+        codigo, _ = server.noop()
+        return codigo == 250
+    finally:
+        server.close()
+
+
+def _criar_breaker(nome, sonda):
+    return CircuitBreaker(
+        nome,
+        janela=int(os.getenv("EMAIL_CB_JANELA", "20")),
+        taxa_falha=float(os.getenv("EMAIL_CB_TAXA_FALHA", "0.5")),
+        minimo_chamadas=int(os.getenv("EMAIL_CB_MINIMO_CHAMADAS", "5")),
+        tempo_aberto=float(os.getenv("EMAIL_CB_TEMPO_ABERTO", "30")),
+        sonda=sonda,
+    )
+
+
+# Sessões SMTP autenticadas reaproveitadas entre mensagens (conecta só no primeiro envio)
+_pool_smtp = PoolSMTP(SMTP_SERVER, SMTP_PORT, GMAIL_USER, GMAIL_PASSWORD, timeout=SMTP_TIMEOUT)
+
+_breakers = {
+    "sendgrid": _criar_breaker("sendgrid", _sondar_sendgrid),
+    "gmail_smtp": _criar_breaker("gmail_smtp", _sondar_smtp),
+}
+
+
+def estado_provedores():
+    """Estado do circuit breaker de cada provedor de e-mail, para /health."""
+    configurados = {"sendgrid": _sendgrid_configurado(), "gmail_smtp": _smtp_configurado()}
+    estado = {
+        nome: dict(breaker.como_dict(), configurado=configurados[nome])
+        for nome, breaker in _breakers.items()
+    }
+    estado["gmail_smtp"]["sessoes"] = _pool_smtp.estatisticas()
+    return estado
+
+
+# ===== ENVIO POR PROVEDOR =====
+def _enviar_sendgrid(to_email, subject, content):
+    """Envia pelo SendGrid. Retorna (status_code, response_text); levanta exceção em falha de rede."""
+    headers = {  # Cabeçalhos da requisição HTTP
+        "Authorization": f"Bearer {SENDGRID_API_KEY}",  # Token de autenticação
+        "Content-Type": "application/json"  # Tipo de conteúdo JSON
+    }
+    data = {  # Estrutura dos dados do email
+        "personalizations": [  # Lista de destinatários
+            {"to": [{"email": to_email}]}  # Email do destinatário
+        ],
+        "from": {  # Dados do remetente
+            "email": SENDER_EMAIL,  # Email remetente
+            "name": SENDER_NAME  # Nome remetente
+        },
+        "subject": subject,  # Assunto do email
+        "content": [  # Lista de conteúdos
+            {"type": "text/plain", "value": content}  # Conteúdo em texto puro
+        ]
+    }
+    response = http_client.post(SENDGRID_URL, "sendgrid", json=data, headers=headers)  # POST pela conexão keep-alive compartilhada
+    return response.status_code, response.text
+
+
+def _enviar_smtp(to_email, subject, content):
+    """Envia pelo Gmail SMTP (sessão reaproveitada do pool). Retorna (202, texto); levanta exceção em falha."""
+    # email.mime só é carregado quando o fallback SMTP é de fato usado
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    # Cria mensagem
+    msg = MIMEMultipart()
+    msg['From'] = f"{SENDER_NAME} <{GMAIL_USER}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    # Adiciona corpo do email
+    msg.attach(MIMEText(content, 'plain'))
+
+    # Envia pela sessão já autenticada (sem novo STARTTLS/login por mensagem)
+    _pool_smtp.enviar(GMAIL_USER, to_email, msg.as_string())
+
+    print("Email enviado com sucesso via Gmail SMTP")
+    return 202, "Email enviado via Gmail SMTP (fallback)"
+
+
+def _provedores_configurados():
+    """Provedores em ordem de preferência: SendGrid (primário), Gmail SMTP (fallback)."""
+    provedores = []
+    if _sendgrid_configurado():
+        provedores.append(("sendgrid", _enviar_sendgrid))
+    if _smtp_configurado():
+        provedores.append(("gmail_smtp", _enviar_smtp))
+    return provedores
+
 
 # ===== FUNÇÃO PRINCIPAL: ENVIAR EMAIL =====
 def send_email(to_email, subject, content):
     """
     Envia email usando SendGrid (primário) ou Gmail SMTP (fallback)
-    
+
+    Provedores com circuito aberto são pulados sem custo: durante uma
+    queda do SendGrid o envio vai direto para o SMTP, e uma sonda em
+    segundo plano fecha o circuito quando o SendGrid voltar.
+
     Parâmetros:
     - to_email: Email do destinatário
     - subject: Assunto do email
     - content: Conteúdo em texto puro
-    
+
     Retorna:
-    - Tupla (status_code, response_text)
+    - Tupla (status_code, response_text); 503 se todos os circuitos estão abertos
     """
-    # Tenta enviar via SendGrid primeiro
-    if SENDGRID_API_KEY and SENDGRID_API_KEY != "SG.xxxxxx_SUBSTITUA_PELA_CHAVE_REAL_xxxx":
+    provedores = _provedores_configurados()
+    if not provedores:
+        return 500, "Falha no envio: SendGrid e Gmail SMTP indisponíveis"
+
+    resultado = None
+    for nome, enviar in provedores:
+        breaker = _breakers[nome]
+        if not breaker.permite():
+            print(f"Circuito do provedor {nome} aberto, pulando...")
+            continue
         try:
-            headers = {  # Cabeçalhos da requisição HTTP
-                "Authorization": f"Bearer {SENDGRID_API_KEY}",  # Token de autenticação
-                "Content-Type": "application/json"  # Tipo de conteúdo JSON
-            }
-            data = {  # Estrutura dos dados do email
-                "personalizations": [  # Lista de destinatários
-                    {"to": [{"email": to_email}]}  # Email do destinatário
-                ],
-                "from": {  # Dados do remetente
-                    "email": SENDER_EMAIL,  # Email remetente
-                    "name": SENDER_NAME  # Nome remetente
-                },
-                "subject": subject,  # Assunto do email
-                "content": [  # Lista de conteúdos
-                    {"type": "text/plain", "value": content}  # Conteúdo em texto puro
-                ]
-            }
-            response = requests.post(SENDGRID_URL, json=data, headers=headers)  # Faz requisição POST
-            if response.status_code == 202:  # SendGrid retorna 202 para sucesso
-                return response.status_code, response.text
-            else:
-                print(f"SendGrid falhou (Status: {response.status_code}), tentando Gmail SMTP...")
+            status, texto = enviar(to_email, subject, content)
         except Exception as e:
-            print(f"Erro no SendGrid: {str(e)}, tentando Gmail SMTP...")
-    
-    # Fallback para Gmail SMTP
-    if GMAIL_USER and GMAIL_PASSWORD:
+            breaker.registrar_falha()
+            print(f"Erro no provedor {nome}: {str(e)}")
+            resultado = (500, f"Erro no envio: {str(e)}")
+            continue
+        if status == 202:  # SendGrid retorna 202 para sucesso
+            breaker.registrar_sucesso()
+            return status, texto
+        if status in STATUS_FALHA_PROVEDOR:
+            breaker.registrar_falha()
+        else:
+            breaker.registrar_sucesso()  # Provedor respondeu; o problema é a mensagem
+        print(f"Provedor {nome} falhou (Status: {status}), tentando o próximo...")
+        resultado = (status, texto)
+
+    # Nenhum provedor tentado: a outbox reagenda com backoff
+    return resultado or (503, "Falha no envio: circuito aberto em todos os provedores")
+
+# ===== ENVIO EM LOTE (SENDGRID PERSONALIZATIONS) =====
+LIMITE_PERSONALIZACOES = 1000  # Máximo de personalizations por requisição na API v3
+
+
+def _aplicar_substituicoes(texto, substituicoes):
+    """Troca cada chave (ex.: "-nome-") pelo valor do destinatário."""
+    for chave, valor in substituicoes.items():
+        texto = texto.replace(chave, str(valor))
+    return texto
+
+
+def _enviar_lote_sendgrid(lote, subject, content):
+    """Um POST com uma personalization por destinatário. Retorna (status_code, response_text)."""
+    headers = {
+        "Authorization": f"Bearer {SENDGRID_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    personalizacoes = []
+    for email, substituicoes in lote:
+        personalizacao = {"to": [{"email": email}]}
+        if substituicoes:
+            personalizacao["substitutions"] = {chave: str(valor) for chave, valor in substituicoes.items()}
+        personalizacoes.append(personalizacao)
+    data = {
+        "personalizations": personalizacoes,
+        "from": {"email": SENDER_EMAIL, "name": SENDER_NAME},
+        "subject": subject,
+        "content": [{"type": "text/plain", "value": content}]
+    }
+    response = http_client.post(SENDGRID_URL, "sendgrid", json=data, headers=headers)
+    return response.status_code, response.text
+
+
+def send_bulk_email(destinatarios, subject, content):
+    """
+    Envia o mesmo modelo para vários destinatários usando poucas requisições
+
+    Os destinatários são agrupados em lotes de até LIMITE_PERSONALIZACOES
+    personalizations do SendGrid. Assunto e conteúdo podem ter chaves
+    (ex.: "-nome-") trocadas por destinatário. Só os destinatários de lotes
+    que falharam (ou todos, se o SendGrid estiver indisponível) são
+    reenviados um a um por send_email, que usa o fallback SMTP.
+    Os endereços são usados sem espaços nas pontas; repetidos (sem
+    diferenciar maiúsculas) são enviados uma vez só, com as substituições
+    da primeira ocorrência.
+
+    Parâmetros:
+    - destinatarios: lista de emails ou de tuplas (email, {chave: valor})
+    - subject: Assunto do email (modelo)
+    - content: Conteúdo em texto puro (modelo)
+
+    Retorna:
+    - Dict {email: (status_code, response_text)}
+    """
+    normalizados = []
+    vistos = set()
+    for item in destinatarios:
+        email, substituicoes = (item, {}) if isinstance(item, str) else (item[0], item[1] or {})
+        email = email.strip()
+        chave = email.lower()
+        if chave in vistos:
+            continue  # Repetido: sairia duas vezes no lote e sobrescreveria o resultado
+        vistos.add(chave)
+        normalizados.append((email, substituicoes))
+    resultados = {}
+    pendentes = []
+    breaker = _breakers["sendgrid"]
+
+    for inicio in range(0, len(normalizados), LIMITE_PERSONALIZACOES):
+        lote = normalizados[inicio:inicio + LIMITE_PERSONALIZACOES]
+        if not _sendgrid_configurado() or not breaker.permite():
+            pendentes.extend(lote)
+            continue
         try:
-            # Cria mensagem
-            msg = MIMEMultipart()
-            msg['From'] = f"{SENDER_NAME} <{GMAIL_USER}>"
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Adiciona corpo do email
-            msg.attach(MIMEText(content, 'plain'))
-            
-            # Conecta ao servidor SMTP
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.starttls()  # Inicia TLS
-            server.login(GMAIL_USER, GMAIL_PASSWORD)  # Faz login
-            
-            # Envia email
-            text = msg.as_string()
-            server.sendmail(GMAIL_USER, to_email, text)
-            server.quit()  # Fecha conexão
-            
-            print("Email enviado com sucesso via Gmail SMTP")
-            return 202, "Email enviado via Gmail SMTP (fallback)"
-            
+            status, texto = _enviar_lote_sendgrid(lote, subject, content)
         except Exception as e:
-            print(f"Erro no Gmail SMTP: {str(e)}")
-            return 500, f"Erro no envio: {str(e)}"
-    
-    # Se ambos falharam
-    return 500, "Falha no envio: SendGrid e Gmail SMTP indisponíveis"
+            breaker.registrar_falha()
+            print(f"Erro no lote SendGrid ({len(lote)} destinatários): {str(e)}")
+            pendentes.extend(lote)
+            continue
+        if status == 202:
+            breaker.registrar_sucesso()
+            for email, _ in lote:
+                resultados[email] = (status, "Enviado via SendGrid (lote)")
+            continue
+        if status in STATUS_FALHA_PROVEDOR:
+            breaker.registrar_falha()
+        else:
+            breaker.registrar_sucesso()
+        print(f"Lote SendGrid falhou (Status: {status}), enviando {len(lote)} individualmente...")
+        pendentes.extend(lote)
+
+    # Fallback: envio individual apenas para quem não saiu no lote
+    for email, substituicoes in pendentes:
+        resultados[email] = send_email(
+            email,
+            _aplicar_substituicoes(subject, substituicoes),
+            _aplicar_substituicoes(content, substituicoes),
+        )
+    return resultados
 
 # ===== GERAÇÃO DE TOKEN DE CONFIRMAÇÃO =====
 def generate_confirmation_token(email):
@@ -139,6 +333,21 @@ def verify_confirmation_token(token):
         return None  # Retorna nulo
 
 # ===== ENVIO DE EMAIL DE CONFIRMAÇÃO =====
+def montar_email_confirmacao(to_email):
+    """
+    Monta assunto e conteúdo do email de confirmação de conta
+    (usado no envio direto e na caixa de saída)
+    
+    Retorna:
+    - Tupla (subject, content)
+    """
+    token = generate_confirmation_token(to_email)  # Gera token único
+    # Monta URL de confirmação apontando para o frontend
+    confirm_url = f"{settings.url_frontend_links()}/confirmar-email/{token}"
+    subject = "Confirme seu e-mail"  # Assunto do email
+    content = f"Olá! Clique no link para confirmar seu e-mail: {confirm_url}\nEste link expira em 24 horas."  # Conteúdo
+    return subject, content
+
 def send_confirmation_email(to_email):
     """
     Envia email de confirmação para ativação de conta
@@ -149,16 +358,7 @@ def send_confirmation_email(to_email):
     Retorna:
     - Tupla (status_code, response_text) do envio
     """
-    token = generate_confirmation_token(to_email)  # Gera token único
-    # Monta URL de confirmação apontando para o frontend
-    env = os.getenv("ENV", "prod")
-    if env == "local":
-        frontend_url = os.getenv("FRONTEND_URL_LOCAL", "http://localhost:5173")
-    else:
-        frontend_url = os.getenv("FRONTEND_URL_PROD", "https://hmmassoterapia.com.br")
-    confirm_url = f"{frontend_url}/confirmar-email/{token}"
-    subject = "Confirme seu e-mail"  # Assunto do email
-    content = f"Olá! Clique no link para confirmar seu e-mail: {confirm_url}\nEste link expira em 24 horas."  # Conteúdo
+    subject, content = montar_email_confirmacao(to_email)
     return send_email(to_email, subject, content)  # Envia email
 
 # ===== FUNÇÃO LEGADA - PARA COMPATIBILIDADE =====
@@ -184,7 +384,7 @@ def sendgrid_email_api_massoterapia(destinatario, assunto, conteudo):
             {"type": "text/plain", "value": conteudo}
         ]
     }
-    response = requests.post("https://api.sendgrid.com/v3/mail/send", headers=headers, json=data)  # Envia email
+    response = http_client.post(SENDGRID_URL, "sendgrid", headers=headers, json=data)  # Envia email (com timeout e novas tentativas)
     print(f"Status: {response.status_code}")  # Log do status
     print(f"Resposta: {response.text}")  # Log da resposta
     return response.status_code, response.text  # Retorna status e resposta
@@ -0,0 +1,174 @@
+"""
+Cliente HTTP de saída compartilhado (SendGrid, WhatsApp Graph API)
+
+- Uma requests.Session por host: conexões keep-alive reaproveitadas entre
+  mensagens (sem novo handshake TCP+TLS a cada envio).
+- Timeouts explícitos de conexão e leitura em todas as chamadas.
+- Novas tentativas com backoff exponencial e jitter em 429/5xx e em falhas
+  de conexão. Timeouts de LEITURA não são repetidos: o provedor pode ter
+  recebido a mensagem e repetir causaria envio duplicado.
+- Contadores de latência e erro por provedor (expostos em /health).
+
+O pacote requests (com urllib3, certifi e charset_normalizer) só é
+importado no primeiro envio, fora do caminho de inicialização do servidor.
+"""
+
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from Back_end import metricas
+
+# ===== CONFIGURAÇÕES =====
+TIMEOUT_CONEXAO = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+TIMEOUT_LEITURA = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+MAX_TENTATIVAS = int(os.getenv("HTTP_MAX_TENTATIVAS", "3"))
+BACKOFF_BASE_SEGUNDOS = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX_SEGUNDOS = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+# Conexões mantidas abertas por host (por processo)
+CONEXOES_POR_HOST = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+STATUS_RETENTAVEIS = frozenset({429, 500, 502, 503, 504})
+
+_sessoes = {}
+_sessoes_pid = os.getpid()
+_lock = threading.Lock()
+
+
+class _Contadores:
+    """Latência e erros acumulados de um provedor."""
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.erros = 0
+        self.novas_tentativas = 0
+        self.latencia_total_ms = 0.0
+        self.latencia_max_ms = 0.0
+        self.ultimo_status = None
+
+    def como_dict(self):
+        media = self.latencia_total_ms / self.requisicoes if self.requisicoes else 0.0
+        return {
+            "requisicoes": self.requisicoes,
+            "erros": self.erros,
+            "novas_tentativas": self.novas_tentativas,
+            "latencia_media_ms": round(media, 2),
+            "latencia_max_ms": round(self.latencia_max_ms, 2),
+            "ultimo_status": self.ultimo_status,
+        }
+
+
+_contadores = {}
+
+
+def _registrar(provedor, duracao_ms, status=None, erro=False, nova_tentativa=False):
+    metricas.registrar_tempo_provedor(provedor, duracao_ms / 1000)
+    with _lock:
+        contadores = _contadores.setdefault(provedor, _Contadores())
+        contadores.requisicoes += 1
+        contadores.latencia_total_ms += duracao_ms
+        contadores.latencia_max_ms = max(contadores.latencia_max_ms, duracao_ms)
+        contadores.ultimo_status = status
+        if erro:
+            contadores.erros += 1
+        if nova_tentativa:
+            contadores.novas_tentativas += 1
+
+
+def obter_sessao(url):
+    """Session keep-alive do host da URL (criada na primeira chamada)."""
+    global _sessoes_pid
+    host = urlsplit(url).netloc
+    with _lock:
+        if _sessoes_pid != os.getpid():
+            # Processo filho (fork): sockets herdados não podem ser reaproveitados
+            _sessoes.clear()
+            _sessoes_pid = os.getpid()
+        sessao = _sessoes.get(host)
+        if sessao is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=CONEXOES_POR_HOST, max_retries=0)
+            sessao.mount("https://", adaptador)
+            sessao.mount("http://", adaptador)
+            _sessoes[host] = sessao
+        return sessao
+
+
+def atraso_nova_tentativa(tentativa, resposta=None):
+    """Backoff exponencial com jitter completo; respeita Retry-After em segundos."""
+    if resposta is not None:
+        retry_after = resposta.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SEGUNDOS)
+    return random.uniform(0, min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * 2 ** tentativa))
+
+
+def post(url, provedor, json=None, headers=None, timeout=None, tentativas=None):
+    """
+    POST pela sessão compartilhada do host. Retorna a última resposta
+    (inclusive 4xx/5xx após esgotar as tentativas) ou levanta
+    requests.RequestException se nenhuma resposta foi obtida.
+    """
+    import requests
+    timeout = timeout or (TIMEOUT_CONEXAO, TIMEOUT_LEITURA)
+    tentativas = tentativas or MAX_TENTATIVAS
+    sessao = obter_sessao(url)
+    for tentativa in range(tentativas):
+        ultima = tentativa == tentativas - 1
+        inicio = time.perf_counter()
+        try:
+            resposta = sessao.post(url, json=json, headers=headers, timeout=timeout)
+        except requests.ConnectionError:
+            # ConnectTimeout e falhas de conexão: a mensagem não chegou ao provedor
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            _registrar(provedor, duracao_ms, erro=True, nova_tentativa=not ultima)
+            if ultima:
+                raise
+            time.sleep(atraso_nova_tentativa(tentativa))
+            continue
+        except requests.RequestException:
+            # ReadTimeout e demais erros: não repete (risco de envio duplicado)
+            _registrar(provedor, (time.perf_counter() - inicio) * 1000, erro=True)
+            raise
+
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        retentavel = resposta.status_code in STATUS_RETENTAVEIS
+        _registrar(
+            provedor, duracao_ms, status=resposta.status_code,
+            erro=resposta.status_code >= 400, nova_tentativa=retentavel and not ultima,
+        )
+        if not retentavel or ultima:
+            return resposta
+        time.sleep(atraso_nova_tentativa(tentativa, resposta))
+
+
+def get(url, provedor, headers=None, timeout=None):
+    """GET de tentativa única pela sessão compartilhada (usado em sondas de saúde)."""
+    import requests
+    timeout = timeout or (TIMEOUT_CONEXAO, TIMEOUT_LEITURA)
+    inicio = time.perf_counter()
+    try:
+        resposta = obter_sessao(url).get(url, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        _registrar(provedor, (time.perf_counter() - inicio) * 1000, erro=True)
+        raise
+    _registrar(provedor, (time.perf_counter() - inicio) * 1000,
+               status=resposta.status_code, erro=resposta.status_code >= 400)
+    return resposta
+
+
+def estatisticas():
+    """Contadores por provedor, para /health."""
+    with _lock:
+        return {provedor: c.como_dict() for provedor, c in _contadores.items()}
+
+
+def fechar():
+    """Fecha todas as sessões (conexões keep-alive) deste processo."""
+    with _lock:
+        for sessao in _sessoes.values():
+            sessao.close()
+        _sessoes.clear()
@@ -3,111 +3,271 @@ Sistema de Lembretes Automáticos via WhatsApp
 Envia lembretes 24h antes dos agendamentos confirmados
 """
 
+import math
 import os
-import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
-# Carrega variáveis de ambiente
-load_dotenv(dotenv_path='../.env')
+# Imports pelo pacote: o agendador do servidor usa o mesmo pool de conexões
+# (Back_end.config carrega o .env na importação do database)
+from Back_end.database import get_connection
+from Back_end.whatsapp_api import get_whatsapp_api
 
-# Adiciona o diretório atual ao path
-current_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.insert(0, current_dir)
+# ===== CONFIGURAÇÕES DE ENVIO =====
+# Envios simultâneos (não passar de HTTP_POOL_MAXSIZE, as conexões keep-alive do host)
+MAX_CONCORRENCIA = int(os.getenv("LEMBRETES_MAX_CONCORRENCIA", "8"))
+# Vazão da Cloud API por número remetente (Meta: 80 msg/s no nível padrão)
+MENSAGENS_POR_SEGUNDO = float(os.getenv("WHATSAPP_MENSAGENS_POR_SEGUNDO", "20"))
+RAJADA_MAXIMA = int(os.getenv("WHATSAPP_RAJADA_MAXIMA", "10"))
 
-from database import get_connection
-from whatsapp_api import get_whatsapp_api
+# ===== JANELA DE LEMBRETES =====
+# Lembrete sai ANTECEDENCIA antes da sessão; a janela de ± JANELA_MINUTOS
+# cobre o intervalo entre execuções (rodar com período menor que a janela)
+ANTECEDENCIA = timedelta(hours=int(os.getenv("LEMBRETES_ANTECEDENCIA_HORAS", "24")))
+JANELA = timedelta(minutes=int(os.getenv("LEMBRETES_JANELA_MINUTOS", "30")))
+MAX_TENTATIVAS_LEMBRETE = int(os.getenv("LEMBRETES_MAX_TENTATIVAS", "3"))
+LOTE_LEMBRETES = int(os.getenv("LEMBRETES_LOTE", "500"))
+# Tempo que uma reserva vale; depois disso outra execução retoma o lembrete
+TRAVA_SEGUNDOS = int(os.getenv("LEMBRETES_TRAVA_SEGUNDOS", "600"))
 
-def enviar_lembretes_diarios():
+
+class LimitadorTaxa:
     """
-    Função para enviar lembretes automáticos
-    Deve ser executada diariamente via cron job ou task scheduler
+    Token bucket compartilhado entre as threads: no máximo `capacidade`
+    envios de uma vez e, em regime, `taxa` envios por segundo.
+    """
+
+    def __init__(self, taxa, capacidade, relogio=time.monotonic, dormir=time.sleep):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = float(capacidade)
+        self._atualizado_em = relogio()
+        self._relogio = relogio
+        self._dormir = dormir
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloqueia até haver uma ficha disponível."""
+        while True:
+            with self._lock:
+                agora = self._relogio()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado_em) * self.taxa)
+                self._atualizado_em = agora
+                # Tolerância: sem ela, arredondamento (0.999...) faria esperas infinitesimais
+                if self._fichas >= 1 - 1e-9:
+                    self._fichas = max(0.0, self._fichas - 1)
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            self._dormir(espera)
+
+
+def percentil(valores, p):
+    """Percentil por posição mais próxima (valores em qualquer ordem)."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def _reservar_lembretes(limite=LOTE_LEMBRETES):
+    """
+    Reserva os agendamentos da janela (início em ANTECEDENCIA ± JANELA_MINUTOS)
+    que ainda não receberam lembrete: novos, que falharam abaixo do limite
+    de tentativas, ou reservados por uma execução que morreu.
+    FOR UPDATE SKIP LOCKED evita que duas execuções peguem o mesmo agendamento.
+    Retorna [(id, data_hora, nome, telefone, massoterapeuta_nome, tentativas)]
+    ou None se o banco falhar. A conexão é liberada antes dos envios.
     """
-    print("🔄 Iniciando envio de lembretes automáticos...")
-    
-    # Data/hora de amanhã (24h a partir de agora)
-    amanha_inicio = datetime.now() + timedelta(days=1)
-    amanha_inicio = amanha_inicio.replace(hour=0, minute=0, second=0, microsecond=0)
-    amanha_fim = amanha_inicio.replace(hour=23, minute=59, second=59)
-    
     conn = get_connection()
     if not conn:
         print("❌ Erro: Não foi possível conectar ao banco de dados")
-        return
-    
+        return None
+
     cursor = None
-    lembretes_enviados = 0
-    
     try:
         cursor = conn.cursor()
-        
-        # Busca agendamentos confirmados para amanhã
         cursor.execute("""
-            SELECT a.id, a.data_hora, c.nome, c.telefone, m.nome as massoterapeuta_nome, a.sintomas
-            FROM agendamento a
-            JOIN cliente c ON a.cliente_id = c.id  
-            JOIN massoterapeuta m ON a.massoterapeuta_id = m.id
-            WHERE a.status IN ('confirmado', 'marcado')
-            AND a.data_hora BETWEEN %s AND %s
-            AND c.telefone IS NOT NULL
-            ORDER BY a.data_hora
-        """, (amanha_inicio, amanha_fim))
-        
-        agendamentos = cursor.fetchall()
-        
-        print(f"📋 Encontrados {len(agendamentos)} agendamentos para amanhã")
-        
-        for agendamento in agendamentos:
-            agendamento_id = agendamento[0]
-            data_hora = agendamento[1]
-            nome_cliente = agendamento[2]
-            telefone_cliente = agendamento[3]
-            massoterapeuta_nome = agendamento[4]
-            sintomas = agendamento[5]
-            
-            try:
-                # Formatar data e hora
-                if isinstance(data_hora, str):
-                    data_hora = datetime.strptime(data_hora, "%Y-%m-%d %H:%M:%S")
-                
-                data_formatada = data_hora.strftime("%d/%m/%Y")
-                hora_formatada = data_hora.strftime("%H:%M")
-                
-                # Enviar lembrete
-                whatsapp = get_whatsapp_api()
-                resultado = whatsapp.send_appointment_reminder(
-                    phone=telefone_cliente,
-                    cliente_nome=nome_cliente,
-                    data_hora=datetime.strptime(str(data_hora), "%Y-%m-%d %H:%M:%S"),
-                    massoterapeuta_nome=massoterapeuta_nome
-                )
-                
-                if resultado['success']:
-                    lembretes_enviados += 1
-                    print(f"✅ Lembrete enviado para {nome_cliente}: {resultado.get('message_id')}")
-                    
-                    # Opcional: Marcar no banco que o lembrete foi enviado
-                    # cursor.execute("UPDATE agendamento SET lembrete_enviado = TRUE WHERE id = %s", (agendamento_id,))
-                    
-                else:
-                    print(f"❌ Erro ao enviar lembrete para {nome_cliente}: {resultado.get('error')}")
-                    
-            except Exception as e:
-                print(f"❌ Erro ao processar agendamento {agendamento_id}: {e}")
-                continue
-        
-        # conn.commit()  # Descomente se adicionar campo lembrete_enviado
-        
-        print(f"🎉 Processo concluído: {lembretes_enviados}/{len(agendamentos)} lembretes enviados")
-        
+            UPDATE agendamento a
+            SET lembrete_status = 'enfileirado',
+                lembrete_tentativas = a.lembrete_tentativas + 1,
+                lembrete_travado_ate = NOW() + make_interval(secs => %s)
+            FROM cliente c, massoterapeuta m
+            WHERE a.id IN (
+                SELECT a2.id
+                FROM agendamento a2
+                JOIN cliente c2 ON a2.cliente_id = c2.id
+                WHERE a2.status IN ('confirmado', 'marcado')
+                  AND a2.lembrete_enviado_em IS NULL
+                  AND a2.data_hora BETWEEN NOW() + make_interval(secs => %s)
+                                       AND NOW() + make_interval(secs => %s)
+                  AND c2.telefone IS NOT NULL
+                  AND (a2.lembrete_status IS NULL
+                       OR (a2.lembrete_status = 'falhou' AND a2.lembrete_tentativas < %s)
+                       OR (a2.lembrete_status = 'enfileirado' AND a2.lembrete_travado_ate < NOW()
+                           AND a2.lembrete_tentativas < %s))
+                ORDER BY a2.data_hora
+                LIMIT %s
+                FOR UPDATE OF a2 SKIP LOCKED
+            )
+            AND c.id = a.cliente_id
+            AND m.id = a.massoterapeuta_id
+            RETURNING a.id, a.data_hora, c.nome, COALESCE(c.telefone_e164, c.telefone), m.nome, a.lembrete_tentativas
+        """, (
+            TRAVA_SEGUNDOS,
+            (ANTECEDENCIA - JANELA).total_seconds(),
+            (ANTECEDENCIA + JANELA).total_seconds(),
+            MAX_TENTATIVAS_LEMBRETE,
+            MAX_TENTATIVAS_LEMBRETE,
+            limite,
+        ))
+        reservados = cursor.fetchall()
+        conn.commit()
+        return reservados
     except Exception as e:
-        print(f"❌ Erro geral no envio de lembretes: {e}")
-        
+        conn.rollback()
+        print(f"❌ Erro ao reservar lembretes: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def _registrar_resultado(agendamento_id, situacao, message_id=None, erro=None):
+    """Grava o resultado do envio no agendamento (conexão curta do pool)."""
+    conn = get_connection()
+    if not conn:
+        print(f"❌ Lembretes: sem conexão para registrar o agendamento {agendamento_id}")
+        return
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        if situacao == "enviado":
+            cursor.execute("""
+                UPDATE agendamento
+                SET lembrete_status = 'enviado', lembrete_message_id = %s,
+                    lembrete_enviado_em = NOW(), lembrete_travado_ate = NULL,
+                    lembrete_ultimo_erro = NULL
+                WHERE id = %s
+            """, (message_id, agendamento_id))
+        else:
+            # 'ignorado' (sem telefone válido) esgota as tentativas: não adianta repetir
+            cursor.execute("""
+                UPDATE agendamento
+                SET lembrete_status = 'falhou', lembrete_travado_ate = NULL,
+                    lembrete_ultimo_erro = %s,
+                    lembrete_tentativas = CASE WHEN %s THEN %s ELSE lembrete_tentativas END
+                WHERE id = %s
+            """, (str(erro)[:1000] if erro else None, situacao == "ignorado",
+                  MAX_TENTATIVAS_LEMBRETE, agendamento_id))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro ao registrar lembrete do agendamento {agendamento_id}: {e}")
     finally:
         if cursor:
             cursor.close()
         conn.close()
 
+
+def _enviar_lembrete(whatsapp, limitador, agendamento):
+    """
+    Envia um lembrete respeitando o limitador.
+    Retorna (situacao, latencia_ms, message_id, erro) com situacao
+    'enviado', 'falhou' ou 'ignorado'.
+    """
+    agendamento_id, data_hora, nome_cliente, telefone_cliente, massoterapeuta_nome = agendamento[:5]
+    if not (telefone_cliente or "").strip():
+        return "ignorado", None, None, "Cliente sem telefone"
+
+    limitador.adquirir()
+    inicio = time.perf_counter()
+    try:
+        # Formatar data e hora
+        if isinstance(data_hora, str):
+            data_hora = datetime.strptime(data_hora, "%Y-%m-%d %H:%M:%S")
+
+        resultado = whatsapp.send_appointment_reminder(
+            phone=telefone_cliente,
+            cliente_nome=nome_cliente,
+            data_hora=data_hora,
+            massoterapeuta_nome=massoterapeuta_nome
+        )
+    except Exception as e:
+        print(f"❌ Erro ao processar agendamento {agendamento_id}: {e}")
+        return "falhou", (time.perf_counter() - inicio) * 1000, None, e
+    latencia_ms = (time.perf_counter() - inicio) * 1000
+
+    if resultado.get('success'):
+        print(f"✅ Lembrete enviado para {nome_cliente}: {resultado.get('message_id')}")
+        return "enviado", latencia_ms, resultado.get('message_id'), None
+    print(f"❌ Erro ao enviar lembrete para {nome_cliente}: {resultado.get('error')}")
+    return "falhou", latencia_ms, None, resultado.get('error')
+
+
+def enviar_lembretes_diarios(max_concorrencia=None, limitador=None):
+    """
+    Função para enviar lembretes automáticos
+    Seguro para rodar a cada poucos minutos: cada execução reserva só os
+    agendamentos da janela que ainda não receberam lembrete e grava o
+    resultado de cada envio (uma nova execução após uma queda não reenvia).
+
+    Os envios rodam em paralelo (até `max_concorrencia` threads) sob um
+    token bucket no limite de vazão do número: uma chamada lenta não
+    atrasa as demais.
+
+    Retorna o resumo {total, enviados, falhas, ignorados, latencia_p50_ms,
+    latencia_p95_ms, duracao_s} ou None se o banco falhar ou o WhatsApp
+    não estiver configurado.
+    """
+    print("🔄 Iniciando envio de lembretes automáticos...")
+    inicio = time.perf_counter()
+
+    # Cliente antes da reserva: sem credenciais, nenhum agendamento fica
+    # 'enfileirado' (nem gasta tentativa) à toa
+    try:
+        whatsapp = get_whatsapp_api()
+    except ValueError as e:
+        print(f"❌ Erro: {e}")
+        return None
+
+    agendamentos = _reservar_lembretes()
+    if agendamentos is None:
+        return None
+    print(f"📋 {len(agendamentos)} lembrete(s) pendente(s) na janela")
+
+    max_concorrencia = max(1, max_concorrencia or MAX_CONCORRENCIA)
+    limitador = limitador or LimitadorTaxa(MENSAGENS_POR_SEGUNDO, RAJADA_MAXIMA)
+
+    situacoes = {"enviado": 0, "falhou": 0, "ignorado": 0}
+    latencias = []
+    with ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix="lembrete") as executor:
+        resultados = executor.map(
+            lambda agendamento: _enviar_lembrete(whatsapp, limitador, agendamento), agendamentos
+        )
+        for agendamento, (situacao, latencia_ms, message_id, erro) in zip(agendamentos, resultados):
+            _registrar_resultado(agendamento[0], situacao, message_id, erro)
+            situacoes[situacao] += 1
+            if latencia_ms is not None:
+                latencias.append(latencia_ms)
+
+    resumo = {
+        "total": len(agendamentos),
+        "enviados": situacoes["enviado"],
+        "falhas": situacoes["falhou"],
+        "ignorados": situacoes["ignorado"],
+        "latencia_p50_ms": round(percentil(latencias, 50), 1) if latencias else None,
+        "latencia_p95_ms": round(percentil(latencias, 95), 1) if latencias else None,
+        "duracao_s": round(time.perf_counter() - inicio, 2),
+    }
+    print(f"🎉 Processo concluído: {resumo['enviados']}/{resumo['total']} lembretes enviados "
+          f"({resumo['falhas']} falhas, {resumo['ignorados']} ignorados, "
+          f"p50 {resumo['latencia_p50_ms']} ms, p95 {resumo['latencia_p95_ms']} ms, {resumo['duracao_s']} s)")
+    return resumo
+
 def enviar_lembrete_individual(agendamento_id):
     """
     Envia lembrete para um agendamento específico
@@ -125,7 +285,7 @@ def enviar_lembrete_individual(agendamento_id):
         
         # Busca dados do agendamento
         cursor.execute("""
-            SELECT a.data_hora, c.nome, c.telefone, m.nome as massoterapeuta_nome
+            SELECT a.data_hora, c.nome, COALESCE(c.telefone_e164, c.telefone), m.nome as massoterapeuta_nome
             FROM agendamento a
             JOIN cliente c ON a.cliente_id = c.id
             JOIN massoterapeuta m ON a.massoterapeuta_id = m.id  
@@ -158,12 +318,21 @@ def enviar_lembrete_individual(agendamento_id):
         resultado = whatsapp.send_appointment_reminder(
             phone=telefone_cliente,
             cliente_nome=nome_cliente,
-            data_hora=datetime.now() + timedelta(days=1),
+            data_hora=data_hora,
             massoterapeuta_nome=massoterapeuta_nome
         )
         
         if resultado['success']:
             print(f"✅ Lembrete enviado para {nome_cliente}: {resultado.get('message_id')}")
+            # Registra o envio: o job periódico não repete este lembrete
+            cursor.execute("""
+                UPDATE agendamento
+                SET lembrete_status = 'enviado', lembrete_message_id = %s,
+                    lembrete_enviado_em = NOW(), lembrete_tentativas = lembrete_tentativas + 1,
+                    lembrete_travado_ate = NULL, lembrete_ultimo_erro = NULL
+                WHERE id = %s
+            """, (resultado.get('message_id'), agendamento_id))
+            conn.commit()
             return True
         else:
             print(f"❌ Erro ao enviar lembrete: {resultado.get('error')}")
@@ -185,11 +354,11 @@ if __name__ == "__main__":
     import sys
     
     if len(sys.argv) > 1:
-        # Envio individual: python lembretes_whatsapp.py 123
+        # Envio individual: python -m Back_end.lembretes_whatsapp 123
         agendamento_id = int(sys.argv[1])
         print(f"📱 Enviando lembrete para agendamento {agendamento_id}...")
         enviar_lembrete_individual(agendamento_id)
     else:
-        # Envio em lote: python lembretes_whatsapp.py
+        # Envio em lote: python -m Back_end.lembretes_whatsapp
         print("📱 Enviando lembretes diários...")
         enviar_lembretes_diarios()
\ No newline at end of file
@@ -4,6 +4,10 @@ from psycopg2 import OperationalError, DatabaseError, errors  # Drivers PostgreS
 from psycopg2.extras import RealDictCursor  # Cursor que retorna dados como dicionário
 from werkzeug.security import check_password_hash, generate_password_hash  # Criptografia de senhas
 from datetime import datetime  # Manipulação de datas e horários
+from Back_end.disponibilidade import invalidar_disponibilidade  # Cache de horários livres
+from Back_end.outbox import enfileirar_email  # Caixa de saída de emails (envio em segundo plano)
+from Back_end.telefones import normalizar_telefone  # Telefone em E.164 gravado junto com o original
+from Back_end.busca_pacientes import CONDICAO_NOME, ORDEM_SIMILARIDADE, normalizar_termo, padrao_like  # Busca sem acento
 
 # -------------------------------
 # Funções CRUD para Massoterapeuta
@@ -31,11 +35,11 @@ def cadastrar_massoterapeuta(nome, telefone, sexo, data_nascimento, email, senha
 
         senha_hash = generate_password_hash(senha)  # Criptografa a senha
         sql = """
-            INSERT INTO massoterapeuta (nome, telefone, sexo, data_nascimento, email, senha_hash)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO massoterapeuta (nome, telefone, telefone_e164, sexo, data_nascimento, email, senha_hash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
             RETURNING id
         """  # SQL para inserir massoterapeuta e retornar o ID
-        cursor.execute(sql, (nome, telefone, sexo, data_nascimento, email, senha_hash))  # Executa insert
+        cursor.execute(sql, (nome, telefone, normalizar_telefone(telefone), sexo, data_nascimento, email, senha_hash))  # Executa insert
         massoterapeuta_id = cursor.fetchone()[0]  # Pega o ID retornado
         conn.commit()  # Confirma a transação no banco
         print(f"Massoterapeuta cadastrado com sucesso! ID: {massoterapeuta_id}")
@@ -84,8 +88,8 @@ def atualizar_conta(id, nome, telefone):
         cursor = None  # Inicializa cursor
         try:  # Tenta executar
             cursor = conn.cursor()  # Cria cursor
-            sql = "UPDATE massoterapeuta SET nome = %s, telefone = %s WHERE id = %s"  # SQL update
-            cursor.execute(sql, (nome, telefone, id))  # Executa update
+            sql = "UPDATE massoterapeuta SET nome = %s, telefone = %s, telefone_e164 = %s WHERE id = %s"  # SQL update
+            cursor.execute(sql, (nome, telefone, normalizar_telefone(telefone), id))  # Executa update
             conn.commit()  # Confirma alteração
             print(f"Massoterapeuta {id} atualizado com sucesso!")
         except DatabaseError as e:  # Se der erro
@@ -139,9 +143,11 @@ def listar_massoterapeutas():
             conn.close()  # Fecha conexão
     return massoterapeutas  # Retorna lista
 
-def listar_clientes():
+def listar_clientes(after=None, limit=None):
     """
-    Retorna todos os clientes.
+    Retorna os clientes ordenados por (nome, id).
+    after: chave (nome, id) do último cliente da página anterior (paginação keyset)
+    limit: máximo de linhas (None = todos)
     """
     conn = get_connection()  # Conecta ao banco
     clientes = []  # Lista vazia
@@ -149,7 +155,16 @@ def listar_clientes():
         cursor = None  # Inicializa cursor
         try:  # Tenta executar
             cursor = conn.cursor(cursor_factory=RealDictCursor)  # Cursor que retorna dict
-            cursor.execute("SELECT id, nome, telefone, email, created_at FROM cliente ORDER BY nome ASC")  # Busca clientes
+            sql = "SELECT id, nome, telefone, email, created_at FROM cliente"
+            params = []
+            if after:  # Continua depois do último cliente da página anterior
+                sql += " WHERE (nome, id) > (%s, %s)"
+                params.extend(after)
+            sql += " ORDER BY nome ASC, id ASC"  # id desempata nomes iguais
+            if limit:
+                sql += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(sql, params)  # Busca clientes
             clientes = cursor.fetchall()  # Pega todos os resultados
         except DatabaseError as e:  # Se der erro
             print(f"Erro ao buscar clientes: {e}")
@@ -184,9 +199,11 @@ def listar_agendamentos():
             conn.close()  # Fecha conexão
     return agendamentos  # Retorna lista
 
-def listar_agendamentos_massoterapeuta(massoterapeuta_id):
+def listar_agendamentos_massoterapeuta(massoterapeuta_id, after=None, limit=None):
     """
-    Retorna agendamentos de um massoterapeuta específico.
+    Retorna agendamentos de um massoterapeuta específico, do mais recente ao mais antigo.
+    after: chave (data_hora, id) do último agendamento da página anterior
+    limit: máximo de linhas (None = todos)
     """
     conn = get_connection()  # Conecta ao banco
     agendamentos = []  # Lista vazia
@@ -194,14 +211,22 @@ def listar_agendamentos_massoterapeuta(massoterapeuta_id):
         cursor = None  # Inicializa cursor
         try:  # Tenta executar
             cursor = conn.cursor(cursor_factory=RealDictCursor)  # Cursor que retorna dict
-            cursor.execute("""
+            sql = """
                 SELECT a.id, a.cliente_id, c.nome AS cliente_nome, c.telefone AS cliente_telefone, 
                        c.email AS cliente_email, a.data_hora, a.sintomas, a.status, a.criado_em
                 FROM agendamento a
                 JOIN cliente c ON a.cliente_id = c.id
                 WHERE a.massoterapeuta_id = %s
-                ORDER BY a.data_hora DESC
-            """, (massoterapeuta_id,))  # SQL para buscar agendamentos específicos do massoterapeuta
+            """
+            params = [massoterapeuta_id]
+            if after:  # Continua depois do último agendamento da página anterior
+                sql += " AND (a.data_hora, a.id) < (%s, %s)"
+                params.extend(after)
+            sql += " ORDER BY a.data_hora DESC, a.id DESC"
+            if limit:
+                sql += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(sql, params)  # SQL para buscar agendamentos específicos do massoterapeuta
             agendamentos = cursor.fetchall()  # Pega todos os resultados
         except DatabaseError as e:  # Se der erro
             print(f"Erro ao buscar agendamentos do massoterapeuta: {e}")
@@ -238,7 +263,7 @@ def atualizar_agendamento(agendamento_id, massoterapeuta_id, novo_status):
         # Busca dados do agendamento e cliente ANTES de atualizar
         cursor.execute(
             """
-            SELECT a.data_hora, c.nome, c.telefone, c.email, m.nome as massoterapeuta_nome
+            SELECT a.data_hora, c.nome, COALESCE(c.telefone_e164, c.telefone), c.email, m.nome as massoterapeuta_nome
             FROM agendamento a
             JOIN cliente c ON a.cliente_id = c.id
             JOIN massoterapeuta m ON a.massoterapeuta_id = m.id
@@ -266,6 +291,7 @@ def atualizar_agendamento(agendamento_id, massoterapeuta_id, novo_status):
 
         conn.commit()
         print(f"Agendamento {agendamento_id} atualizado para status '{novo_status}'")
+        invalidar_disponibilidade(massoterapeuta_id, data_hora)
 
         # Projeto não utiliza mais WhatsApp Cloud API — apenas registrar log local para auditoria
         try:
@@ -300,12 +326,14 @@ def atualizar_agendamento(agendamento_id, massoterapeuta_id, novo_status):
         if cursor:
             cursor.close()
         conn.close()
-def listar_agendamentos_por_status(massoterapeuta_id, status_lista):
+def listar_agendamentos_por_status(massoterapeuta_id, status_lista, after=None, limit=None):
     """
     Retorna agendamentos de um massoterapeuta filtrados por lista de status.
     Args:
         massoterapeuta_id: ID do massoterapeuta
         status_lista: Lista de status ['marcado'] ou ['confirmado', 'concluido']
+        after: chave (data_hora, id) do último agendamento da página anterior
+        limit: máximo de linhas (None = todos)
     """
     conn = get_connection()
     agendamentos = []
@@ -317,14 +345,22 @@ def listar_agendamentos_por_status(massoterapeuta_id, status_lista):
             # Cria placeholders para os status (%s, %s, ...)
             placeholders = ', '.join(['%s'] * len(status_lista))
             
-            cursor.execute(f"""
+            sql = f"""
                 SELECT a.id, a.cliente_id, c.nome AS cliente_nome, c.telefone AS cliente_telefone, 
                        c.email AS cliente_email, c.sexo AS cliente_sexo, a.data_hora, a.sintomas, a.status, a.criado_em
                 FROM agendamento a
                 JOIN cliente c ON a.cliente_id = c.id
                 WHERE a.massoterapeuta_id = %s AND a.status IN ({placeholders})
-                ORDER BY a.data_hora DESC
-            """, [massoterapeuta_id] + status_lista)
+            """
+            params = [massoterapeuta_id] + list(status_lista)
+            if after:  # Continua depois do último agendamento da página anterior
+                sql += " AND (a.data_hora, a.id) < (%s, %s)"
+                params.extend(after)
+            sql += " ORDER BY a.data_hora DESC, a.id DESC"
+            if limit:
+                sql += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(sql, params)
             
             agendamentos = cursor.fetchall()
         except DatabaseError as e:
@@ -335,12 +371,25 @@ def listar_agendamentos_por_status(massoterapeuta_id, status_lista):
             conn.close()
     return agendamentos
 
-def buscar_paciente_com_historico(massoterapeuta_id, nome_busca):
+# Máximo de pacientes retornados por busca (cada um vem com o histórico completo)
+LIMITE_BUSCA_PACIENTES = 20
+
+
+def _agendamento_do_json(item):
+    """json_agg devolve datas como texto ISO; volta para datetime para manter a resposta igual."""
+    for campo in ("data_hora", "criado_em"):
+        if isinstance(item.get(campo), str):
+            item[campo] = datetime.fromisoformat(item[campo])
+    return item
+
+
+def buscar_paciente_com_historico(massoterapeuta_id, nome_busca, limite=LIMITE_BUSCA_PACIENTES):
     """
     Busca paciente por nome e retorna dados completos + histórico de agendamentos.
     Args:
         massoterapeuta_id: ID do massoterapeuta logado
         nome_busca: Nome ou parte do nome do paciente
+        limite: Máximo de pacientes retornados
     Returns:
         Dict com dados do paciente e lista de agendamentos
     """
@@ -352,37 +401,37 @@ def buscar_paciente_com_historico(massoterapeuta_id, nome_busca):
         try:  # Tenta executar
             cursor = conn.cursor(cursor_factory=RealDictCursor)  # Cursor que retorna dict
             
-            # Busca pacientes que tenham agendamentos com este massoterapeuta
-            cursor.execute("""
-                SELECT DISTINCT c.id, c.nome, c.telefone, c.email, c.sexo, c.data_nascimento, c.created_at
+            # Uma única consulta: pacientes com agendamentos deste massoterapeuta,
+            # com o histórico já agregado (futuros/passados) e as contagens
+            # Nome comparado sem acento (índice de trigramas idx_cliente_nome_trgm),
+            # pacientes mais parecidos com o termo primeiro
+            termo = normalizar_termo(nome_busca)
+            cursor.execute(f"""
+                SELECT c.id, c.nome, c.telefone, c.email, c.sexo, c.data_nascimento, c.created_at,
+                       COALESCE(json_agg(json_build_object(
+                                    'id', a.id, 'data_hora', a.data_hora, 'sintomas', a.sintomas,
+                                    'status', a.status, 'criado_em', a.criado_em, 'periodo', 'futuro')
+                                ORDER BY a.data_hora DESC) FILTER (WHERE a.data_hora > NOW()),
+                                '[]') AS agendamentos_futuros,
+                       COALESCE(json_agg(json_build_object(
+                                    'id', a.id, 'data_hora', a.data_hora, 'sintomas', a.sintomas,
+                                    'status', a.status, 'criado_em', a.criado_em, 'periodo', 'passado')
+                                ORDER BY a.data_hora DESC) FILTER (WHERE a.data_hora <= NOW()),
+                                '[]') AS agendamentos_passados,
+                       COUNT(*) AS total_sessoes,
+                       COUNT(*) FILTER (WHERE a.data_hora > NOW()) AS sessoes_futuras,
+                       COUNT(*) FILTER (WHERE a.data_hora <= NOW()) AS sessoes_passadas
                 FROM cliente c
-                JOIN agendamento a ON c.id = a.cliente_id
-                WHERE a.massoterapeuta_id = %s 
-                AND LOWER(c.nome) LIKE LOWER(%s)
-                ORDER BY c.nome ASC
-            """, (massoterapeuta_id, f'%{nome_busca}%'))  # SQL para buscar pacientes por nome
+                JOIN agendamento a ON a.cliente_id = c.id AND a.massoterapeuta_id = %s
+                WHERE {CONDICAO_NOME}
+                GROUP BY c.id, c.nome, c.telefone, c.email, c.sexo, c.data_nascimento, c.created_at
+                ORDER BY {ORDEM_SIMILARIDADE}, c.nome ASC
+                LIMIT %s
+            """, (massoterapeuta_id, padrao_like(termo), termo, limite))  # SQL para buscar pacientes e histórico
             
-            pacientes = cursor.fetchall()  # Pega todos os pacientes
+            pacientes = cursor.fetchall()  # Pega os pacientes (já com histórico)
             
-            # Para cada paciente, busca o histórico de agendamentos
-            for paciente in pacientes:  # Loop pelos pacientes
-                cursor.execute("""
-                    SELECT a.id, a.data_hora, a.sintomas, a.status, a.criado_em,
-                           CASE 
-                               WHEN a.data_hora > NOW() THEN 'futuro'
-                               ELSE 'passado'
-                           END as periodo
-                    FROM agendamento a
-                    WHERE a.cliente_id = %s AND a.massoterapeuta_id = %s
-                    ORDER BY a.data_hora DESC
-                """, (paciente['id'], massoterapeuta_id))  # SQL para buscar histórico específico
-                
-                agendamentos = cursor.fetchall()  # Pega todos os agendamentos do paciente
-                
-                # Separa agendamentos futuros e passados
-                agendamentos_futuros = [a for a in agendamentos if a['periodo'] == 'futuro']  # Lista futuros
-                agendamentos_passados = [a for a in agendamentos if a['periodo'] == 'passado']  # Lista passados
-                
+            for paciente in pacientes:  # Monta a resposta no formato de sempre
                 paciente_completo = {  # Monta dados completos do paciente
                     "id": paciente["id"],
                     "nome": paciente["nome"],
@@ -391,11 +440,11 @@ def buscar_paciente_com_historico(massoterapeuta_id, nome_busca):
                     "sexo": paciente["sexo"],
                     "data_nascimento": str(paciente["data_nascimento"]),
                     "cliente_desde": str(paciente["created_at"]),
-                    "agendamentos_futuros": agendamentos_futuros,
-                    "agendamentos_passados": agendamentos_passados,
-                    "total_sessoes": len(agendamentos),
-                    "sessoes_futuras": len(agendamentos_futuros),
-                    "sessoes_passadas": len(agendamentos_passados)
+                    "agendamentos_futuros": [_agendamento_do_json(a) for a in paciente["agendamentos_futuros"]],
+                    "agendamentos_passados": [_agendamento_do_json(a) for a in paciente["agendamentos_passados"]],
+                    "total_sessoes": paciente["total_sessoes"],
+                    "sessoes_futuras": paciente["sessoes_futuras"],
+                    "sessoes_passadas": paciente["sessoes_passadas"]
                 }  # Estrutura completa com estatísticas
                 
                 resultado["pacientes"].append(paciente_completo)  # Adiciona à lista
@@ -413,7 +462,7 @@ def buscar_paciente_com_historico(massoterapeuta_id, nome_busca):
 
 def cancelar_agendamento_com_motivo(agendamento_id, massoterapeuta_id, motivo):
     """
-    Cancela um agendamento com motivo e envia email de notificação para o cliente.
+    Cancela um agendamento com motivo e enfileira email de notificação para o cliente.
     Args:
         agendamento_id: ID do agendamento a ser cancelado
         massoterapeuta_id: ID do massoterapeuta que está cancelando
@@ -421,8 +470,6 @@ def cancelar_agendamento_com_motivo(agendamento_id, massoterapeuta_id, motivo):
     Returns:
         Dict com success/error e dados do agendamento para email
     """
-    from Back_end.email_api import send_email  # Importa função de email
-    
     conn = get_connection()  # Conecta ao banco
     if not conn:  # Se não conectou
         return {"success": False, "erro": "Erro de conexão com banco de dados"}
@@ -467,14 +514,12 @@ def cancelar_agendamento_com_motivo(agendamento_id, massoterapeuta_id, motivo):
             ON CONFLICT DO NOTHING
         """, (agendamento_id, motivo))  # SQL para registrar histórico
         
-        conn.commit()  # Confirma alterações
+        # Email de notificação para o cliente: vai para a caixa de saída na
+        # mesma transação do cancelamento e é enviado pelo worker da outbox
+        data_formatada = agendamento['data_hora'].strftime("%d/%m/%Y às %H:%M")  # Formata data
+        assunto = "🚫 Agendamento Cancelado - HM Massoterapia"  # Assunto do email
         
-        # Envia email de notificação para o cliente
-        try:  # Tenta enviar email
-            data_formatada = agendamento['data_hora'].strftime("%d/%m/%Y às %H:%M")  # Formata data
-            assunto = "🚫 Agendamento Cancelado - HM Massoterapia"  # Assunto do email
-            
-            conteudo = f"""
+        conteudo = f"""
 Olá, {agendamento['cliente_nome']}!
 
 Infelizmente, seu agendamento foi cancelado pelo massoterapeuta.
@@ -493,28 +538,22 @@ Para reagendar, acesse: http://localhost:5173
 
 Atenciosamente,
 Equipe HM Massoterapia
-            """  # Template do email
-            
-            status_email, resposta_email = send_email(agendamento['cliente_email'], assunto, conteudo)  # Envia email
-            
-            return {  # Retorna sucesso com detalhes
-                "success": True, 
-                "mensagem": "Agendamento cancelado com sucesso",
-                "agendamento": dict(agendamento),
-                "email_enviado": status_email == 202,
-                "detalhes_email": resposta_email if status_email != 202 else "Email enviado com sucesso"
-            }
-            
-        except Exception as email_error:  # Se falhar o email
-            # Mesmo se o email falhar, o cancelamento foi realizado
-            print(f"Erro ao enviar email: {email_error}")
-            return {  # Retorna sucesso mesmo com erro de email
-                "success": True,
-                "mensagem": "Agendamento cancelado com sucesso (erro ao enviar email)",
-                "agendamento": dict(agendamento),
-                "email_enviado": False,
-                "erro_email": str(email_error)
-            }
+        """  # Template do email
+        
+        email_id = enfileirar_email(cursor, agendamento['cliente_email'], assunto, conteudo, tipo="cancelamento_massoterapeuta")
+        email_enfileirado = email_id is not None
+        
+        conn.commit()  # Confirma alterações (cancelamento + email na fila)
+        invalidar_disponibilidade(massoterapeuta_id, agendamento['data_hora'])  # Libera o horário no cache
+        
+        return {  # Retorna sucesso com detalhes
+            "success": True, 
+            "mensagem": "Agendamento cancelado com sucesso",
+            "agendamento": dict(agendamento),
+            "email_enfileirado": email_enfileirado,  # Enviado depois pelo worker da outbox
+            "email_enviado": email_enfileirado,  # Compatibilidade com o frontend; remover na próxima versão
+            "detalhes_email": "Email enfileirado para envio"
+        }
         
     except Exception as e:  # Se der erro geral
         conn.rollback()  # Desfaz alterações
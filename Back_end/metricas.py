@@ -0,0 +1,348 @@
+"""
+Métricas por rota em formato Prometheus (GET /metrics)
+
+Para cada requisição registra, por método e rota (a regra da URL, ex.:
+/api/clientes/<int:cliente_id>, para não criar uma série por id):
+- http_requests_total: contagem por status;
+- http_request_duration_seconds: histograma da latência;
+- http_request_db_seconds: histograma do tempo gasto no banco (cursores
+  cronometrados pelo database);
+- http_request_provider_seconds_total / http_request_provider_calls_total:
+  tempo e chamadas a provedores externos (SendGrid, WhatsApp) feitas
+  durante a requisição (registradas pelo http_client).
+
+Com vários workers do gunicorn cada processo tem seus contadores. Cada um
+grava os seus em METRICAS_DIR/metricas_<pid>.json (no máximo a cada
+METRICAS_INTERVALO_GRAVACAO segundos); /metrics soma os arquivos de todos
+os processos. Um worker que sai (deploy, max_requests) soma os seus em
+metricas_encerrados.json e apaga o próprio arquivo, então o diretório não
+cresce com a reciclagem dos workers. O diretório é limpo na subida do
+servidor.
+"""
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento): um processo só, sem lock entre processos
+    fcntl = None
+
+# ===== CONFIGURAÇÕES =====
+DIRETORIO = os.getenv("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "massoterapia_metricas"))
+INTERVALO_GRAVACAO = float(os.getenv("METRICAS_INTERVALO_GRAVACAO", "5"))
+# Limites superiores (segundos) dos buckets dos histogramas; o último bucket é +Inf
+LIMITES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROTA_DESCONHECIDA = "nao_encontrada"
+SEPARADOR = "|"
+ARQUIVO_ENCERRADOS = "metricas_encerrados.json"
+ARQUIVO_LOCK = "metricas_encerrados.lock"
+
+
+class MedicaoRequisicao:
+    """Tempos acumulados durante uma requisição (banco e provedores externos)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tempo_banco = 0.0
+        self.consultas = 0
+        self.maior_consulta = 0.0
+        self.provedores = {}  # provedor -> [segundos, chamadas]
+
+
+_medicao_atual = contextvars.ContextVar("medicao_requisicao", default=None)
+
+
+def registrar_tempo_banco(segundos):
+    """Conta um comando e soma seu tempo à requisição em andamento (no-op fora de requisição)."""
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.tempo_banco += segundos
+        medicao.consultas += 1
+        medicao.maior_consulta = max(medicao.maior_consulta, segundos)
+
+
+def registrar_tempo_provedor(provedor, segundos):
+    """Soma uma chamada a provedor externo à requisição em andamento."""
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        acumulado = medicao.provedores.setdefault(provedor, [0.0, 0])
+        acumulado[0] += segundos
+        acumulado[1] += 1
+
+
+# ===== REGISTRO DO PROCESSO =====
+def _registro_vazio():
+    return {"requisicoes": {}, "latencia": {}, "banco": {}, "provedores": {}}
+
+
+def _observar(histogramas, chave, valor):
+    histograma = histogramas.get(chave)
+    if histograma is None:
+        histograma = histogramas[chave] = {"buckets": [0] * (len(LIMITES) + 1), "soma": 0.0, "contagem": 0}
+    indice = next((i for i, limite in enumerate(LIMITES) if valor <= limite), len(LIMITES))
+    histograma["buckets"][indice] += 1
+    histograma["soma"] += valor
+    histograma["contagem"] += 1
+
+
+def _somar(total, dados):
+    """Soma os contadores de `dados` em `total` (no lugar)."""
+    for chave, valor in dados["requisicoes"].items():
+        total["requisicoes"][chave] = total["requisicoes"].get(chave, 0) + valor
+    for tipo in ("latencia", "banco"):
+        for chave, histograma in dados[tipo].items():
+            destino = total[tipo].setdefault(
+                chave, {"buckets": [0] * (len(LIMITES) + 1), "soma": 0.0, "contagem": 0})
+            destino["buckets"] = [a + b for a, b in zip(destino["buckets"], histograma["buckets"])]
+            destino["soma"] += histograma["soma"]
+            destino["contagem"] += histograma["contagem"]
+    for chave, acumulado in dados["provedores"].items():
+        destino = total["provedores"].setdefault(chave, {"soma": 0.0, "contagem": 0})
+        destino["soma"] += acumulado["soma"]
+        destino["contagem"] += acumulado["contagem"]
+    return total
+
+
+def _ler(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_atomico(caminho, conteudo):
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+class RegistroMetricas:
+    """Contadores deste processo, gravados periodicamente em disco."""
+
+    def __init__(self, diretorio=DIRETORIO, intervalo_gravacao=INTERVALO_GRAVACAO, relogio=time.monotonic):
+        self.diretorio = diretorio
+        self.intervalo_gravacao = intervalo_gravacao
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._dados = _registro_vazio()
+        self._pid = os.getpid()
+        self._gravado_em = relogio()
+
+    def _verificar_processo(self):
+        # Processo filho (fork): os contadores herdados são do processo pai
+        if self._pid != os.getpid():
+            self._dados = _registro_vazio()
+            self._pid = os.getpid()
+
+    def observar_requisicao(self, metodo, rota, status, duracao, tempo_banco, provedores):
+        chave = SEPARADOR.join((metodo, rota))
+        with self._lock:
+            self._verificar_processo()
+            chave_status = SEPARADOR.join((metodo, rota, str(status)))
+            requisicoes = self._dados["requisicoes"]
+            requisicoes[chave_status] = requisicoes.get(chave_status, 0) + 1
+            _observar(self._dados["latencia"], chave, duracao)
+            _observar(self._dados["banco"], chave, tempo_banco)
+            for provedor, (segundos, chamadas) in provedores.items():
+                acumulado = self._dados["provedores"].setdefault(
+                    SEPARADOR.join((metodo, rota, provedor)), {"soma": 0.0, "contagem": 0})
+                acumulado["soma"] += segundos
+                acumulado["contagem"] += chamadas
+            vencido = self._relogio() - self._gravado_em >= self.intervalo_gravacao
+            if vencido:
+                self._gravado_em = self._relogio()  # Uma thread grava; as outras seguem
+        if vencido:
+            self.gravar()
+
+    def _arquivo(self, pid=None):
+        return os.path.join(self.diretorio, f"metricas_{pid or os.getpid()}.json")
+
+    def gravar(self):
+        """Grava os contadores deste processo (escrita atômica: tmp + rename)."""
+        with self._lock:
+            self._verificar_processo()
+            conteudo = json.dumps(self._dados)
+            self._gravado_em = self._relogio()
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            _gravar_atomico(self._arquivo(), conteudo)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar as métricas em {self.diretorio}: {e}")
+
+    def _travar(self, exclusivo):
+        """
+        Lock de arquivo entre os processos: exclusivo para somar em
+        metricas_encerrados.json, compartilhado para ler (assim /metrics
+        não conta um worker duas vezes no meio da soma). Retorna o arquivo
+        do lock (fechar libera) ou None.
+        """
+        if fcntl is None:
+            return None
+        os.makedirs(self.diretorio, exist_ok=True)
+        arquivo = open(os.path.join(self.diretorio, ARQUIVO_LOCK), "a")
+        fcntl.flock(arquivo, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        return arquivo
+
+    def encerrar_processo(self):
+        """
+        Worker saindo: soma os contadores deste processo em
+        metricas_encerrados.json e apaga metricas_<pid>.json.
+        """
+        with self._lock:
+            self._verificar_processo()
+            dados, self._dados = self._dados, _registro_vazio()
+        trava = None
+        try:
+            trava = self._travar(exclusivo=True)
+            destino = os.path.join(self.diretorio, ARQUIVO_ENCERRADOS)
+            try:
+                encerrados = _ler(destino)
+            except FileNotFoundError:
+                encerrados = _registro_vazio()
+            _gravar_atomico(destino, json.dumps(_somar(encerrados, dados)))
+            try:
+                os.remove(self._arquivo())
+            except FileNotFoundError:
+                pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Não foi possível somar as métricas do processo {os.getpid()}: {e}")
+        finally:
+            if trava is not None:
+                trava.close()
+
+    def agregar(self):
+        """Soma os arquivos de todos os processos (inclusive os que já saíram)."""
+        self.gravar()
+        total = _registro_vazio()
+        trava = None
+        try:
+            trava = self._travar(exclusivo=False)
+            nomes = [n for n in os.listdir(self.diretorio) if n.startswith("metricas_") and n.endswith(".json")]
+        except OSError:
+            nomes = []
+        try:
+            for nome in nomes:
+                try:
+                    dados = _ler(os.path.join(self.diretorio, nome))
+                except (OSError, ValueError):
+                    continue  # Arquivo sendo substituído ou corrompido: fica para a próxima coleta
+                _somar(total, dados)
+        finally:
+            if trava is not None:
+                trava.close()
+        return total
+
+    def limpar(self):
+        """Apaga os arquivos de execuções anteriores (chamar na subida do servidor)."""
+        with self._lock:
+            self._dados = _registro_vazio()
+        try:
+            nomes = os.listdir(self.diretorio)
+        except OSError:
+            return
+        for nome in nomes:
+            if nome.startswith("metricas_"):
+                try:
+                    os.remove(os.path.join(self.diretorio, nome))
+                except OSError:
+                    pass
+
+
+# ===== FORMATO DE TEXTO DO PROMETHEUS =====
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _histograma(linhas, nome, descricao, histogramas):
+    linhas.append(f"# HELP {nome} {descricao}")
+    linhas.append(f"# TYPE {nome} histogram")
+    for chave in sorted(histogramas):
+        histograma = histogramas[chave]
+        rotulos = chave.split(SEPARADOR)
+        acumulado = 0
+        for limite, quantidade in zip(LIMITES + ("+Inf",), histograma["buckets"]):
+            acumulado += quantidade
+            le = limite if limite == "+Inf" else repr(limite)
+            linhas.append(f"{nome}_bucket{_rotulos(('method', 'endpoint'), rotulos, ('le', le))} {acumulado}")
+        linhas.append(f"{nome}_sum{_rotulos(('method', 'endpoint'), rotulos)} {_numero(histograma['soma'])}")
+        linhas.append(f"{nome}_count{_rotulos(('method', 'endpoint'), rotulos)} {histograma['contagem']}")
+
+
+def formatar_prometheus(dados):
+    """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+    linhas = [
+        "# HELP http_requests_total Requisições HTTP atendidas, por rota e status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for chave in sorted(dados["requisicoes"]):
+        rotulos = _rotulos(("method", "endpoint", "status"), chave.split(SEPARADOR))
+        linhas.append(f"http_requests_total{rotulos} {dados['requisicoes'][chave]}")
+
+    _histograma(linhas, "http_request_duration_seconds", "Latência das requisições, em segundos.", dados["latencia"])
+    _histograma(linhas, "http_request_db_seconds", "Tempo no banco de dados por requisição, em segundos.", dados["banco"])
+
+    nomes = ("method", "endpoint", "provider")
+    linhas.append("# HELP http_request_provider_seconds_total Tempo em provedores externos durante requisições.")
+    linhas.append("# TYPE http_request_provider_seconds_total counter")
+    for chave in sorted(dados["provedores"]):
+        rotulos = _rotulos(nomes, chave.split(SEPARADOR))
+        linhas.append(f"http_request_provider_seconds_total{rotulos} {_numero(dados['provedores'][chave]['soma'])}")
+    linhas.append("# HELP http_request_provider_calls_total Chamadas a provedores externos durante requisições.")
+    linhas.append("# TYPE http_request_provider_calls_total counter")
+    for chave in sorted(dados["provedores"]):
+        rotulos = _rotulos(nomes, chave.split(SEPARADOR))
+        linhas.append(f"http_request_provider_calls_total{rotulos} {dados['provedores'][chave]['contagem']}")
+    return "\n".join(linhas) + "\n"
+
+
+registro = RegistroMetricas()
+
+
+# ===== INTEGRAÇÃO COM O FLASK =====
+def init_app(app):
+    """
+    Registra os ganchos que medem cada requisição. Deve ser chamado antes
+    de database.init_app: os after_request rodam na ordem inversa do
+    registro, então a medição vê o status final (inclusive o 500 de uma
+    falha no commit) e o tempo do commit.
+    """
+    from flask import current_app, g, request
+    from Back_end import consultas
+
+    @app.before_request
+    def _iniciar_medicao():
+        g._metricas_token = _medicao_atual.set(MedicaoRequisicao())
+
+    @app.after_request
+    def _registrar_medicao(response):
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            rota = request.url_rule.rule if request.url_rule is not None else ROTA_DESCONHECIDA
+            registro.observar_requisicao(
+                request.method, rota, response.status_code,
+                time.perf_counter() - medicao.inicio, medicao.tempo_banco, medicao.provedores,
+            )
+            # Contagem de consultas: cabeçalhos em debug e linha de log estruturada
+            consultas.anotar_resposta(response, medicao, request.method, rota, debug=current_app.debug)
+        return response
+
+    @app.teardown_request
+    def _encerrar_medicao(exc):
+        token = g.pop("_metricas_token", None)
+        if token is not None:
+            _medicao_atual.reset(token)
@@ -0,0 +1,267 @@
+"""
+Executor de migrações versionadas do banco de dados
+
+Uso:
+    python -m Back_end.migrate           # aplica as migrações pendentes
+    python -m Back_end.migrate status    # lista migrações aplicadas e pendentes
+    python -m Back_end.migrate check     # falha (código 1) se faltar algum índice esperado
+
+As migrações ficam em Back_end/migrations/NNNN_descricao.sql e são aplicadas
+em ordem de versão. Cada versão aplicada é registrada na tabela
+schema_migrations. Arquivos que começam com "-- migrate:no-transaction"
+rodam fora de transação, um comando por vez (necessário para
+CREATE INDEX CONCURRENTLY).
+
+Migrações que precisam de código Python (ex.: backfill com uma biblioteca)
+podem ser NNNN_descricao.py com uma função upgrade(cursor); rodam dentro
+de uma transação, como as .sql.
+"""
+
+import importlib.util
+import os
+import re
+import sys
+from collections import namedtuple
+
+from Back_end.database import get_connection
+
+# ===== CONFIGURAÇÕES =====
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+TABELA_CONTROLE = "schema_migrations"
+MARCADOR_SEM_TRANSACAO = "-- migrate:no-transaction"
+# Chave do pg_advisory_lock: impede duas réplicas migrando ao mesmo tempo
+CHAVE_LOCK_MIGRACAO = 7240001
+
+# Índices dos quais as consultas quentes dependem (nome -> tabela)
+INDICES_ESPERADOS = {
+    "idx_agendamento_massoterapeuta_data_ativo": "agendamento",
+    "idx_agendamento_cliente_data_ativo": "agendamento",
+    "idx_agendamento_massoterapeuta_status_data": "agendamento",
+    "idx_cliente_email": "cliente",
+    "idx_cliente_telefone": "cliente",
+    "idx_massoterapeuta_email": "massoterapeuta",
+    # Índices GiST criados pelas constraints de exclusão (migração 0003)
+    "agendamento_sem_sobreposicao_massoterapeuta": "agendamento",
+    "agendamento_sem_sobreposicao_cliente": "agendamento",
+    # Paginação keyset das listagens (migração 0004)
+    "idx_cliente_nome_id": "cliente",
+    "idx_agendamento_massoterapeuta_data_id": "agendamento",
+    "idx_agendamento_cliente_data_id": "agendamento",
+    # Busca de pacientes sem acento (migração 0006)
+    "idx_cliente_nome_trgm": "cliente",
+    "idx_cliente_email_trgm": "cliente",
+    # Fila da caixa de saída de e-mails (migração 0007)
+    "idx_email_outbox_fila": "email_outbox",
+    # Janela de lembretes ainda não enviados (migração 0009)
+    "idx_agendamento_lembrete_pendente": "agendamento",
+    # Telefone normalizado na checagem de duplicidade (migração 0012)
+    "idx_cliente_telefone_e164": "cliente",
+    # Fila de webhooks do WhatsApp (migração 0013)
+    "idx_whatsapp_webhook_fila_pendente": "whatsapp_webhook_fila",
+}
+
+Migracao = namedtuple("Migracao", ["versao", "nome", "caminho", "sql", "transacional"])
+
+_PADRAO_ARQUIVO = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+
+def descobrir_migracoes(diretorio=MIGRATIONS_DIR):
+    """Lê os arquivos de migração do diretório, ordenados por versão."""
+    migracoes = {}
+    for arquivo in sorted(os.listdir(diretorio)):
+        encontrado = _PADRAO_ARQUIVO.match(arquivo)
+        if not encontrado:
+            continue
+        versao = int(encontrado.group(1))
+        if versao in migracoes:
+            raise ValueError(f"Versão de migração duplicada: {versao:04d}")
+        caminho = os.path.join(diretorio, arquivo)
+        if encontrado.group(3) == "py":
+            migracoes[versao] = Migracao(versao, encontrado.group(2), caminho, None, True)
+            continue
+        with open(caminho, encoding="utf-8") as f:
+            sql = f.read()
+        transacional = not sql.lstrip().startswith(MARCADOR_SEM_TRANSACAO)
+        migracoes[versao] = Migracao(versao, encontrado.group(2), caminho, sql, transacional)
+    return [migracoes[v] for v in sorted(migracoes)]
+
+
+def separar_comandos(sql):
+    """
+    Separa um script em comandos individuais (terminados por ';' no fim da linha).
+    Usado só nas migrações sem transação, que não devem conter corpos de função.
+    """
+    sem_comentarios = "\n".join(
+        linha for linha in sql.splitlines() if not linha.strip().startswith("--")
+    )
+    comandos = re.split(r";\s*(?:\n|$)", sem_comentarios)
+    return [c.strip() for c in comandos if c.strip()]
+
+
+def garantir_tabela_controle(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_CONTROLE} (
+                versao INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL,
+                aplicada_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def versoes_aplicadas(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT versao FROM {TABELA_CONTROLE}")
+        return {linha[0] for linha in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.rollback()
+
+
+def _executar_migracao_python(cursor, migracao):
+    """Carrega o arquivo .py da migração e chama upgrade(cursor)."""
+    spec = importlib.util.spec_from_file_location(
+        f"migracao_{migracao.versao:04d}_{migracao.nome}", migracao.caminho
+    )
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    modulo.upgrade(cursor)
+
+
+def aplicar_migracao(conn, migracao):
+    """Aplica uma migração e registra a versão na tabela de controle."""
+    cursor = conn.cursor()
+    try:
+        if migracao.sql is None:
+            _executar_migracao_python(cursor, migracao)
+            cursor.execute(
+                f"INSERT INTO {TABELA_CONTROLE} (versao, nome) VALUES (%s, %s)",
+                (migracao.versao, migracao.nome),
+            )
+            conn.commit()
+        elif migracao.transacional:
+            cursor.execute(migracao.sql)
+            cursor.execute(
+                f"INSERT INTO {TABELA_CONTROLE} (versao, nome) VALUES (%s, %s)",
+                (migracao.versao, migracao.nome),
+            )
+            conn.commit()
+        else:
+            conn.autocommit = True
+            try:
+                for comando in separar_comandos(migracao.sql):
+                    cursor.execute(comando)
+                cursor.execute(
+                    f"INSERT INTO {TABELA_CONTROLE} (versao, nome) VALUES (%s, %s)",
+                    (migracao.versao, migracao.nome),
+                )
+            finally:
+                conn.autocommit = False
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def migrar(conn, migracoes=None):
+    """Aplica todas as migrações pendentes. Retorna a lista das aplicadas."""
+    migracoes = descobrir_migracoes() if migracoes is None else migracoes
+    garantir_tabela_controle(conn)
+    cursor = conn.cursor()
+    aplicadas_agora = []
+    try:
+        # Lock de sessão: vale mesmo para migrações em autocommit
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CHAVE_LOCK_MIGRACAO,))
+        conn.commit()
+        aplicadas = versoes_aplicadas(conn)
+        for migracao in migracoes:
+            if migracao.versao in aplicadas:
+                continue
+            print(f"🔄 Aplicando migração {migracao.versao:04d}_{migracao.nome}...")
+            aplicar_migracao(conn, migracao)
+            aplicadas_agora.append(migracao)
+            print(f"✅ Migração {migracao.versao:04d} aplicada")
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (CHAVE_LOCK_MIGRACAO,))
+        conn.commit()
+        cursor.close()
+    return aplicadas_agora
+
+
+def verificar_indices(conn, esperados=INDICES_ESPERADOS):
+    """
+    Confere se os índices esperados existem e estão válidos.
+    Retorna a lista de problemas encontrados (vazia se tudo certo).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT c.relname, i.indisvalid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = ANY(%s)
+        """, (list(esperados),))
+        encontrados = dict(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.rollback()
+
+    problemas = []
+    for nome, tabela in esperados.items():
+        if nome not in encontrados:
+            problemas.append(f"índice ausente: {nome} (tabela {tabela})")
+        elif not encontrados[nome]:
+            problemas.append(f"índice inválido: {nome} (tabela {tabela}) - recrie com DROP INDEX + migrate")
+    return problemas
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else "up"
+    if comando not in ("up", "status", "check"):
+        print(__doc__)
+        return 2
+
+    conn = get_connection()
+    if not conn:
+        print("❌ Erro: Não foi possível conectar ao banco de dados")
+        return 1
+
+    try:
+        if comando == "up":
+            aplicadas = migrar(conn)
+            if not aplicadas:
+                print("✅ Banco já está na versão mais recente")
+            comando = "check"
+
+        if comando == "status":
+            garantir_tabela_controle(conn)
+            aplicadas = versoes_aplicadas(conn)
+            for migracao in descobrir_migracoes():
+                marca = "✅" if migracao.versao in aplicadas else "⏳"
+                print(f"{marca} {migracao.versao:04d}_{migracao.nome}")
+            return 0
+
+        problemas = verificar_indices(conn)
+        if problemas:
+            print("❌ VERIFICAÇÃO DE ÍNDICES FALHOU:")
+            for problema in problemas:
+                print(f"   • {problema}")
+            return 1
+        print(f"✅ Todos os {len(INDICES_ESPERADOS)} índices esperados estão presentes")
+        return 0
+    finally:
+        conn.close()
+
+
+# ===== EXECUÇÃO DIRETA =====
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+-- =============================================
+-- MIGRAÇÃO 0001: ADICIONAR COLUNA SINTOMAS
+-- =============================================
+-- Adiciona a coluna 'sintomas' na tabela 'agendamento'.
+-- Os clientes podem descrever seus sintomas ao fazer agendamentos.
+-- =============================================
+
+ALTER TABLE agendamento
+ADD COLUMN IF NOT EXISTS sintomas TEXT;
@@ -0,0 +1,40 @@
+-- migrate:no-transaction
+-- =============================================
+-- MIGRAÇÃO 0002: ÍNDICES DAS CONSULTAS MAIS FREQUENTES
+-- =============================================
+-- CREATE INDEX CONCURRENTLY não bloqueia escritas na tabela, mas não pode
+-- rodar dentro de transação (por isso o cabeçalho "no-transaction").
+-- Se um CONCURRENTLY falhar no meio, o índice fica INVÁLIDO e o
+-- "IF NOT EXISTS" não o recria: `python -m Back_end.migrate check` acusa.
+-- =============================================
+
+-- Conflito de horário do massoterapeuta e horários ocupados:
+--   agendamento WHERE massoterapeuta_id = %s AND data_hora = %s
+--   AND status IN ('marcado', 'confirmado', 'pendente')
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamento_massoterapeuta_data_ativo
+    ON agendamento (massoterapeuta_id, data_hora)
+    WHERE status IN ('marcado', 'confirmado', 'pendente');
+
+-- Conflito de horário do cliente:
+--   agendamento WHERE cliente_id = %s AND data_hora = %s
+--   AND status IN ('marcado', 'confirmado', 'pendente')
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamento_cliente_data_ativo
+    ON agendamento (cliente_id, data_hora)
+    WHERE status IN ('marcado', 'confirmado', 'pendente');
+
+-- listar_agendamentos_por_status:
+--   agendamento WHERE massoterapeuta_id = %s AND status IN (...) ORDER BY data_hora DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamento_massoterapeuta_status_data
+    ON agendamento (massoterapeuta_id, status, data_hora DESC);
+
+-- Login, cadastro e confirmação de e-mail: cliente WHERE email = %s
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_email
+    ON cliente (email);
+
+-- Cadastro (telefone duplicado): cliente WHERE telefone = %s
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_telefone
+    ON cliente (telefone);
+
+-- Login do massoterapeuta: massoterapeuta WHERE email = %s
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_massoterapeuta_email
+    ON massoterapeuta (email);
@@ -0,0 +1,60 @@
+-- =============================================
+-- MIGRAÇÃO 0003: AGENDAMENTOS COMO INTERVALOS DE TEMPO
+-- =============================================
+-- Cada agendamento passa a ter um 'periodo' (tstzrange de 1 hora) e duas
+-- constraints de exclusão impedem sobreposição de sessões ativas do mesmo
+-- massoterapeuta ou do mesmo cliente. Isso substitui as checagens
+-- "SELECT ... WHERE data_hora = %s" feitas antes do INSERT: a checagem
+-- fica atômica (sem corrida entre reservas simultâneas) e passa a pegar
+-- sessões que se sobrepõem começando em minutos diferentes.
+--
+-- ATENÇÃO: se já existirem sessões ativas sobrepostas, o ADD CONSTRAINT
+-- falha. Para encontrá-las:
+--   SELECT a.id, b.id FROM agendamento a JOIN agendamento b
+--     ON a.id < b.id AND a.massoterapeuta_id = b.massoterapeuta_id
+--    AND tstzrange(a.data_hora, a.data_hora + INTERVAL '1 hour', '[)')
+--     && tstzrange(b.data_hora, b.data_hora + INTERVAL '1 hour', '[)')
+--  WHERE a.status IN ('marcado', 'confirmado', 'pendente')
+--    AND b.status IN ('marcado', 'confirmado', 'pendente');
+-- =============================================
+
+-- btree_gist: permite usar "massoterapeuta_id WITH =" em um índice GiST
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE agendamento
+ADD COLUMN IF NOT EXISTS periodo TSTZRANGE;
+
+-- Mantém 'periodo' sincronizado com 'data_hora' (sessões de 1 hora).
+-- Trigger em vez de coluna gerada: timestamptz + interval não é IMMUTABLE.
+CREATE OR REPLACE FUNCTION agendamento_definir_periodo() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.periodo := tstzrange(NEW.data_hora, NEW.data_hora + INTERVAL '1 hour', '[)');
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_agendamento_periodo ON agendamento;
+CREATE TRIGGER trg_agendamento_periodo
+    BEFORE INSERT OR UPDATE OF data_hora ON agendamento
+    FOR EACH ROW EXECUTE FUNCTION agendamento_definir_periodo();
+
+-- Preenche os agendamentos já existentes
+UPDATE agendamento
+SET periodo = tstzrange(data_hora, data_hora + INTERVAL '1 hour', '[)')
+WHERE periodo IS NULL;
+
+ALTER TABLE agendamento
+ALTER COLUMN periodo SET NOT NULL;
+
+-- Um massoterapeuta não pode ter duas sessões ativas sobrepostas
+ALTER TABLE agendamento
+ADD CONSTRAINT agendamento_sem_sobreposicao_massoterapeuta
+    EXCLUDE USING gist (massoterapeuta_id WITH =, periodo WITH &&)
+    WHERE (status IN ('marcado', 'confirmado', 'pendente'));
+
+-- Um cliente não pode ter duas sessões ativas sobrepostas
+ALTER TABLE agendamento
+ADD CONSTRAINT agendamento_sem_sobreposicao_cliente
+    EXCLUDE USING gist (cliente_id WITH =, periodo WITH &&)
+    WHERE (status IN ('marcado', 'confirmado', 'pendente'));
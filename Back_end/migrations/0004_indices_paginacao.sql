@@ -0,0 +1,24 @@
+-- migrate:no-transaction
+-- =============================================
+-- MIGRAÇÃO 0004: ÍNDICES DA PAGINAÇÃO KEYSET
+-- =============================================
+-- As listagens paginadas ordenam por uma chave única e continuam a partir
+-- do último item da página anterior. Com o índice na mesma ordem, cada
+-- página é uma leitura curta do índice, sem ordenar a tabela inteira.
+-- =============================================
+
+-- listar_clientes: ORDER BY nome, id / WHERE (nome, id) > (%s, %s)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_nome_id
+    ON cliente (nome, id);
+
+-- listar_agendamentos_massoterapeuta e listar_agendamentos_por_status:
+--   WHERE massoterapeuta_id = %s AND (data_hora, id) < (%s, %s)
+--   ORDER BY data_hora DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamento_massoterapeuta_data_id
+    ON agendamento (massoterapeuta_id, data_hora DESC, id DESC);
+
+-- historico_sessoes_cliente:
+--   WHERE cliente_id = %s AND (data_hora, id) < (%s, %s)
+--   ORDER BY data_hora DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamento_cliente_data_id
+    ON agendamento (cliente_id, data_hora DESC, id DESC);
@@ -0,0 +1,17 @@
+-- =============================================
+-- MIGRAÇÃO 0005: BUSCA DE PACIENTES SEM ACENTO
+-- =============================================
+-- unaccent: "João" e "Joao" passam a casar na busca.
+-- pg_trgm: índices GIN de trigramas atendem LIKE '%termo%' e ordenam por
+-- similaridade (os índices ficam na migração 0006, criados CONCURRENTLY).
+-- =============================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() é STABLE (depende do search_path) e não pode ser usado em
+-- índice. O wrapper fixa o dicionário e o schema, e por isso pode ser
+-- declarado IMMUTABLE.
+CREATE OR REPLACE FUNCTION f_unaccent(TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
@@ -0,0 +1,15 @@
+-- migrate:no-transaction
+-- =============================================
+-- MIGRAÇÃO 0006: ÍNDICES DE TRIGRAMAS DA BUSCA DE PACIENTES
+-- =============================================
+-- Atendem as consultas de Back_end/busca_pacientes.py:
+--   f_unaccent(lower(nome)) LIKE f_unaccent(lower('%termo%'))
+--   similarity(f_unaccent(lower(nome)), ...)
+-- A expressão precisa ser idêntica à usada nas consultas.
+-- =============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_nome_trgm
+    ON cliente USING GIN (f_unaccent(lower(nome)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_email_trgm
+    ON cliente USING GIN (lower(email) gin_trgm_ops);
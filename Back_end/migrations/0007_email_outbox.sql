@@ -0,0 +1,31 @@
+-- =============================================
+-- MIGRAÇÃO 0007: CAIXA DE SAÍDA DE E-MAILS (OUTBOX)
+-- =============================================
+-- Os endpoints gravam o e-mail nesta tabela na mesma transação da mudança
+-- de negócio e respondem logo; o envio (SendGrid/SMTP) é feito pelo
+-- worker (python -m Back_end.outbox_worker), com novas tentativas e
+-- backoff. Depois de OUTBOX_MAX_TENTATIVAS falhas o e-mail fica com
+-- status 'falhou' (dead letter) para análise manual.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    destinatario TEXT NOT NULL,
+    assunto TEXT NOT NULL,
+    conteudo TEXT NOT NULL,
+    tipo TEXT,
+    status TEXT NOT NULL DEFAULT 'pendente'
+        CHECK (status IN ('pendente', 'enviando', 'enviado', 'falhou')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    -- Prazo do envio em andamento: se o worker morrer, outro retoma depois disso
+    travado_ate TIMESTAMPTZ,
+    ultimo_erro TEXT,
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    enviado_em TIMESTAMPTZ
+);
+
+-- Fila do worker: só as linhas ainda não resolvidas, na ordem de vencimento
+CREATE INDEX IF NOT EXISTS idx_email_outbox_fila
+    ON email_outbox (proxima_tentativa_em)
+    WHERE status IN ('pendente', 'enviando');
@@ -0,0 +1,21 @@
+-- =============================================
+-- MIGRAÇÃO 0008: ESTADO DO LEMBRETE POR AGENDAMENTO
+-- =============================================
+-- O job de lembretes (Back_end/lembretes_whatsapp.py) passa a registrar o
+-- que já enviou. Assim ele pode rodar a cada poucos minutos sobre uma
+-- janela deslizante ("sessões começando em 24h ± N minutos") e uma nova
+-- execução após uma queda não reenvia o que já saiu.
+--   lembrete_status NULL  -> ainda não tratado
+--   'enfileirado'         -> reservado por uma execução (até lembrete_travado_ate)
+--   'enviado'             -> aceito pela API do WhatsApp
+--   'falhou'              -> última tentativa falhou (repete até o limite)
+-- =============================================
+
+ALTER TABLE agendamento
+ADD COLUMN IF NOT EXISTS lembrete_status TEXT
+    CHECK (lembrete_status IN ('enfileirado', 'enviado', 'falhou')),
+ADD COLUMN IF NOT EXISTS lembrete_tentativas INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS lembrete_message_id TEXT,
+ADD COLUMN IF NOT EXISTS lembrete_travado_ate TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS lembrete_enviado_em TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS lembrete_ultimo_erro TEXT;
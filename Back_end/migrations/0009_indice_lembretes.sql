@@ -0,0 +1,15 @@
+-- migrate:no-transaction
+-- =============================================
+-- MIGRAÇÃO 0009: ÍNDICE DA JANELA DE LEMBRETES
+-- =============================================
+-- Atende a reserva de lembretes de Back_end/lembretes_whatsapp.py:
+--   WHERE a.status IN ('confirmado', 'marcado')
+--     AND a.lembrete_enviado_em IS NULL
+--     AND a.data_hora BETWEEN %s AND %s
+-- Parcial: só agendamentos ativos ainda sem lembrete ficam no índice, então
+-- cada execução lê apenas o trecho da janela, sem varrer o histórico.
+-- =============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agendamento_lembrete_pendente
+    ON agendamento (data_hora)
+    WHERE status IN ('confirmado', 'marcado') AND lembrete_enviado_em IS NULL;
@@ -0,0 +1,18 @@
+-- =============================================
+-- MIGRAÇÃO 0010: TAREFAS PERIÓDICAS DO AGENDADOR
+-- =============================================
+-- Uma linha por tarefa registrada em Back_end/agendador.py. A réplica que
+-- obtém o advisory lock da tarefa só a executa se proxima_execucao_em já
+-- passou; assim as réplicas não repetem a mesma execução e, depois de um
+-- período sem servidor no ar, a tarefa atrasada roda logo na subida.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS tarefa_agendada (
+    nome TEXT PRIMARY KEY,
+    ultima_execucao_em TIMESTAMPTZ,
+    proxima_execucao_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    ultima_duracao_ms DOUBLE PRECISION,
+    ultimo_erro TEXT,
+    execucoes BIGINT NOT NULL DEFAULT 0,
+    falhas BIGINT NOT NULL DEFAULT 0
+);
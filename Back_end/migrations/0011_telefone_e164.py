@@ -0,0 +1,30 @@
+"""
+MIGRAÇÃO 0011: TELEFONE NORMALIZADO (E.164)
+
+Adiciona telefone_e164 em cliente e massoterapeuta e preenche as linhas
+existentes com a mesma normalização usada na gravação
+(Back_end/telefones.py). Migração em Python porque a regra depende da
+biblioteca phonenumbers. Telefones inválidos ficam com NULL (o original em
+'telefone' é mantido).
+"""
+
+from Back_end.telefones import normalizar_telefone
+
+TABELAS = ("cliente", "massoterapeuta")
+
+
+def upgrade(cursor):
+    for tabela in TABELAS:
+        cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS telefone_e164 TEXT")
+        cursor.execute(
+            f"SELECT id, telefone FROM {tabela} WHERE telefone IS NOT NULL AND telefone_e164 IS NULL"
+        )
+        valores = [
+            (e164, linha_id)
+            for linha_id, telefone in cursor.fetchall()
+            if (e164 := normalizar_telefone(telefone))
+        ]
+        if valores:
+            cursor.executemany(
+                f"UPDATE {tabela} SET telefone_e164 = %s WHERE id = %s", valores
+            )
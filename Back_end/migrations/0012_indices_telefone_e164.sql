@@ -0,0 +1,10 @@
+-- migrate:no-transaction
+-- =============================================
+-- MIGRAÇÃO 0012: ÍNDICE DO TELEFONE NORMALIZADO
+-- =============================================
+-- Checagem de duplicidade no cadastro:
+--   SELECT id FROM cliente WHERE telefone_e164 = %s
+-- =============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cliente_telefone_e164
+    ON cliente (telefone_e164);
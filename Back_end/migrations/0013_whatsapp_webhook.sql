@@ -0,0 +1,33 @@
+-- =============================================
+-- MIGRAÇÃO 0013: FILA DE WEBHOOKS DO WHATSAPP
+-- =============================================
+-- O endpoint do webhook só confere a assinatura, grava o corpo recebido
+-- em whatsapp_webhook_fila e responde 200. O worker
+-- (Back_end/whatsapp_webhook.py) processa cada entry/change/mensagem/status
+-- do lote. whatsapp_evento_processado registra os ids já tratados: a Meta
+-- reenvia entregas, e a mesma mensagem não deve gerar duas respostas.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS whatsapp_webhook_fila (
+    id BIGSERIAL PRIMARY KEY,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendente'
+        CHECK (status IN ('pendente', 'processando', 'processado', 'falhou')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    -- Prazo do processamento em andamento: se o worker morrer, outro retoma depois disso
+    travado_ate TIMESTAMPTZ,
+    ultimo_erro TEXT,
+    recebido_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    processado_em TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_whatsapp_webhook_fila_pendente
+    ON whatsapp_webhook_fila (recebido_em)
+    WHERE status IN ('pendente', 'processando');
+
+CREATE TABLE IF NOT EXISTS whatsapp_evento_processado (
+    -- id da mensagem, ou "id:status" para atualizações de status
+    evento_id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    processado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,179 @@
+"""
+Caixa de saída (outbox) de e-mails
+
+Em vez de chamar o SendGrid dentro da requisição, o código de negócio grava
+o e-mail na tabela email_outbox usando o MESMO cursor da transação que
+altera os dados. Se a transação for desfeita, o e-mail some junto; se for
+confirmada, o e-mail será enviado pelo worker (Back_end/outbox_worker.py).
+
+A entrega é "pelo menos uma vez": se o worker morrer depois de enviar e
+antes de marcar como enviado, o e-mail pode sair de novo após travado_ate.
+"""
+
+import os
+import random
+
+from Back_end.database import get_connection
+
+# ===== CONFIGURAÇÕES =====
+MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", "8"))
+BACKOFF_BASE_SEGUNDOS = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))
+BACKOFF_MAX_SEGUNDOS = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+# Tempo que um envio em andamento fica reservado para o worker que o pegou
+TRAVA_SEGUNDOS = int(os.getenv("OUTBOX_TRAVA_SEGUNDOS", "300"))
+# E-mails enviados ficam na tabela por este período (consulta/auditoria)
+DIAS_RETENCAO_ENVIADOS = int(os.getenv("OUTBOX_DIAS_RETENCAO", "30"))
+
+STATUS_PENDENTE = "pendente"
+STATUS_ENVIANDO = "enviando"
+STATUS_ENVIADO = "enviado"
+STATUS_FALHOU = "falhou"
+
+
+def enfileirar_email(cursor, destinatario, assunto, conteudo, tipo=None):
+    """
+    Grava o e-mail na caixa de saída dentro da transação do chamador.
+    Quem chama é responsável pelo commit. Retorna o id da linha.
+    """
+    cursor.execute("""
+        INSERT INTO email_outbox (destinatario, assunto, conteudo, tipo)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+    """, (destinatario, assunto, conteudo, tipo))
+    linha = cursor.fetchone()
+    return linha[0] if linha else None
+
+
+def enfileirar_email_avulso(destinatario, assunto, conteudo, tipo=None):
+    """
+    Para e-mails sem mudança de dados associada (contato, recuperação de senha):
+    abre a própria transação. Retorna o id ou None se o banco falhar.
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        email_id = enfileirar_email(cursor, destinatario, assunto, conteudo, tipo)
+        conn.commit()
+        return email_id
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao enfileirar e-mail: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def atraso_nova_tentativa(tentativas):
+    """Backoff exponencial com jitter (em segundos) após `tentativas` falhas."""
+    atraso = min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * 2 ** max(0, tentativas - 1))
+    return atraso * random.uniform(0.8, 1.2)
+
+
+def reservar_lote(conn, limite=20):
+    """
+    Reserva até `limite` e-mails vencidos para este worker.
+    FOR UPDATE SKIP LOCKED deixa vários workers drenarem a fila sem
+    pegar a mesma linha; travado_ate devolve à fila envios de workers mortos,
+    enquanto restarem tentativas. Um e-mail cuja trava venceu depois da
+    última tentativa (derrubou ou travou o worker) vai para 'falhou'.
+    Retorna [(id, destinatario, assunto, conteudo, tentativas)].
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE email_outbox
+            SET status = 'falhou', travado_ate = NULL,
+                ultimo_erro = 'Trava expirada na última tentativa (worker interrompido durante o envio)'
+            WHERE status = 'enviando' AND travado_ate < NOW() AND tentativas >= %s
+        """, (MAX_TENTATIVAS,))
+        if cursor.rowcount:
+            print(f"❌ Outbox: {cursor.rowcount} e-mail(s) desistido(s) após travar o worker na última tentativa")
+        cursor.execute("""
+            UPDATE email_outbox
+            SET status = 'enviando',
+                tentativas = tentativas + 1,
+                travado_ate = NOW() + make_interval(secs => %s)
+            WHERE id IN (
+                SELECT id FROM email_outbox
+                WHERE (status = 'pendente' AND proxima_tentativa_em <= NOW())
+                   OR (status = 'enviando' AND travado_ate < NOW() AND tentativas < %s)
+                ORDER BY proxima_tentativa_em
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, destinatario, assunto, conteudo, tentativas
+        """, (TRAVA_SEGUNDOS, MAX_TENTATIVAS, limite))
+        lote = cursor.fetchall()
+        conn.commit()
+        return lote
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def marcar_enviado(conn, email_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE email_outbox
+            SET status = 'enviado', enviado_em = NOW(), travado_ate = NULL, ultimo_erro = NULL
+            WHERE id = %s
+        """, (email_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def marcar_falha(conn, email_id, tentativas, erro):
+    """
+    Agenda nova tentativa com backoff, ou move para 'falhou' (dead letter)
+    ao atingir MAX_TENTATIVAS. Retorna o novo status.
+    """
+    status = STATUS_FALHOU if tentativas >= MAX_TENTATIVAS else STATUS_PENDENTE
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE email_outbox
+            SET status = %s,
+                proxima_tentativa_em = NOW() + make_interval(secs => %s),
+                travado_ate = NULL,
+                ultimo_erro = %s
+            WHERE id = %s
+        """, (status, atraso_nova_tentativa(tentativas), str(erro)[:1000], email_id))
+        conn.commit()
+    finally:
+        cursor.close()
+    return status
+
+
+def limpar_enviados(conn, dias=DIAS_RETENCAO_ENVIADOS):
+    """Apaga e-mails já enviados há mais de `dias` dias. Retorna quantos saíram."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            DELETE FROM email_outbox
+            WHERE status = 'enviado' AND enviado_em < NOW() - make_interval(days => %s)
+        """, (dias,))
+        removidos = cursor.rowcount
+        conn.commit()
+        return removidos
+    finally:
+        cursor.close()
+
+
+def resumo_outbox(conn):
+    """Quantidade de e-mails por status."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status")
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.rollback()
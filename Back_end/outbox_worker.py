@@ -0,0 +1,156 @@
+"""
+Worker da caixa de saída de e-mails
+
+Uso:
+    python -m Back_end.outbox_worker           # drena a fila continuamente
+    python -m Back_end.outbox_worker once      # envia o que está vencido e sai
+    python -m Back_end.outbox_worker status    # quantidade de e-mails por status
+
+Também roda como thread dentro do servidor web (EMAIL_OUTBOX_THREAD=1, o
+padrão). Com um processo worker separado, use EMAIL_OUTBOX_THREAD=0 no web.
+Vários workers podem rodar ao mesmo tempo: cada lote é reservado com
+FOR UPDATE SKIP LOCKED.
+"""
+
+import os
+import sys
+import threading
+
+from Back_end.database import get_connection
+from Back_end import outbox
+
+# ===== CONFIGURAÇÕES =====
+INTERVALO_SEGUNDOS = float(os.getenv("OUTBOX_INTERVALO", "5"))
+TAMANHO_LOTE = int(os.getenv("OUTBOX_LOTE", "20"))
+
+
+def enviar(destinatario, assunto, conteudo):
+    """Envia pelo email_api (SendGrid com fallback SMTP). Levanta exceção se falhar."""
+    from Back_end.email_api import send_email
+    status, resposta = send_email(destinatario, assunto, conteudo)
+    if status != 202:
+        raise RuntimeError(f"Status {status}: {resposta}")
+
+
+def _registrar(funcao, *args):
+    """Executa uma atualização de estado com uma conexão curta do pool."""
+    conn = get_connection()
+    if not conn:
+        print("❌ Outbox: sem conexão para registrar resultado do envio")
+        return None
+    try:
+        return funcao(conn, *args)
+    finally:
+        conn.close()
+
+
+def processar_lote(limite=TAMANHO_LOTE, enviar=enviar):
+    """
+    Reserva um lote, envia cada e-mail e registra o resultado.
+    A conexão não fica presa enquanto o provedor responde.
+    Retorna quantos e-mails foram processados.
+    """
+    conn = get_connection()
+    if not conn:
+        return 0
+    try:
+        lote = outbox.reservar_lote(conn, limite)
+    finally:
+        conn.close()
+
+    for email_id, destinatario, assunto, conteudo, tentativas in lote:
+        try:
+            enviar(destinatario, assunto, conteudo)
+        except Exception as e:
+            status = _registrar(outbox.marcar_falha, email_id, tentativas, e)
+            if status == outbox.STATUS_FALHOU:
+                print(f"❌ Outbox: e-mail {email_id} desistido após {tentativas} tentativas: {e}")
+            else:
+                print(f"⚠️ Outbox: falha no e-mail {email_id} (tentativa {tentativas}): {e}")
+            continue
+        _registrar(outbox.marcar_enviado, email_id)
+    return len(lote)
+
+
+def drenar():
+    """Processa lotes até a fila de vencidos esvaziar. Retorna o total processado."""
+    total = 0
+    while True:
+        processados = processar_lote()
+        total += processados
+        if processados < TAMANHO_LOTE:
+            return total
+
+
+def executar(parar=None, intervalo=INTERVALO_SEGUNDOS):
+    """Laço principal: drena lotes cheios em sequência e dorme quando a fila esvazia."""
+    parar = parar or threading.Event()
+    while not parar.is_set():
+        try:
+            processados = processar_lote()
+        except Exception as e:
+            print(f"Erro no worker da outbox: {e}")
+            processados = 0
+        if processados < TAMANHO_LOTE:
+            parar.wait(intervalo)
+
+
+# ===== EXECUÇÃO EM THREAD (DENTRO DO SERVIDOR WEB) =====
+_thread = None
+_parar_thread = threading.Event()
+
+
+def iniciar_em_thread():
+    """Inicia o worker como thread daemon (uma por processo)."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return _thread
+    _parar_thread.clear()
+    _thread = threading.Thread(target=executar, args=(_parar_thread,), name="email-outbox", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def parar_thread(timeout=5.0):
+    global _thread
+    _parar_thread.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    _thread = None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else "run"
+    if comando not in ("run", "once", "status"):
+        print(__doc__)
+        return 2
+
+    if comando == "status":
+        conn = get_connection()
+        if not conn:
+            print("❌ Erro: Não foi possível conectar ao banco de dados")
+            return 1
+        try:
+            for status, quantidade in sorted(outbox.resumo_outbox(conn).items()):
+                print(f"{status}: {quantidade}")
+        finally:
+            conn.close()
+        return 0
+
+    if comando == "once":
+        total = drenar()
+        print(f"✅ {total} e-mail(s) processado(s)")
+        return 0
+
+    print("📬 Worker da outbox iniciado")
+    try:
+        executar()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+# ===== EXECUÇÃO DIRETA =====
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Paginação por cursor (keyset) das listagens
+
+Em vez de OFFSET, cada página continua a partir da chave de ordenação do
+último item da página anterior, por exemplo (data_hora, id) ou (nome, id).
+O custo de cada página é o mesmo, qualquer que seja a profundidade.
+
+O cursor é opaco para o frontend: JSON com os valores da chave, em base64
+url-safe. Uso típico numa rota:
+
+    after, limite = ler_parametros_paginacao(request.args, (datetime, int))
+    linhas = listar_algo(..., after=after, limit=limite + 1)
+    itens, proximo = montar_pagina(linhas, limite, lambda a: (a["data_hora"], a["id"]))
+    return responder_pagina(itens_formatados, proximo, limite)
+"""
+
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import jsonify, request
+
+# ===== CONFIGURAÇÕES =====
+LIMITE_PADRAO = int(os.getenv("PAGINACAO_LIMITE_PADRAO", "50"))
+LIMITE_MAXIMO = int(os.getenv("PAGINACAO_LIMITE_MAXIMO", "200"))
+CABECALHO_PROXIMO_CURSOR = "X-Next-Cursor"
+
+
+class ParametroPaginacaoInvalido(ValueError):
+    """Cursor ou limite inválido recebido na query string."""
+
+
+def codificar_cursor(*valores):
+    """Transforma a chave do último item num cursor opaco."""
+    serializaveis = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    bruto = json.dumps(serializaveis, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor, tipos):
+    """
+    Reconstrói a chave a partir do cursor. `tipos` diz o tipo de cada valor,
+    por exemplo (datetime, int). Levanta ParametroPaginacaoInvalido.
+    """
+    try:
+        preenchido = cursor + "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(preenchido.encode("ascii")))
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError("quantidade de valores")
+        chave = []
+        for valor, tipo in zip(valores, tipos):
+            if tipo is datetime:
+                chave.append(datetime.fromisoformat(valor))
+            elif isinstance(valor, tipo) and not isinstance(valor, bool):
+                chave.append(valor)
+            else:
+                raise ValueError("tipo inesperado")
+        return tuple(chave)
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise ParametroPaginacaoInvalido("Cursor de paginação inválido")
+
+
+def ler_limite(valor):
+    """Tamanho da página pedido, limitado a LIMITE_MAXIMO."""
+    if valor in (None, ""):
+        return LIMITE_PADRAO
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        raise ParametroPaginacaoInvalido("limit deve ser um número inteiro")
+    if limite < 1:
+        raise ParametroPaginacaoInvalido("limit deve ser maior que zero")
+    return min(limite, LIMITE_MAXIMO)
+
+
+def ler_parametros_paginacao(args, tipos):
+    """Lê ?after=&limit= da query string. Retorna (chave_ou_None, limite)."""
+    after = args.get("after")
+    chave = decodificar_cursor(after, tipos) if after else None
+    return chave, ler_limite(args.get("limit"))
+
+
+def montar_pagina(linhas, limite, chave):
+    """
+    Recebe até limite + 1 linhas (a linha extra só indica que há próxima página)
+    e devolve (itens_da_pagina, proximo_cursor_ou_None).
+    """
+    linhas = list(linhas or [])
+    if len(linhas) <= limite:
+        return linhas, None
+    itens = linhas[:limite]
+    return itens, codificar_cursor(*chave(itens[-1]))
+
+
+def responder_pagina(itens, proximo, limite):
+    """
+    Corpo continua sendo o array de sempre; o próximo cursor vai nos
+    cabeçalhos X-Next-Cursor e Link (rel="next").
+    """
+    resposta = jsonify(itens)
+    if proximo:
+        parametros = {k: v for k, v in request.args.items() if k not in ("after", "limit")}
+        parametros.update({"after": proximo, "limit": limite})
+        resposta.headers[CABECALHO_PROXIMO_CURSOR] = proximo
+        resposta.headers["Link"] = f'<{request.base_url}?{urlencode(parametros)}>; rel="next"'
+    return resposta
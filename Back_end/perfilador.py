@@ -0,0 +1,245 @@
+"""
+Perfilador opcional de requisições em produção
+
+Envolve o WSGI da aplicação e perfila a requisição inteira quando:
+- a requisição cai na amostragem (PERFIL_AMOSTRAGEM, fração de 0 a 1;
+  ex.: 0.01 perfila 1% do tráfego continuamente); ou
+- traz o cabeçalho X-Profile com um token assinado (PERFIL_SEGREDO),
+  gerado por `python -m Back_end.perfilador token [SEGUNDOS]`. A resposta
+  volta com X-Profile-File, o nome do arquivo gerado.
+
+Modos (PERFIL_MODO):
+- "cprofile": determinístico, grava NOME.pstats (abrir com pstats ou
+  snakeviz). Custo alto por requisição; bom para o cabeçalho e amostragens
+  pequenas.
+- "amostragem": uma thread lê a pilha da requisição a cada
+  PERFIL_INTERVALO_MS e grava NOME.folded (pilhas colapsadas, entrada de
+  flamegraph.pl / speedscope). Custo baixo, para deixar sempre ligado.
+
+Os arquivos vão para PERFIL_DIR; só os PERFIL_MAX_ARQUIVOS mais recentes
+são mantidos. Sem amostragem e sem segredo, o middleware nem é instalado.
+
+Uso:
+    python -m Back_end.perfilador token [SEGUNDOS]   # token para X-Profile (padrão: 1 hora)
+    python -m Back_end.perfilador listar             # perfis gravados, do mais novo ao mais velho
+"""
+
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from Back_end.config import settings
+
+# ===== CONFIGURAÇÕES =====
+AMOSTRAGEM = float(os.getenv("PERFIL_AMOSTRAGEM", "0"))
+MODO = os.getenv("PERFIL_MODO", "amostragem")
+INTERVALO_AMOSTRA_S = float(os.getenv("PERFIL_INTERVALO_MS", "5")) / 1000
+DIRETORIO = os.getenv("PERFIL_DIR", os.path.join(tempfile.gettempdir(), "massoterapia_perfis"))
+MAX_ARQUIVOS = int(os.getenv("PERFIL_MAX_ARQUIVOS", "50"))
+VALIDADE_TOKEN_PADRAO = 3600
+CABECALHO = "HTTP_X_PROFILE"  # X-Profile no environ do WSGI
+EXTENSOES = (".pstats", ".folded")
+
+
+# ===== TOKEN DO CABEÇALHO =====
+def _assinatura(segredo, expira_em):
+    return hmac.new(segredo.encode("utf-8"), str(expira_em).encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def gerar_token(segredo, validade=VALIDADE_TOKEN_PADRAO, agora=None):
+    """Token "expira_em.assinatura" aceito até `validade` segundos a partir de agora."""
+    expira_em = int((agora or time.time()) + validade)
+    return f"{expira_em}.{_assinatura(segredo, expira_em)}"
+
+
+def token_valido(token, segredo, agora=None):
+    if not token or not segredo:
+        return False
+    expira_em, _, assinatura = token.partition(".")
+    if not expira_em.isdigit() or int(expira_em) < (agora or time.time()):
+        return False
+    return hmac.compare_digest(assinatura, _assinatura(segredo, int(expira_em)))
+
+
+# ===== AMOSTRADOR DE PILHAS =====
+class AmostradorPilhas:
+    """Lê periodicamente a pilha de uma thread e conta as pilhas colapsadas."""
+
+    def __init__(self, thread_id, intervalo=INTERVALO_AMOSTRA_S):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="perfil-amostrador", daemon=True)
+
+    @staticmethod
+    def colapsar(frame):
+        """Pilha da raiz até o frame atual, no formato "modulo:funcao;modulo:funcao"."""
+        partes = []
+        while frame is not None:
+            codigo = frame.f_code
+            partes.append(f"{frame.f_globals.get('__name__', '?')}:{codigo.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(partes))
+
+    def amostrar(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is not None:
+            self.pilhas[self.colapsar(frame)] += 1
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.amostrar()
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def gravar(self, caminho):
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            for pilha, quantidade in self.pilhas.most_common():
+                arquivo.write(f"{pilha} {quantidade}\n")
+
+
+# ===== ARQUIVOS =====
+def _nome_arquivo(metodo, caminho, duracao_ms):
+    rota = re.sub(r"[^A-Za-z0-9]+", "_", caminho).strip("_") or "raiz"
+    momento = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return f"{momento}_{metodo}_{rota[:80]}_{int(duracao_ms)}ms_{os.getpid()}"
+
+
+def listar_perfis(diretorio=DIRETORIO):
+    """Arquivos de perfil do diretório, do mais novo ao mais velho."""
+    try:
+        nomes = [n for n in os.listdir(diretorio) if n.endswith(EXTENSOES)]
+    except OSError:
+        return []
+    return sorted(nomes, reverse=True)  # o nome começa com a data/hora
+
+
+def rotacionar(diretorio=DIRETORIO, maximo=MAX_ARQUIVOS):
+    """Apaga os perfis mais antigos além de `maximo`."""
+    for nome in listar_perfis(diretorio)[maximo:]:
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except OSError:
+            pass
+
+
+# ===== MIDDLEWARE WSGI =====
+class MiddlewarePerfil:
+    def __init__(self, wsgi_app, amostragem=AMOSTRAGEM, segredo=None, modo=MODO,
+                 diretorio=DIRETORIO, max_arquivos=MAX_ARQUIVOS, sorteio=random.random):
+        self.wsgi_app = wsgi_app
+        self.amostragem = amostragem
+        self.segredo = segredo
+        self.modo = modo
+        self.diretorio = diretorio
+        self.max_arquivos = max_arquivos
+        self._sorteio = sorteio
+        # Só um cProfile por processo de cada vez (o profiler do Python é global no 3.12+)
+        self._cprofile_livre = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        pedido_por_cabecalho = token_valido(environ.get(CABECALHO), self.segredo)
+        if not pedido_por_cabecalho and not (self.amostragem > 0 and self._sorteio() < self.amostragem):
+            return self.wsgi_app(environ, start_response)
+        if self.modo == "cprofile":
+            if not self._cprofile_livre.acquire(blocking=False):
+                return self.wsgi_app(environ, start_response)
+            try:
+                return self._perfilar(environ, start_response, pedido_por_cabecalho)
+            finally:
+                self._cprofile_livre.release()
+        return self._perfilar(environ, start_response, pedido_por_cabecalho)
+
+    def _perfilar(self, environ, start_response, informar_arquivo):
+        # start_response é adiado: o nome do arquivo (X-Profile-File) só
+        # existe depois que a requisição termina
+        chamadas = []
+
+        def start_response_adiado(status, headers, exc_info=None):
+            chamadas.append((status, headers, exc_info))
+            return lambda dados: None
+
+        cprofile = self.modo == "cprofile"
+        perfil = cProfile.Profile() if cprofile else AmostradorPilhas(threading.get_ident())
+        inicio = time.perf_counter()
+        if cprofile:
+            perfil.enable()
+        else:
+            perfil.iniciar()
+        try:
+            iteravel = self.wsgi_app(environ, start_response_adiado)
+            try:
+                corpo = list(iteravel)
+            finally:
+                if hasattr(iteravel, "close"):
+                    iteravel.close()
+        finally:
+            if cprofile:
+                perfil.disable()
+            else:
+                perfil.parar()
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        nome = _nome_arquivo(environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", ""), duracao_ms)
+        nome += ".pstats" if cprofile else ".folded"
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            caminho = os.path.join(self.diretorio, nome)
+            if cprofile:
+                perfil.dump_stats(caminho)
+            else:
+                perfil.gravar(caminho)
+            rotacionar(self.diretorio, self.max_arquivos)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o perfil em {self.diretorio}: {e}")
+            nome = None
+
+        for status, headers, exc_info in chamadas:
+            if informar_arquivo and nome:
+                headers = list(headers) + [("X-Profile-File", nome)]
+            start_response(status, headers, exc_info)
+        return corpo
+
+
+def init_app(app):
+    """Instala o middleware se houver amostragem ou segredo configurado."""
+    if AMOSTRAGEM > 0 or settings.perfil_segredo:
+        app.wsgi_app = MiddlewarePerfil(app.wsgi_app, segredo=settings.perfil_segredo)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else ""
+    if comando == "token" and len(argv) <= 2:
+        if not settings.perfil_segredo:
+            print("❌ Erro: PERFIL_SEGREDO não configurado")
+            return 1
+        validade = int(argv[1]) if len(argv) == 2 else VALIDADE_TOKEN_PADRAO
+        print(gerar_token(settings.perfil_segredo, validade))
+        return 0
+    if comando == "listar":
+        for nome in listar_perfis():
+            print(os.path.join(DIRETORIO, nome))
+        return 0
+    print(__doc__)
+    return 2
+
+
+# ===== EXECUÇÃO DIRETA =====
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,7 @@ from flask import Blueprint, request, jsonify
 # JWT: Sistema de autenticação - criar e verificar tokens
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 # datetime: Manipulação de datas
-from datetime import datetime
-import pytz
+from datetime import datetime, timedelta
 # Funções do módulo cliente: Lógica de negócio
 from Back_end.cliente import (
     cadastrar_cliente,        # Registrar novo cliente
@@ -16,10 +15,20 @@ from Back_end.cliente import (
     historico_sessoes_cliente, # Listar agendamentos
     buscar_cliente_por_id     # Buscar cliente específico
 )
+# Disponibilidade: Horários livres calculados pelas regras da clínica
+from Back_end.disponibilidade import (
+    fuso_clinica, DURACAO_SESSAO, MAX_DIAS_CONSULTA, MAX_PRIMEIROS,
+    horarios_livres, invalidar_disponibilidade,
+    segunda_da_semana, matriz_disponibilidade, primeiros_livres
+)
+# Paginação keyset das listagens
+from Back_end.paginacao import ParametroPaginacaoInvalido, ler_parametros_paginacao, montar_pagina, responder_pagina
+# Outbox: Emails gravados no banco e enviados em segundo plano
+from Back_end.outbox import enfileirar_email, enfileirar_email_avulso
 # Database e email: Conexão e notificações
 from Back_end.database import get_connection
-from Back_end.email_api import send_email, generate_confirmation_token, verify_confirmation_token
-import os
+from Back_end.email_api import generate_confirmation_token, verify_confirmation_token
+from Back_end.config import settings
 from werkzeug.security import generate_password_hash
 
 # ===== CRIAÇÃO DO BLUEPRINT =====
@@ -82,16 +91,11 @@ def recuperar_senha():
         return jsonify({"erro": "Email é obrigatório."}), 400
     # Gera token de redefinição
     token = generate_confirmation_token(email)
-    env = os.getenv("ENV", "prod")
-    if env == "local":
-        frontend_url = os.getenv("FRONTEND_URL_LOCAL", "http://localhost:5173")
-    else:
-        frontend_url = os.getenv("FRONTEND_URL_PROD", "https://hmmassoterapia.com.br")
-    reset_url = f"{frontend_url}/redefinir-senha?token={token}"
+    reset_url = f"{settings.url_frontend_links()}/redefinir-senha?token={token}"
     subject = "Recuperação de senha - Massoterapia TCC"
     content = f"Olá! Para redefinir sua senha, clique no link: {reset_url}\nEste link expira em 24 horas."
-    status, resp = send_email(email, subject, content)
-    if status == 202:
+    # Caixa de saída: responde assim que o email está gravado; o worker envia
+    if enfileirar_email_avulso(email, subject, content, tipo="recuperacao_senha"):
         return jsonify({"mensagem": "Email de recuperação enviado."})
     else:
         return jsonify({"erro": "Falha ao enviar email."}), 500
@@ -275,6 +279,9 @@ def api_cadastrar_agendamento():
     # ===== TRATAMENTO DE ERRO =====
     if not agendamento:
         return jsonify({"erro": "Falha ao criar agendamento"}), 400
+    if isinstance(agendamento, dict) and "erro" in agendamento:
+        # Conflito de horário ou dia sem atendimento
+        return jsonify(agendamento), 400
     
     # ===== RETORNO DE SUCESSO =====
     return jsonify({"mensagem": "Agendamento cadastrado com sucesso", "agendamento": agendamento}), 201
@@ -288,7 +295,13 @@ def api_historico_agendamentos():
     try:
         user_id = get_jwt_identity()
         incluir_futuros = request.args.get("incluir_futuros", "true").lower() == "true"
-        historico = historico_sessoes_cliente(user_id, incluir_futuros=incluir_futuros)
+        try:
+            # Paginação keyset: ?limit=N&after=<cursor>, próximo cursor em X-Next-Cursor
+            after, limite = ler_parametros_paginacao(request.args, (datetime, int))
+        except ParametroPaginacaoInvalido as e:
+            return jsonify({"erro": str(e)}), 400
+        linhas = historico_sessoes_cliente(user_id, incluir_futuros=incluir_futuros, after=after, limit=limite + 1)
+        historico, proximo = montar_pagina(linhas, limite, lambda h: (h['data_hora'], h['id']))
         # Garante que data_hora seja string formatada no timezone de Brasília
         import pytz
         tz_br = pytz.timezone('America/Sao_Paulo')
@@ -297,7 +310,7 @@ def api_historico_agendamentos():
                 continue
             # Converte para o timezone de Brasília antes de formatar
             h['data_hora'] = h['data_hora'].astimezone(tz_br).strftime('%Y-%m-%dT%H:%M:%S')
-        return jsonify(historico or [])
+        return responder_pagina(historico, proximo, limite)
     except Exception as e:
         print(f"Erro ao buscar histórico de agendamentos: {e}")
         return jsonify({"erro": f"Erro interno: {str(e)}"}), 422
@@ -343,6 +356,8 @@ def api_me():
 @rota_clientes.route('/api/massoterapeuta/horarios_ocupados/<int:massoterapeuta_id>', methods=['GET'])
 @jwt_required()
 def horarios_ocupados_massoterapeuta(massoterapeuta_id):
+    # Mantido por compatibilidade com o frontend atual; novas telas devem usar
+    # /api/massoterapeuta/disponibilidade, que é limitado por período
     from Back_end.database import get_connection
     conn = get_connection()
     horarios = []
@@ -356,7 +371,7 @@ def horarios_ocupados_massoterapeuta(massoterapeuta_id):
                 WHERE massoterapeuta_id = %s AND status IN ('marcado', 'confirmado', 'pendente')
             """, (massoterapeuta_id,))
             rows = cursor.fetchall()
-            tz_br = pytz.timezone('America/Sao_Paulo')
+            tz_br = fuso_clinica()
             horarios = [{"data_hora": row[0].astimezone(tz_br).strftime("%Y-%m-%dT%H:%M:%S")} for row in rows]
         except Exception as e:
             print(f"Erro ao buscar horários ocupados: {e}")
@@ -366,6 +381,85 @@ def horarios_ocupados_massoterapeuta(massoterapeuta_id):
             conn.close()
     return jsonify(horarios)
 
+# ================================================================
+# ENDPOINT: HORÁRIOS LIVRES DO MASSOTERAPEUTA
+# URL: GET /api/massoterapeuta/disponibilidade/<massoterapeuta_id>?inicio=YYYY-MM-DD&fim=YYYY-MM-DD
+# ================================================================
+@rota_clientes.route('/api/massoterapeuta/disponibilidade/<int:massoterapeuta_id>', methods=['GET'])
+@jwt_required()
+def disponibilidade_massoterapeuta(massoterapeuta_id):
+    """
+    PROPÓSITO: Retorna os horários que ainda podem ser agendados no período
+
+    PARÂMETROS (query string):
+    - inicio: primeira data (padrão: hoje)
+    - fim: última data, inclusive (padrão: inicio + 6 dias)
+
+    Diferente de horarios_ocupados, a consulta é limitada ao período pedido
+    e já aplica as regras da clínica (seg-qui, 8:00 às 18:00, sessões de 1h).
+    """
+    hoje = datetime.now(fuso_clinica()).date()
+    try:
+        inicio = datetime.strptime(request.args['inicio'], "%Y-%m-%d").date() if request.args.get('inicio') else hoje
+        fim = datetime.strptime(request.args['fim'], "%Y-%m-%d").date() if request.args.get('fim') else inicio + timedelta(days=6)
+    except ValueError:
+        return jsonify({"erro": "Datas devem estar no formato YYYY-MM-DD"}), 400
+    if fim < inicio:
+        return jsonify({"erro": "A data final deve ser igual ou posterior à inicial"}), 400
+    if (fim - inicio).days + 1 > MAX_DIAS_CONSULTA:
+        return jsonify({"erro": f"Período máximo é de {MAX_DIAS_CONSULTA} dias"}), 400
+
+    dias = horarios_livres(massoterapeuta_id, inicio, fim)
+    if dias is None:
+        return jsonify({"erro": "Erro ao consultar disponibilidade"}), 500
+    return jsonify({
+        "massoterapeuta_id": massoterapeuta_id,
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "duracao_minutos": int(DURACAO_SESSAO.total_seconds() // 60),
+        "dias": dias
+    })
+
+# ================================================================
+# ENDPOINT: MATRIZ DE DISPONIBILIDADE DA CLÍNICA
+# URL: GET /api/massoterapeuta/disponibilidade?semana=YYYY-MM-DD[&primeiros=N]
+# ================================================================
+@rota_clientes.route('/api/massoterapeuta/disponibilidade', methods=['GET'])
+@jwt_required()
+def disponibilidade_clinica():
+    """
+    PROPÓSITO: Horários livres de todos os massoterapeutas numa única chamada
+    (telas de agendamento com "qualquer massoterapeuta")
+
+    PARÂMETROS (query string):
+    - semana: qualquer data da semana desejada (padrão: semana atual)
+    - primeiros: se informado, retorna só os N primeiros horários em que
+      algum massoterapeuta está livre, a partir da semana
+    """
+    hoje = datetime.now(fuso_clinica()).date()
+    try:
+        dia = datetime.strptime(request.args['semana'], "%Y-%m-%d").date() if request.args.get('semana') else hoje
+    except ValueError:
+        return jsonify({"erro": "Data deve estar no formato YYYY-MM-DD"}), 400
+    segunda = segunda_da_semana(dia)
+
+    if request.args.get('primeiros'):
+        try:
+            quantidade = int(request.args['primeiros'])
+        except ValueError:
+            return jsonify({"erro": "primeiros deve ser um número inteiro"}), 400
+        if not 1 <= quantidade <= MAX_PRIMEIROS:
+            return jsonify({"erro": f"primeiros deve estar entre 1 e {MAX_PRIMEIROS}"}), 400
+        horarios = primeiros_livres(segunda, quantidade)
+        if horarios is None:
+            return jsonify({"erro": "Erro ao consultar disponibilidade"}), 500
+        return jsonify({"semana": segunda.isoformat(), "primeiros": horarios})
+
+    matriz = matriz_disponibilidade(segunda)
+    if matriz is None:
+        return jsonify({"erro": "Erro ao consultar disponibilidade"}), 500
+    return jsonify(matriz)
+
 # -------------------------------
 # ROTA: Cancelar agendamento do cliente
 # -------------------------------
@@ -400,31 +494,18 @@ def cancelar_agendamento_cliente(agendamento_id):
         
         # Atualiza status para cancelado
         cursor.execute("UPDATE agendamento SET status = 'cancelado' WHERE id = %s", (agendamento_id,))
-        conn.commit()
 
-        # Enviar e-mail para clínica
-        try:
-            from email_api import send_email
-            from flask import request
-            motivo = None
-            if request.is_json and 'motivo' in request.json:
-                motivo = request.json['motivo']
-            # Formatar data para email
-            if isinstance(data_hora, str):
-                from datetime import datetime
-                try:
-                    data_hora_dt = datetime.strptime(data_hora, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    data_hora_dt = data_hora
-            else:
-                data_hora_dt = data_hora
-            data_formatada = data_hora_dt.strftime("%d/%m/%Y às %H:%M") if hasattr(data_hora_dt, 'strftime') else str(data_hora_dt)
-            email_destino = "hmmassoterapia7@gmail.com"
-            assunto = f"Cancelamento de agendamento - Cliente: {nome_cliente}"
-            corpo = f"Agendamento cancelado pelo cliente.\n\nCliente: {nome_cliente}\nTelefone: {telefone_cliente}\nProfissional: {massoterapeuta_nome}\nData: {data_formatada}\nMotivo: {motivo if motivo else 'Não informado'}\n"
-            send_email(email_destino, assunto, corpo)
-        except Exception as e:
-            print(f"Erro ao enviar e-mail de cancelamento: {e}")
+        # Email para a clínica: caixa de saída, na mesma transação do cancelamento
+        motivo = None
+        if request.is_json and 'motivo' in request.json:
+            motivo = request.json['motivo']
+        data_formatada = data_hora.strftime("%d/%m/%Y às %H:%M") if hasattr(data_hora, 'strftime') else str(data_hora)
+        assunto = f"Cancelamento de agendamento - Cliente: {nome_cliente}"
+        corpo = f"Agendamento cancelado pelo cliente.\n\nCliente: {nome_cliente}\nTelefone: {telefone_cliente}\nProfissional: {massoterapeuta_nome}\nData: {data_formatada}\nMotivo: {motivo if motivo else 'Não informado'}\n"
+        enfileirar_email(cursor, settings.email_clinica, assunto, corpo, tipo="cancelamento_cliente")
+
+        conn.commit()
+        invalidar_disponibilidade()
         
         # ===== NOTIFICAÇÃO POR WHATSAPP =====
         # Notificação por WhatsApp removida (integração desativada)
@@ -451,6 +532,7 @@ def limpar_historico_agendamentos():
         # Exclui todos os agendamentos do cliente
         cursor.execute("DELETE FROM agendamento WHERE cliente_id = %s", (user_id,))
         conn.commit()
+        invalidar_disponibilidade()
         cursor.close()
         conn.close()
         return jsonify({"mensagem": "Histórico de agendamentos limpo com sucesso"})
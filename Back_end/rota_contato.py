@@ -5,23 +5,18 @@
 # ===== IMPORTS =====
 from flask import Blueprint, request, jsonify
 from Back_end.email_api import send_email
-import os
-from dotenv import load_dotenv
+from Back_end.outbox import enfileirar_email_avulso
+from Back_end.config import settings
 
 # ===== CONFIGURAÇÕES =====
-load_dotenv()
-
 # Cria blueprint para organizar as rotas de contato
 rota_contato = Blueprint('contato', __name__)
 
-# Email da clínica que receberá as mensagens
-EMAIL_CLINICA = "hmmassoterapia7@gmail.com"
-
 # ===== ROTA: ENVIAR MENSAGEM DE CONTATO =====
 @rota_contato.route('/api/contato', methods=['POST'])
 def enviar_mensagem_contato():
     """
-    Processa formulário de contato e envia email para a clínica
+    Processa formulário de contato e enfileira email para a clínica
     
     Dados esperados (JSON):
     - nome: Nome completo do remetente
@@ -83,22 +78,19 @@ Esta mensagem foi enviada através do formulário de contato do site.
 Para responder, utilize o email: {email}
         """
         
-        # ===== ENVIO DO EMAIL =====
-        status_code, response_text = send_email(
-            to_email=EMAIL_CLINICA,
-            subject=assunto_email,
-            content=conteudo_email
-        )
+        # ===== ENVIO DO EMAIL (CAIXA DE SAÍDA) =====
+        # Grava na outbox e responde; o worker faz o envio com novas tentativas
+        email_id = enfileirar_email_avulso(settings.email_clinica, assunto_email, conteudo_email, tipo="contato")
         
-        # Verifica se o envio foi bem-sucedido
-        if status_code == 202:  # SendGrid retorna 202 para sucesso
+        # Verifica se a mensagem foi gravada
+        if email_id:
             return jsonify({
                 "sucesso": True,
                 "mensagem": "Mensagem enviada com sucesso! Entraremos em contato em breve."
             }), 200
         else:
             # Log do erro para debugging
-            print(f"Erro no envio de email: Status {status_code}, Response: {response_text}")
+            print("Erro ao gravar mensagem de contato na caixa de saída")
             return jsonify({
                 "erro": "Erro interno do servidor ao enviar email"
             }), 500
@@ -119,7 +111,7 @@ def teste_configuracao_email():
     """
     try:
         status_code, response_text = send_email(
-            to_email=EMAIL_CLINICA,
+            to_email=settings.email_clinica,
             subject="Teste de Configuração - Sistema de Contato",
             content="Este é um email de teste para verificar se o sistema de contato está funcionando corretamente."
         )
@@ -4,6 +4,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity  # JWT: jwt_requir
 from Back_end.massoterapeuta import listar_agendamentos, listar_massoterapeutas, listar_clientes, listar_agendamentos_massoterapeuta, verificar_login, atualizar_conta, atualizar_agendamento, listar_agendamentos_por_status, buscar_paciente_com_historico, cancelar_agendamento_com_motivo  # Importa funções de lógica de negócio
 from Back_end.cliente import excluir_cliente  # Importa função para excluir cliente
 from flask_jwt_extended import create_access_token  # Criar tokens de autenticação
+from datetime import datetime  # Tipo da chave data_hora nos cursores de paginação
+from Back_end.busca_pacientes import LIMITE_AUTOCOMPLETE, autocomplete_pacientes  # Busca sem acento / autocomplete
+from Back_end.paginacao import ParametroPaginacaoInvalido, ler_parametros_paginacao, montar_pagina, responder_pagina  # Paginação keyset
 # -------------------------------
 # Login do massoterapeuta
 # -------------------------------
@@ -47,6 +50,10 @@ def get_massoterapeutas():
     except Exception as e:  # Se der erro
         return jsonify({"erro": f"Erro ao buscar massoterapeutas: {str(e)}"}), 500  # Retorna erro 500 (erro interno)
 
+def _chave_agendamento(agendamento):
+    """Chave de ordenação (data_hora, id) usada no cursor das listagens de agendamentos."""
+    return agendamento["data_hora"], agendamento["id"]
+
 # -------------------------------
 # Listar todos os clientes (informações visíveis para massoterapeuta)
 # -------------------------------
@@ -57,10 +64,16 @@ def get_clientes():
     """
     Retorna informações básicas dos clientes (id, nome, telefone, email, criado_em).
     Massoterapeuta precisa estar logado para acessar.
+    Paginado: ?limit=N&after=<cursor>; próximo cursor no cabeçalho X-Next-Cursor.
     """
     try:  # Tenta executar
-        clientes = listar_clientes()  # Busca todos os clientes no banco
-        return jsonify(clientes)  # Retorna lista de clientes em JSON
+        after, limite = ler_parametros_paginacao(request.args, (str, int))  # Cursor (nome, id)
+    except ParametroPaginacaoInvalido as e:
+        return jsonify({"erro": str(e)}), 400
+    try:  # Tenta executar
+        linhas = listar_clientes(after=after, limit=limite + 1)  # Busca uma linha a mais para saber se há próxima página
+        clientes, proximo = montar_pagina(linhas, limite, lambda c: (c["nome"], c["id"]))
+        return responder_pagina(clientes, proximo, limite)  # Retorna lista de clientes em JSON
     except Exception as e:  # Se der erro
         return jsonify({"erro": f"Erro ao buscar clientes: {str(e)}"}), 500  # Retorna erro 500
 
@@ -75,10 +88,16 @@ def get_agendamentos_pendentes():
     """
     Retorna agendamentos com status 'pendente' e 'marcado' do massoterapeuta logado.
     Para serem confirmados ou cancelados.
+    Paginado: ?limit=N&after=<cursor>; próximo cursor no cabeçalho X-Next-Cursor.
     """
     massoterapeuta_id = get_jwt_identity()  # Pega ID do massoterapeuta logado do token JWT
+    try:
+        after, limite = ler_parametros_paginacao(request.args, (datetime, int))  # Cursor (data_hora, id)
+    except ParametroPaginacaoInvalido as e:
+        return jsonify({"erro": str(e)}), 400
     try:  # Tenta executar
-        agendamentos = listar_agendamentos_por_status(massoterapeuta_id, ['pendente', 'marcado'])  # Busca agendamentos que precisam confirmação
+        linhas = listar_agendamentos_por_status(massoterapeuta_id, ['pendente', 'marcado'], after=after, limit=limite + 1)  # Busca agendamentos que precisam confirmação
+        agendamentos, proximo = montar_pagina(linhas, limite, _chave_agendamento)
         lista = [  # Cria lista formatada
             {
                 "id": a["id"],  # ID único do agendamento
@@ -92,7 +111,7 @@ def get_agendamentos_pendentes():
                 "criado_em": str(a["criado_em"])  # Quando foi criado
             } for a in agendamentos  # Para cada agendamento encontrado
         ]
-        return jsonify(lista)  # Retorna lista em JSON
+        return responder_pagina(lista, proximo, limite)  # Retorna lista em JSON
     except Exception as e:  # Se der erro
         return jsonify({"erro": f"Erro ao buscar agendamentos pendentes: {str(e)}"}), 500  # Retorna erro 500
 
@@ -107,10 +126,16 @@ def get_agendamentos_confirmados():
     """
     Retorna agendamentos com status 'confirmado' e 'concluido' do massoterapeuta logado.
     Histórico de sessões já realizadas ou confirmadas.
+    Paginado: ?limit=N&after=<cursor>; próximo cursor no cabeçalho X-Next-Cursor.
     """
     massoterapeuta_id = get_jwt_identity()  # Pega ID do massoterapeuta logado
+    try:
+        after, limite = ler_parametros_paginacao(request.args, (datetime, int))  # Cursor (data_hora, id)
+    except ParametroPaginacaoInvalido as e:
+        return jsonify({"erro": str(e)}), 400
     try:  # Tenta executar
-        agendamentos = listar_agendamentos_por_status(massoterapeuta_id, ['confirmado', 'concluido'])  # Busca histórico de agendamentos
+        linhas = listar_agendamentos_por_status(massoterapeuta_id, ['confirmado', 'concluido'], after=after, limit=limite + 1)  # Busca histórico de agendamentos
+        agendamentos, proximo = montar_pagina(linhas, limite, _chave_agendamento)
         lista = [  # Formata dados para retorno
             {
                 "id": a["id"],  # ID do agendamento
@@ -124,7 +149,7 @@ def get_agendamentos_confirmados():
                 "criado_em": str(a["criado_em"])  # Data de criação
             } for a in agendamentos  # Para cada agendamento do histórico
         ]
-        return jsonify(lista)  # Retorna histórico em JSON
+        return responder_pagina(lista, proximo, limite)  # Retorna histórico em JSON
     except Exception as e:  # Se der erro
         return jsonify({"erro": f"Erro ao buscar agendamentos confirmados: {str(e)}"}), 500  # Retorna erro 500
 
@@ -138,10 +163,16 @@ def get_agendamentos():
     """
     Retorna TODOS os agendamentos do massoterapeuta logado.
     Inclui cliente_id, cliente_nome, data_hora, status e criado_em.
+    Paginado: ?limit=N&after=<cursor>; próximo cursor no cabeçalho X-Next-Cursor.
     """
     massoterapeuta_id = get_jwt_identity()  # Pega ID do massoterapeuta logado
     try:
-        agendamentos = listar_agendamentos_massoterapeuta(massoterapeuta_id)
+        after, limite = ler_parametros_paginacao(request.args, (datetime, int))  # Cursor (data_hora, id)
+    except ParametroPaginacaoInvalido as e:
+        return jsonify({"erro": str(e)}), 400
+    try:
+        linhas = listar_agendamentos_massoterapeuta(massoterapeuta_id, after=after, limit=limite + 1)
+        agendamentos, proximo = montar_pagina(linhas, limite, _chave_agendamento)
         lista = [
             {
                 "id": a["id"],
@@ -155,7 +186,7 @@ def get_agendamentos():
                 "criado_em": str(a["criado_em"])
             } for a in agendamentos
         ]
-        return jsonify(lista)
+        return responder_pagina(lista, proximo, limite)
     except Exception as e:
         return jsonify({"erro": f"Erro ao buscar agendamentos: {str(e)}"}), 500
 
@@ -182,6 +213,30 @@ def buscar_paciente():
     except Exception as e:
         return jsonify({"erro": f"Erro ao buscar paciente: {str(e)}"}), 500
 
+# -------------------------------
+# Autocomplete de pacientes (só id e nome, sem histórico)
+# -------------------------------
+# ENDPOINT: GET /api/massoterapeuta/pacientes/autocomplete?q=jo&limite=10 (PROTEGIDO)
+@rota_massoterapeuta.route('/api/massoterapeuta/pacientes/autocomplete', methods=['GET'])
+@jwt_required()
+def autocomplete_paciente():
+    """
+    Sugestões para o campo de busca de pacientes enquanto o massoterapeuta digita.
+    Ignora acentos ("joao" encontra "João") e ordena pelos nomes mais parecidos.
+    Retorna lista de {id, nome}; vazia para termos com menos de 2 caracteres.
+    """
+    massoterapeuta_id = get_jwt_identity()
+    termo = request.args.get('q', '')
+    try:
+        limite = int(request.args.get('limite', LIMITE_AUTOCOMPLETE))
+    except ValueError:
+        return jsonify({"erro": "Parâmetro 'limite' deve ser um número inteiro"}), 400
+
+    pacientes = autocomplete_pacientes(massoterapeuta_id, termo, limite)
+    if pacientes is None:
+        return jsonify({"erro": "Erro ao buscar pacientes"}), 500
+    return jsonify(pacientes)
+
 # -------------------------------
 # Atualizar perfil do massoterapeuta logado
 # -------------------------------
@@ -270,7 +325,9 @@ def cancelar_agendamento_com_notificacao(agendamento_id):
         if resultado['success']:
             return jsonify({
                 "mensagem": resultado['mensagem'],
-                "email_enviado": resultado.get('email_enviado', False),
+                "email_enfileirado": resultado.get('email_enfileirado', False),
+                # Nome antigo, mantido por uma versão para o frontend (mesmo valor)
+                "email_enviado": resultado.get('email_enfileirado', False),
                 "detalhes": resultado.get('detalhes_email', '')
             })
         else:
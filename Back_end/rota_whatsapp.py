@@ -8,7 +8,9 @@ import logging
 
 
 # Import absoluto para funcionar em produção/deploy
+from Back_end.config import settings
 from Back_end.whatsapp_api import get_whatsapp_api
+from Back_end.whatsapp_webhook import enfileirar_webhook
 
 # Configuração de logging
 logger = logging.getLogger(__name__)
@@ -52,6 +54,9 @@ def verify_webhook():
 def receive_webhook():
     """
     Recebe mensagens e eventos do WhatsApp via webhook
+    Só verifica a assinatura e grava a entrega na fila; o processamento
+    (todas as mensagens e status do lote) é feito pelo worker em
+    Back_end/whatsapp_webhook.py. Responde 200 logo após gravar.
     """
     try:
         # Verifica assinatura (segurança)
@@ -64,39 +69,19 @@ def receive_webhook():
             logger.warning("Assinatura do webhook inválida")
             return jsonify({"erro": "Assinatura inválida"}), 403
         
-        # Processa dados do webhook
-        webhook_data = request.get_json()
-        
-        if not webhook_data:
+        if not request.get_json(silent=True):
             logger.warning("Dados do webhook vazios")
             return jsonify({"erro": "Dados vazios"}), 400
         
-        # Processa mensagem recebida
-        message_data = whatsapp.process_webhook_message(webhook_data)
+        # Grava na fila; sem gravação confirmada, a Meta precisa reenviar
+        if enfileirar_webhook(payload) is None:
+            return jsonify({"status": "error"}), 500
         
-        if message_data:
-            logger.info(f"Mensagem recebida de {message_data.get('from_number')}: {message_data.get('text')}")
-            
-            # Aqui você pode adicionar lógica personalizada:
-            # - Salvar mensagem no banco de dados
-            # - Processar comandos automáticos
-            # - Enviar respostas automáticas
-            # - Notificar massoterapeutas sobre novas mensagens
-            
-            # Exemplo de resposta automática simples
-            if message_data.get('text', '').lower() in ['oi', 'olá', 'hello']:
-                whatsapp.send_message(
-                    message_data['from_number'],
-                    "Olá! Obrigado por entrar em contato. Em breve nossa equipe retornará sua mensagem! 😊"
-                )
-        
-        # Sempre retorna 200 para confirmar recebimento
         return jsonify({"status": "success"}), 200
         
     except Exception as e:
-        logger.error(f"Erro ao processar webhook: {e}")
-        # Mesmo com erro, retorna 200 para não reenviar
-        return jsonify({"status": "error"}), 200
+        logger.error(f"Erro ao receber webhook: {e}")
+        return jsonify({"status": "error"}), 500
 
 @rota_whatsapp.route('/send-message', methods=['POST'])
 def send_message():
@@ -182,13 +167,11 @@ def whatsapp_status():
     """
     try:
         # Testa se as configurações estão corretas
-        import os
-        
         config_status = {
-            "access_token": bool(os.getenv('WHATSAPP_ACCESS_TOKEN')),
-            "phone_number_id": bool(os.getenv('WHATSAPP_PHONE_NUMBER_ID')),
-            "webhook_token": bool(os.getenv('WHATSAPP_WEBHOOK_VERIFY_TOKEN')),
-            "app_secret": bool(os.getenv('FACEBOOK_APP_SECRET'))
+            "access_token": bool(settings.whatsapp_access_token),
+            "phone_number_id": bool(settings.whatsapp_phone_number_id),
+            "webhook_token": bool(settings.whatsapp_webhook_verify_token),
+            "app_secret": bool(settings.facebook_app_secret)
         }
         
         all_configured = all(config_status.values())
@@ -0,0 +1,77 @@
+"""
+Configuração do gunicorn (servidor WSGI de produção)
+
+Uso (Procfile / railway.json):
+    gunicorn -c python:Back_end.servidor Back_end.app:app
+
+Cada worker é um processo com algumas threads (gthread): as rotas passam
+a maior parte do tempo esperando o Postgres e as APIs externas, então
+threads atendem requisições concorrentes sem multiplicar processos.
+
+A aplicação é carregada uma vez no processo mestre (preload_app) e os
+workers nascem por fork. Por isso o que é por processo (conexões do
+pool, threads de segundo plano) é criado nos ganchos abaixo, depois do
+fork, e encerrado quando o worker sai: um SIGTERM do deploy deixa as
+requisições em andamento terminarem dentro de graceful_timeout.
+
+Variáveis de ambiente:
+- PORT (5000), WEB_CONCURRENCY (2 workers), GUNICORN_THREADS (4)
+- GUNICORN_TIMEOUT (30 s), GUNICORN_GRACEFUL_TIMEOUT (30 s)
+- GUNICORN_KEEPALIVE (5 s), GUNICORN_MAX_REQUESTS (1000, 0 desliga)
+"""
+
+import os
+
+# ===== CONFIGURAÇÕES =====
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recicla workers periodicamente (vazamentos de memória); o jitter evita
+# que todos reiniciem ao mesmo tempo
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+# ===== GANCHOS DO CICLO DE VIDA DOS WORKERS =====
+def on_starting(server):
+    """Processo mestre subindo: descarta os arquivos de métricas da execução anterior."""
+    from Back_end import metricas
+
+    metricas.registro.limpar()
+
+
+def post_worker_init(worker):
+    """Depois do fork: aquece o pool do banco e inicia as threads deste worker."""
+    from Back_end import app as aplicacao
+    from Back_end import database
+
+    if os.getenv("DATABASE_URL"):
+        try:
+            database.get_pool().warm()
+        except Exception as e:
+            # Sem banco na subida o worker atende mesmo assim; o pool tenta de novo a cada pedido
+            print(f"⚠️ Worker {worker.pid}: não foi possível aquecer o pool do banco: {e}")
+    aplicacao.iniciar_servicos_de_fundo()
+
+
+def worker_exit(server, worker):
+    """
+    Worker saindo (depois de drenar as requisições): para threads, fecha
+    conexões e soma suas métricas em metricas_encerrados.json.
+    """
+    from Back_end import app as aplicacao
+
+    try:
+        aplicacao.encerrar_servicos_de_fundo()
+    except Exception as e:
+        print(f"⚠️ Worker {worker.pid}: erro ao encerrar serviços: {e}")
@@ -0,0 +1,164 @@
+"""
+Pool de sessões SMTP autenticadas (fallback Gmail do email_api)
+
+Abrir uma sessão custa conexão TCP, STARTTLS e AUTH (várias idas e voltas
+e um handshake TLS). O pool mantém algumas sessões já autenticadas e as
+reaproveita entre mensagens:
+- sessões ociosas há mais de NOOP_APOS_SEGUNDOS passam por um NOOP antes
+  do uso; se o servidor não responder, a sessão é refeita;
+- SMTPServerDisconnected durante o envio reconecta e tenta uma vez mais;
+- cada sessão envia no máximo MAX_MENSAGENS_POR_SESSAO mensagens e depois
+  é encerrada (limites do provedor e vazamento de estado no servidor).
+
+As sessões são devolvidas em ordem LIFO: um lote de e-mails enviado em
+sequência (ex.: cancelamentos drenados pela outbox) sai pela mesma conexão.
+"""
+
+import os
+import threading
+import time
+
+# ===== CONFIGURAÇÕES =====
+TAMANHO_POOL = int(os.getenv("SMTP_POOL_TAMANHO", "2"))
+MAX_MENSAGENS_POR_SESSAO = int(os.getenv("SMTP_MAX_MENSAGENS_SESSAO", "100"))
+NOOP_APOS_SEGUNDOS = float(os.getenv("SMTP_NOOP_APOS", "15"))
+ESPERA_SESSAO_SEGUNDOS = float(os.getenv("SMTP_POOL_ESPERA", "30"))
+
+
+class PoolSMTPEsgotado(Exception):
+    """Nenhuma sessão SMTP ficou livre dentro do tempo de espera."""
+
+
+class _Sessao:
+    def __init__(self, servidor, relogio):
+        self.servidor = servidor
+        self.mensagens = 0
+        self.usada_em = relogio()
+
+
+class PoolSMTP:
+    def __init__(self, host, porta, usuario, senha, tamanho=TAMANHO_POOL,
+                 max_mensagens=MAX_MENSAGENS_POR_SESSAO, noop_apos=NOOP_APOS_SEGUNDOS,
+                 timeout=10.0, fabrica=None, relogio=time.monotonic):
+        self.host = host
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.max_mensagens = max_mensagens
+        self.noop_apos = noop_apos
+        self.timeout = timeout
+        self._fabrica = fabrica
+        self._relogio = relogio
+        self._tamanho = tamanho
+        self._vagas = threading.BoundedSemaphore(tamanho)
+        self._ociosas = []
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._conexoes_abertas = 0
+        self._reconexoes = 0
+        self._mensagens_enviadas = 0
+
+    # ===== CICLO DE VIDA DAS SESSÕES =====
+    def _conectar(self):
+        fabrica = self._fabrica
+        if fabrica is None:
+            # smtplib só é importado na primeira sessão (fora da subida do servidor)
+            import smtplib
+            fabrica = smtplib.SMTP
+        servidor = fabrica(self.host, self.porta, timeout=self.timeout)
+        try:
+            servidor.starttls()
+            servidor.login(self.usuario, self.senha)
+        except Exception:
+            servidor.close()
+            raise
+        with self._lock:
+            self._conexoes_abertas += 1
+        return _Sessao(servidor, self._relogio)
+
+    @staticmethod
+    def _encerrar(sessao):
+        try:
+            sessao.servidor.quit()
+        except Exception:
+            sessao.servidor.close()
+
+    def _saudavel(self, sessao):
+        """NOOP em sessões que ficaram ociosas (o Gmail derruba conexões paradas)."""
+        if self._relogio() - sessao.usada_em < self.noop_apos:
+            return True
+        try:
+            codigo, _ = sessao.servidor.noop()
+            return codigo == 250
+        except OSError:  # Inclui smtplib.SMTPException
+            return False
+
+    def _obter(self):
+        if not self._vagas.acquire(timeout=ESPERA_SESSAO_SEGUNDOS):
+            raise PoolSMTPEsgotado(f"Nenhuma sessão SMTP livre em {ESPERA_SESSAO_SEGUNDOS}s")
+        try:
+            while True:
+                with self._lock:
+                    if self._pid != os.getpid():
+                        # Processo filho (fork): sessões herdadas não podem ser usadas
+                        self._ociosas.clear()
+                        self._pid = os.getpid()
+                    sessao = self._ociosas.pop() if self._ociosas else None
+                if sessao is None:
+                    return self._conectar()
+                if self._saudavel(sessao):
+                    return sessao
+                self._encerrar(sessao)
+        except Exception:
+            self._vagas.release()
+            raise
+
+    def _devolver(self, sessao, descartar=False):
+        try:
+            if descartar or sessao.mensagens >= self.max_mensagens:
+                self._encerrar(sessao)
+            else:
+                sessao.usada_em = self._relogio()
+                with self._lock:
+                    self._ociosas.append(sessao)
+        finally:
+            self._vagas.release()
+
+    # ===== ENVIO =====
+    def enviar(self, remetente, destinatario, mensagem):
+        """sendmail por uma sessão do pool; reconecta uma vez se o servidor caiu."""
+        import smtplib
+        sessao = self._obter()
+        try:
+            try:
+                sessao.servidor.sendmail(remetente, destinatario, mensagem)
+            except smtplib.SMTPServerDisconnected:
+                sessao.servidor.close()
+                with self._lock:
+                    self._reconexoes += 1
+                sessao = self._conectar()
+                sessao.servidor.sendmail(remetente, destinatario, mensagem)
+        except Exception:
+            self._devolver(sessao, descartar=True)
+            raise
+        sessao.mensagens += 1
+        with self._lock:
+            self._mensagens_enviadas += 1
+        self._devolver(sessao)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "sessoes_ociosas": len(self._ociosas),
+                "tamanho": self._tamanho,
+                "conexoes_abertas": self._conexoes_abertas,
+                "reconexoes": self._reconexoes,
+                "mensagens_enviadas": self._mensagens_enviadas,
+            }
+
+    def fechar(self):
+        """Encerra as sessões ociosas (QUIT)."""
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, []
+        for sessao in ociosas:
+            self._encerrar(sessao)
@@ -0,0 +1,61 @@
+"""
+Normalização de telefones para E.164
+
+O telefone é normalizado uma vez, na gravação (cadastro e atualização de
+conta), e guardado em telefone_e164 ("+5511987654321"). A coluna indexada
+faz "(11) 98765-4321" e "11987654321" serem o mesmo número na checagem de
+duplicidade, e os envios de WhatsApp leem o valor pronto.
+
+O parser (phonenumbers) é caro, na importação (tabelas de metadados) e a
+cada chamada: ele só é importado na primeira normalização, e números
+avulsos passam por um cache LRU, então não roda a cada mensagem de um
+laço de envio.
+"""
+
+import re
+from functools import lru_cache
+
+# ===== CONFIGURAÇÕES =====
+CODIGO_PAIS_PADRAO = "55"  # Brasil
+TAMANHO_CACHE = 4096
+_PADRAO_E164 = re.compile(r"^\+[1-9]\d{7,14}$")
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def normalizar_telefone(telefone):
+    """
+    Converte um telefone em qualquer formato para E.164 ("+55DDDNUMERO").
+    Sem código do país, assume Brasil. Retorna None se o número for inválido.
+    """
+    if not telefone:
+        return None
+    digitos = "".join(filter(str.isdigit, str(telefone)))
+    if not digitos:
+        return None
+
+    # DDD + número (10 ou 11 dígitos) ou sem código do país: adiciona Brasil (55)
+    if len(digitos) in (10, 11) or not digitos.startswith(CODIGO_PAIS_PADRAO):
+        digitos = CODIGO_PAIS_PADRAO + digitos
+
+    import phonenumbers
+    from phonenumbers import NumberParseException
+    try:
+        numero = phonenumbers.parse(f"+{digitos}", None)
+    except NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(numero):
+        return None
+    return phonenumbers.format_number(numero, phonenumbers.PhoneNumberFormat.E164)
+
+
+def para_whatsapp(telefone):
+    """
+    Número no formato da Cloud API (só dígitos, com código do país).
+    Valores já em E.164 (lidos de telefone_e164) não passam pelo parser.
+    Levanta ValueError se o número for inválido.
+    """
+    telefone = (telefone or "").strip()
+    e164 = telefone if _PADRAO_E164.match(telefone) else normalizar_telefone(telefone)
+    if e164 is None:
+        raise ValueError(f"Formato de telefone inválido: {telefone}")
+    return e164[1:]
@@ -0,0 +1,109 @@
+"""
+Relatório do tempo de importação (inicialização a frio do servidor)
+
+Roda `python -X importtime -c "import MODULO"` num processo novo e resume
+a saída: tempo total, pacotes mais caros e módulos mais lentos. Serve para
+medir regressões de inicialização (dependência pesada importada no topo
+de um módulo, trabalho feito na importação).
+
+Uso:
+    python -m Back_end.tempo_importacao                      # mede Back_end.app
+    python -m Back_end.tempo_importacao Back_end.agendador   # outro módulo
+    python -m Back_end.tempo_importacao Back_end.app 400     # falha (código 1) acima de 400 ms
+"""
+
+import os
+import re
+import subprocess
+import sys
+from collections import namedtuple
+
+# ===== CONFIGURAÇÕES =====
+MODULO_PADRAO = "Back_end.app"
+TOP = 15
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:       self [us] |  cumulative | imported package"
+_PADRAO_LINHA = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+Importacao = namedtuple("Importacao", "modulo proprio_us acumulado_us profundidade")
+
+
+def interpretar(saida):
+    """
+    Converte a saída de -X importtime em uma lista de Importacao, descartando
+    o que o interpretador importa antes do comando (bloco do `site`).
+    """
+    importacoes = []
+    for linha in saida.splitlines():
+        encontrado = _PADRAO_LINHA.match(linha)
+        if not encontrado:
+            continue
+        proprio, acumulado, espacos, modulo = encontrado.groups()
+        profundidade = (len(espacos) - 1) // 2
+        if profundidade == 0 and modulo == "site":
+            importacoes = []  # Fim da inicialização do interpretador
+            continue
+        importacoes.append(Importacao(modulo, int(proprio), int(acumulado), profundidade))
+    return importacoes
+
+
+def medir(modulo=MODULO_PADRAO):
+    """Importa `modulo` num processo novo. Retorna a lista de Importacao, ou None se falhar."""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ_PROJETO, capture_output=True, text=True,
+    )
+    if resultado.returncode != 0:
+        print(f"❌ Erro ao importar {modulo}:\n{resultado.stderr[-2000:]}")
+        return None
+    return interpretar(resultado.stderr)
+
+
+def resumir(importacoes, top=TOP):
+    """Total (ms), pacotes por tempo próprio somado e módulos mais lentos."""
+    total_us = sum(i.proprio_us for i in importacoes)
+    por_pacote = {}
+    for importacao in importacoes:
+        pacote = importacao.modulo.split(".")[0]
+        por_pacote[pacote] = por_pacote.get(pacote, 0) + importacao.proprio_us
+    pacotes = sorted(por_pacote.items(), key=lambda item: item[1], reverse=True)[:top]
+    modulos = sorted(importacoes, key=lambda i: i.proprio_us, reverse=True)[:top]
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modulos_importados": len(importacoes),
+        "pacotes": [(nome, round(us / 1000, 1)) for nome, us in pacotes],
+        "modulos": [(i.modulo, round(i.proprio_us / 1000, 1)) for i in modulos],
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) > 2 or (len(argv) == 2 and not argv[1].isdigit()):
+        print(__doc__)
+        return 2
+    modulo = argv[0] if argv else MODULO_PADRAO
+    limite_ms = int(argv[1]) if len(argv) == 2 else None
+
+    importacoes = medir(modulo)
+    if importacoes is None:
+        return 1
+    resumo = resumir(importacoes)
+
+    print(f"⏱️ import {modulo}: {resumo['total_ms']} ms ({resumo['modulos_importados']} módulos)")
+    print("\nPacotes (tempo próprio somado):")
+    for nome, ms in resumo["pacotes"]:
+        print(f"  {ms:8.1f} ms  {nome}")
+    print("\nMódulos mais lentos (tempo próprio):")
+    for nome, ms in resumo["modulos"]:
+        print(f"  {ms:8.1f} ms  {nome}")
+
+    if limite_ms is not None and resumo["total_ms"] > limite_ms:
+        print(f"\n❌ Importação acima do limite de {limite_ms} ms")
+        return 1
+    return 0
+
+
+# ===== EXECUÇÃO DIRETA =====
+if __name__ == "__main__":
+    sys.exit(main())
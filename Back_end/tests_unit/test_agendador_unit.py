@@ -0,0 +1,61 @@
+from unittest.mock import patch, MagicMock
+
+from Back_end import agendador
+from Back_end.agendador import Agendador, Tarefa, chave_lock, executar_com_lock
+from Back_end.config import settings
+
+
+def _conn(lock_obtido, vencida):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchone.side_effect = [(lock_obtido,), vencida]
+    return conn, cursor
+
+
+def test_chave_lock_estavel_e_int4():
+    assert chave_lock("lembretes_whatsapp") == chave_lock("lembretes_whatsapp")
+    assert -2 ** 31 <= chave_lock("outbox") < 2 ** 31
+
+
+def test_sem_lock_nao_executa():
+    funcao = MagicMock()
+    conn, _ = _conn(False, None)
+    with patch('Back_end.agendador.get_connection', return_value=conn):
+        assert executar_com_lock(Tarefa("t", funcao, 60)) is False
+    funcao.assert_not_called()
+
+
+def test_executa_vencida_grava_proxima_e_libera_lock():
+    funcao = MagicMock()
+    tarefa = Tarefa("t", funcao, 60)
+    conn, cursor = _conn(True, (True,))
+    with patch('Back_end.agendador.get_connection', return_value=conn):
+        assert executar_com_lock(tarefa) is True
+    funcao.assert_called_once()
+    sqls = [chamada[0][0] for chamada in cursor.execute.call_args_list]
+    assert "INSERT INTO tarefa_agendada" in sqls[2]
+    assert "pg_advisory_unlock" in sqls[-1]
+    assert tarefa.como_dict()["execucoes"] == 1
+
+
+def test_nao_repete_execucao_de_outra_replica():
+    funcao = MagicMock()
+    conn, cursor = _conn(True, (False,))
+    with patch('Back_end.agendador.get_connection', return_value=conn):
+        assert executar_com_lock(Tarefa("t", funcao, 60)) is False
+    funcao.assert_not_called()
+    assert "pg_advisory_unlock" in cursor.execute.call_args[0][0]
+
+
+def test_rodada_respeita_intervalo_local():
+    relogio = MagicMock(return_value=0.0)
+    instancia = Agendador(relogio=relogio)
+    instancia.registrar("t", MagicMock(), 60)
+    with patch('Back_end.agendador.executar_com_lock', return_value=True) as mock_executar:
+        instancia.executar_pendentes()
+        instancia.executar_pendentes()  # ainda dentro do intervalo
+        relogio.return_value = 70.0
+        instancia.executar_pendentes()
+    assert mock_executar.call_count == 2
+    esperadas = {"outbox", "limpeza"} | ({"lembretes_whatsapp"} if settings.whatsapp_habilitado else set())
+    assert set(agendador.agendador.tarefas) == esperadas
@@ -23,3 +23,28 @@ def test_health_check():
     with app.app.app_context():
         result = app.health_check()
         assert result is not None
+
+def test_create_app_registra_rotas():
+    nova = app.create_app()
+    rotas = {regra.rule for regra in nova.url_map.iter_rules()}
+    assert "/" in rotas and "/health" in rotas
+    assert any(r.startswith("/api/clientes") for r in rotas)
+
+def test_iniciar_servicos_sem_banco_nao_inicia_threads():
+    with patch.dict("os.environ", {}, clear=True), \
+         patch("Back_end.agendador.iniciar_em_thread") as agendador:
+        app.iniciar_servicos_de_fundo()
+        agendador.assert_not_called()
+
+def test_ganchos_do_gunicorn():
+    from Back_end import servidor
+    worker = MagicMock(pid=123)
+    with patch.dict("os.environ", {"DATABASE_URL": "postgres://x"}), \
+         patch("Back_end.database.get_pool") as get_pool, \
+         patch("Back_end.app.iniciar_servicos_de_fundo") as iniciar:
+        servidor.post_worker_init(worker)
+        get_pool.return_value.warm.assert_called_once()
+        iniciar.assert_called_once()
+    with patch("Back_end.app.encerrar_servicos_de_fundo") as encerrar:
+        servidor.worker_exit(MagicMock(), worker)
+        encerrar.assert_called_once()
@@ -0,0 +1,31 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from Back_end import busca_pacientes
+
+
+def test_padrao_like_escapa_curingas():
+    assert busca_pacientes.padrao_like("ana_50%") == "%ana\\_50\\%%"
+
+
+def test_termo_curto_nao_consulta_o_banco():
+    with patch('Back_end.busca_pacientes.get_connection') as mock_conn:
+        assert busca_pacientes.autocomplete_pacientes(1, "  a ") == []
+    mock_conn.assert_not_called()
+
+
+def test_autocomplete_sem_acento_e_limitado():
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = [(3, "João Silva"), (8, "Joana")]
+    with patch('Back_end.busca_pacientes.get_connection', return_value=conn):
+        res = busca_pacientes.autocomplete_pacientes(7, "  joao   s ", limite=500)
+    assert res == [{"id": 3, "nome": "João Silva"}, {"id": 8, "nome": "Joana"}]
+    sql, params = conn.cursor.return_value.execute.call_args[0]
+    assert "f_unaccent(lower(c.nome)) LIKE f_unaccent(lower(%s))" in sql
+    assert "similarity(" in sql
+    assert params == ("%joao s%", "%joao s%", 7, "joao s", busca_pacientes.LIMITE_MAXIMO_AUTOCOMPLETE)
+
+
+def test_autocomplete_erro_de_banco():
+    with patch('Back_end.busca_pacientes.get_connection', return_value=None):
+        assert busca_pacientes.autocomplete_pacientes(1, "ana") is None
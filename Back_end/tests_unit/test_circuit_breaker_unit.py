@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from Back_end import email_api
+from Back_end.circuit_breaker import CircuitBreaker, FECHADO, ABERTO, MEIO_ABERTO
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def _breaker(relogio):
+    return CircuitBreaker("teste", janela=10, taxa_falha=0.5, minimo_chamadas=4, tempo_aberto=30, relogio=relogio)
+
+
+def test_abre_pela_taxa_de_falha_da_janela():
+    breaker = _breaker(Relogio())
+    breaker.registrar_sucesso()
+    breaker.registrar_sucesso()
+    breaker.registrar_falha()
+    assert breaker.estado == FECHADO  # ainda abaixo do mínimo de chamadas
+    breaker.registrar_falha()
+    assert breaker.estado == ABERTO  # 2 falhas em 4 = 50%
+    assert breaker.permite() is False
+
+
+def test_meio_aberto_deixa_uma_chamada_de_teste():
+    relogio = Relogio()
+    breaker = _breaker(relogio)
+    for _ in range(4):
+        breaker.registrar_falha()
+    relogio.agora = 31
+    assert breaker.estado == MEIO_ABERTO
+    assert breaker.permite() is True
+    assert breaker.permite() is False  # só uma chamada de teste por vez
+    breaker.registrar_falha()
+    assert breaker.estado == ABERTO
+    relogio.agora = 62
+    assert breaker.permite() is True
+    breaker.registrar_sucesso()
+    assert breaker.estado == FECHADO
+
+
+def test_sonda_fecha_circuito():
+    relogio = Relogio()
+    breaker = CircuitBreaker("teste", minimo_chamadas=1, tempo_aberto=30, relogio=relogio, sonda=lambda: True)
+    with patch('Back_end.circuit_breaker.threading.Timer'):
+        breaker.registrar_falha()
+    relogio.agora = 30
+    breaker._executar_sonda()
+    assert breaker.estado == FECHADO
+
+
+def test_send_email_pula_sendgrid_com_circuito_aberto():
+    breaker = _breaker(Relogio())
+    for _ in range(4):
+        breaker.registrar_falha()
+    with patch.dict(email_api._breakers, {"sendgrid": breaker, "gmail_smtp": _breaker(Relogio())}), \
+         patch('Back_end.email_api._sendgrid_configurado', return_value=True), \
+         patch('Back_end.email_api._smtp_configurado', return_value=True), \
+         patch('Back_end.email_api._enviar_sendgrid') as mock_sendgrid, \
+         patch('Back_end.email_api._enviar_smtp', return_value=(202, "ok")) as mock_smtp:
+        assert email_api.send_email("a@x.com", "A", "corpo") == (202, "ok")
+    mock_sendgrid.assert_not_called()
+    mock_smtp.assert_called_once()
+
+
+def test_send_email_todos_circuitos_abertos_retorna_503():
+    abertos = {}
+    for nome in ("sendgrid", "gmail_smtp"):
+        abertos[nome] = _breaker(Relogio())
+        for _ in range(4):
+            abertos[nome].registrar_falha()
+    with patch.dict(email_api._breakers, abertos), \
+         patch('Back_end.email_api._sendgrid_configurado', return_value=True), \
+         patch('Back_end.email_api._smtp_configurado', return_value=True):
+        status, _ = email_api.send_email("a@x.com", "A", "corpo")
+    assert status == 503
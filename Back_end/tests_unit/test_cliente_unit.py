@@ -75,17 +75,24 @@ def test_cadastrar_cliente_invalid_date(mock_get_conn):
 
 @patch("Back_end.database.get_connection")
 def test_cadastrar_agendamento_conflict(mock_get_conn):
-    # Simula conflito de massoterapeuta
+    # Simula conflito de massoterapeuta: o INSERT viola a constraint de exclusão
     from unittest.mock import patch, MagicMock
+    from psycopg2 import errors
     with patch('Back_end.cliente.get_connection') as mock_cliente_conn:
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_cursor.fetchone.side_effect = [ (1,), None, None ]
+        mock_cursor.execute.side_effect = [errors.ExclusionViolation(), None]
+        mock_cursor.fetchone.return_value = (7, 2, 1, None, None, 'pendente')
         mock_conn.cursor.return_value = mock_cursor
         mock_cliente_conn.return_value = mock_conn
 
         from Back_end.cliente import cadastrar_agendamento
         future = (datetime.now() + timedelta(days=7)).replace(hour=10, minute=0, second=0, microsecond=0)
+        future += timedelta(days=(7 - future.weekday()) % 7)  # próxima segunda-feira
         future_str = future.strftime("%Y-%m-%dT%H:%M")
         res = cadastrar_agendamento(1, 1, future_str, sintomas="dor")
         assert isinstance(res, dict) and "erro" in res
+        assert res["erro"] == "Massoterapeuta já tem agendamento neste horário"
+        assert res["agendamento"] == (7, 2, 1, None, None, 'pendente')
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
@@ -0,0 +1,54 @@
+from unittest.mock import MagicMock, patch
+
+from flask import Response
+
+from Back_end import consultas, metricas
+from Back_end.database import PooledConnection
+
+
+def test_redigir_parametros_nao_expoe_valores():
+    assert consultas.redigir_parametros(("ana@x.com", 7, None, [1, 2])) == ["<str:9>", "<int>", None, "<list:2>"]
+    assert consultas.redigir_parametros({"senha": "segredo"}) == {"senha": "<str:7>"}
+
+
+def test_consulta_lenta_registra_e_anexa_explain(tmp_path, capsys):
+    arquivo = tmp_path / "explain.log"
+    conn_real = MagicMock(autocommit=False)
+    cursor_real = conn_real.cursor.return_value
+    cursor_real.connection = conn_real
+    cursor_real.fetchall.return_value = [("Seq Scan on cliente",), ("Execution Time: 300 ms",)]
+    conn = PooledConnection(MagicMock(), MagicMock(conn=conn_real))
+
+    with patch.object(consultas, "LIMITE_LENTA_MS", 100), \
+         patch.object(consultas, "ARQUIVO_EXPLAIN", str(arquivo)), \
+         patch("Back_end.database.time.perf_counter", side_effect=[1.0, 1.3]):
+        conn.cursor().execute("SELECT *\n  FROM cliente WHERE email = %s", ("ana@x.com",))
+
+    saida = capsys.readouterr().out
+    assert '"evento": "consulta_lenta"' in saida
+    assert "ana@x.com" not in saida and "<str:9>" in saida
+    comandos = [c.args[0] for c in cursor_real.execute.call_args_list]
+    assert "EXPLAIN (ANALYZE, BUFFERS) SELECT *\n  FROM cliente WHERE email = %s" in comandos
+    assert "SAVEPOINT explicar_consulta_lenta" in comandos
+    assert "Seq Scan on cliente" in arquivo.read_text()
+
+
+def test_update_lento_nao_e_repetido_com_explain(tmp_path):
+    cursor_real = MagicMock()
+    with patch.object(consultas, "ARQUIVO_EXPLAIN", str(tmp_path / "explain.log")):
+        consultas.registrar_consulta_lenta(cursor_real, "UPDATE cliente SET nome = %s", ("x",), 1.0)
+    cursor_real.connection.cursor.assert_not_called()
+
+
+def test_anotar_resposta_em_debug_adiciona_cabecalhos(capsys):
+    medicao = metricas.MedicaoRequisicao()
+    token = metricas._medicao_atual.set(medicao)
+    for segundos in (0.002, 0.010, 0.003):
+        metricas.registrar_tempo_banco(segundos)
+    metricas._medicao_atual.reset(token)
+
+    resposta = Response("ok")
+    consultas.anotar_resposta(resposta, medicao, "GET", "/api/x", debug=True)
+    assert resposta.headers["X-DB-Query-Count"] == "3"
+    assert resposta.headers["X-DB-Query-Max-Ms"] == "10.0"
+    assert '"consultas": 3' in capsys.readouterr().out
@@ -0,0 +1,155 @@
+import pytest
+from unittest.mock import MagicMock
+from psycopg2 import extensions
+from Back_end import database
+
+
+def _fake_conn():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+def _pool(**kwargs):
+    conexoes = []
+
+    def connect():
+        conn = _fake_conn()
+        conexoes.append(conn)
+        return conn
+
+    return database.ConnectionPool(connect, **kwargs), conexoes
+
+
+def test_close_devolve_conexao_ao_pool():
+    pool, conexoes = _pool(max_size=2)
+    conn = pool.getconn()
+    conn.close()
+    conn2 = pool.getconn()
+    assert len(conexoes) == 1
+    assert conn2._conn is conexoes[0]
+    assert conexoes[0].close.call_count == 0
+    stats = pool.stats()
+    assert stats["in_use"] == 1 and stats["checkouts"] == 2
+
+
+def test_timeout_quando_pool_esgotado():
+    pool, _ = _pool(max_size=1, timeout=0.05)
+    emprestada = pool.getconn()
+    with pytest.raises(database.PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+    emprestada.close()
+
+
+def test_conexao_quebrada_e_descartada():
+    pool, conexoes = _pool(max_size=2)
+    conn = pool.getconn()
+    conexoes[0].closed = 2
+    conn.close()
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["connections_discarded"] == 1
+
+
+def test_transacao_aberta_e_desfeita_na_devolucao():
+    pool, conexoes = _pool()
+    conn = pool.getconn()
+    conexoes[0].get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+    conn.close()
+    conexoes[0].rollback.assert_called_once()
+    assert pool.stats()["idle"] == 1
+
+
+def test_teste_de_vida_recicla_conexao_morta():
+    pool, conexoes = _pool(check_interval=0)
+    pool.getconn().close()
+    conexoes[0].cursor.return_value.execute.side_effect = Exception("server closed the connection")
+    conn = pool.getconn()
+    assert conn._conn is conexoes[1]
+    conexoes[0].close.assert_called_once()
+
+
+def test_conexao_devolvida_nao_pode_ser_usada():
+    pool, _ = _pool()
+    conn = pool.getconn()
+    conn.close()
+    assert conn.closed
+    with pytest.raises(database.InterfaceError):
+        conn.cursor()
+
+
+def test_negociador_ssl_memoriza_modo_que_funciona():
+    from unittest.mock import patch
+    from psycopg2 import OperationalError
+
+    def connect(**kwargs):
+        if kwargs["sslmode"] == "require":
+            raise OperationalError("server does not support SSL")
+        return _fake_conn()
+
+    negociador = database.NegociadorSSL("postgresql://u:p@localhost/db")
+    with patch("Back_end.database.psycopg2.connect", side_effect=connect) as mock_connect:
+        negociador.conectar()
+        assert negociador.modo == "disable"
+        mock_connect.reset_mock()
+        negociador.conectar()
+        assert mock_connect.call_count == 1
+        assert mock_connect.call_args.kwargs["sslmode"] == "disable"
+
+
+def test_negociador_ssl_respeita_sslmode_do_dsn():
+    negociador = database.NegociadorSSL("postgresql://u:p@localhost/db?sslmode=verify-full")
+    assert negociador.modos == ("verify-full",)
+
+
+def test_unidade_de_trabalho_compartilha_conexao_e_confirma_uma_vez():
+    pool, conexoes = _pool()
+    unidade = database.UnidadeDeTrabalho(pool=pool)
+    primeira = unidade.conexao()
+    primeira.commit()
+    primeira.close()
+    segunda = unidade.conexao()
+    segunda.rollback()
+    segunda.close()
+    unidade.finalizar(commit=True)
+
+    assert len(conexoes) == 1
+    assert pool.stats()["checkouts"] == 1
+    conexoes[0].commit.assert_called_once()
+    comandos = [c.args[0] for c in conexoes[0].cursor.return_value.execute.call_args_list]
+    assert comandos[0] == "SAVEPOINT uow_1"
+    assert "RELEASE SAVEPOINT uow_1; SAVEPOINT uow_1" in comandos
+    assert "ROLLBACK TO SAVEPOINT uow_1; RELEASE SAVEPOINT uow_1; SAVEPOINT uow_2" in comandos
+    assert pool.stats()["in_use"] == 0
+
+
+def test_unidade_de_trabalho_sem_uso_nao_pega_conexao():
+    pool, conexoes = _pool()
+    database.UnidadeDeTrabalho(pool=pool).finalizar(commit=True)
+    assert conexoes == []
+
+
+def test_acoes_pos_commit_rodam_so_depois_do_commit_real():
+    pool, conexoes = _pool()
+    unidade = database.UnidadeDeTrabalho(pool=pool)
+    ordem = []
+    conn = unidade.conexao()
+    conexoes[0].commit.side_effect = lambda: ordem.append("commit")
+    conn.commit()  # só RELEASE SAVEPOINT
+    unidade.apos_commit(ordem.append, "invalidar")
+    assert ordem == []
+    unidade.finalizar(commit=True)
+    assert ordem == ["commit", "invalidar"]
+
+    desfeita = database.UnidadeDeTrabalho(pool=pool)
+    desfeita.conexao()
+    desfeita.apos_commit(ordem.append, "descartada")
+    desfeita.finalizar(commit=False)
+    assert ordem == ["commit", "invalidar"]
+
+
+def test_apos_commit_sem_unidade_roda_na_hora():
+    chamadas = []
+    database.apos_commit(chamadas.append, 1)
+    assert chamadas == [1]
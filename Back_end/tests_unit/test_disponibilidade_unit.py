@@ -0,0 +1,152 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from datetime import date, datetime, timedelta
+
+from Back_end import disponibilidade
+from Back_end.disponibilidade import fuso_clinica, SLOTS_POR_DIA, DIA_TODO_LIVRE
+
+SEGUNDA = date(2030, 1, 7)  # segunda-feira
+
+
+def _br(dia, hora, minuto=0):
+    return fuso_clinica().localize(datetime(dia.year, dia.month, dia.day, hora, minuto))
+
+
+@pytest.fixture(autouse=True)
+def limpar_cache():
+    disponibilidade.invalidar_disponibilidade()
+    yield
+    disponibilidade.invalidar_disponibilidade()
+
+
+def test_dia_util_tem_onze_slots_das_8_as_18():
+    assert SLOTS_POR_DIA == 11
+    slots = disponibilidade.slots_livres(SEGUNDA, DIA_TODO_LIVRE)
+    assert slots[0] == _br(SEGUNDA, 8)
+    assert slots[-1] == _br(SEGUNDA, 18)
+
+
+def test_sexta_e_fim_de_semana_sem_horarios():
+    for deslocamento in (4, 5, 6):
+        assert disponibilidade.mapa_do_dia(SEGUNDA + timedelta(days=deslocamento), []) == 0
+
+
+def test_sessao_fora_da_grade_bloqueia_os_dois_slots_sobrepostos():
+    inicio = _br(SEGUNDA, 10, 30)
+    mapa = disponibilidade.mapa_do_dia(SEGUNDA, [(inicio, inicio + timedelta(hours=1))])
+    livres = [s.hour for s in disponibilidade.slots_livres(SEGUNDA, mapa)]
+    assert 10 not in livres and 11 not in livres
+    assert 9 in livres and 12 in livres
+
+
+def test_sessao_de_outro_dia_nao_afeta():
+    inicio = _br(SEGUNDA + timedelta(days=1), 10)
+    assert disponibilidade.mapa_do_dia(SEGUNDA, [(inicio, inicio + timedelta(hours=1))]) == DIA_TODO_LIVRE
+
+
+def test_semana_em_cache_nao_consulta_o_banco():
+    ocupado = _br(SEGUNDA, 9)
+    with patch('Back_end.disponibilidade._buscar_ocupados', return_value=[(ocupado, ocupado + timedelta(hours=1))]) as mock_busca:
+        primeiro = disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA + timedelta(days=3))
+        segundo = disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA + timedelta(days=3))
+    assert mock_busca.call_count == 1
+    assert primeiro == segundo
+    assert not primeiro[SEGUNDA] >> 1 & 1  # 9:00 ocupado
+
+
+def test_invalidacao_da_semana_forca_nova_consulta():
+    with patch('Back_end.disponibilidade._buscar_ocupados', return_value=[]) as mock_busca:
+        disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA)
+        disponibilidade.calcular_disponibilidade(2, SEGUNDA, SEGUNDA)
+        disponibilidade.invalidar_disponibilidade(1, _br(SEGUNDA, 15))
+        disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA)
+        disponibilidade.calcular_disponibilidade(2, SEGUNDA, SEGUNDA)
+    assert mock_busca.call_count == 3
+
+
+def test_invalidacao_na_requisicao_espera_o_commit_real():
+    from Back_end import database
+    unidade = database.UnidadeDeTrabalho(pool=MagicMock())
+    token = database._unidade_atual.set(unidade)
+    try:
+        with patch('Back_end.disponibilidade._buscar_ocupados', return_value=[]) as mock_busca:
+            disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA)
+            disponibilidade.invalidar_disponibilidade(1, _br(SEGUNDA, 15))
+            # Só RELEASE SAVEPOINT até aqui: o cache ainda não foi descartado
+            disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA)
+            assert mock_busca.call_count == 1
+            unidade.finalizar(commit=True)
+            disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA)
+        assert mock_busca.call_count == 2
+    finally:
+        database._unidade_atual.reset(token)
+
+
+def test_consulta_limitada_ao_periodo():
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = []
+    with patch('Back_end.disponibilidade.get_connection', return_value=conn):
+        disponibilidade.calcular_disponibilidade(5, SEGUNDA, SEGUNDA + timedelta(days=9))
+    sql, params = conn.cursor.return_value.execute.call_args[0]
+    assert "data_hora >= %s AND data_hora < %s" in sql
+    assert params[0] == 5
+    assert params[2] == fuso_clinica().localize(datetime(2030, 1, 21))  # duas semanas lidas de uma vez
+
+
+def test_horarios_livres_omite_passado():
+    with patch('Back_end.disponibilidade._buscar_ocupados', return_value=[]):
+        dias = disponibilidade.horarios_livres(1, SEGUNDA, SEGUNDA + timedelta(days=6), agora=_br(SEGUNDA, 16, 10))
+    assert [d["data"] for d in dias] == ["2030-01-07", "2030-01-08", "2030-01-09", "2030-01-10"]
+    assert dias[0]["horarios"] == ["2030-01-07T17:00:00", "2030-01-07T18:00:00"]
+    assert len(dias[1]["horarios"]) == SLOTS_POR_DIA
+
+
+def test_horarios_livres_erro_de_banco():
+    with patch('Back_end.disponibilidade.get_connection', return_value=None):
+        assert disponibilidade.horarios_livres(1, SEGUNDA, SEGUNDA) is None
+
+
+def _agenda_clinica(linhas):
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = linhas
+    return patch('Back_end.disponibilidade.get_connection', return_value=conn)
+
+
+def test_matriz_semana_uma_linha_por_massoterapeuta():
+    linhas = [
+        (1, "Ana", _br(SEGUNDA, 8)),
+        (1, "Ana", _br(SEGUNDA, 9)),
+        (2, "Bruno", None),
+    ]
+    with _agenda_clinica(linhas):
+        matriz = disponibilidade.matriz_disponibilidade(SEGUNDA, agora=_br(SEGUNDA, 0))
+    assert len(matriz["horarios"]) == disponibilidade.COLUNAS_POR_SEMANA == 44
+    ana, bruno = matriz["massoterapeutas"]
+    assert ana["disponivel"][:3] == [False, False, True]
+    assert all(bruno["disponivel"])
+    # A consulta também aquece o cache por massoterapeuta
+    with patch('Back_end.disponibilidade._buscar_ocupados') as mock_busca:
+        disponibilidade.calcular_disponibilidade(1, SEGUNDA, SEGUNDA)
+    mock_busca.assert_not_called()
+
+
+def test_primeiros_livres_em_qualquer_massoterapeuta():
+    linhas = [
+        (1, "Ana", _br(SEGUNDA, 17)),
+        (2, "Bruno", _br(SEGUNDA, 17)),
+        (2, "Bruno", _br(SEGUNDA, 18)),
+    ]
+    with _agenda_clinica(linhas):
+        primeiros = disponibilidade.primeiros_livres(SEGUNDA, 3, agora=_br(SEGUNDA, 16, 30))
+    assert [p["data_hora"] for p in primeiros] == [
+        "2030-01-07T18:00:00", "2030-01-08T08:00:00", "2030-01-08T09:00:00"
+    ]
+    assert primeiros[0]["massoterapeutas"] == [{"id": 1, "nome": "Ana"}]
+    assert len(primeiros[1]["massoterapeutas"]) == 2
+
+
+def test_primeiros_livres_percorre_semanas_seguintes():
+    with _agenda_clinica([(1, "Ana", None)]) as mock_conn:
+        primeiros = disponibilidade.primeiros_livres(SEGUNDA, 2, agora=_br(SEGUNDA + timedelta(days=4), 0))
+    assert [p["data_hora"] for p in primeiros] == ["2030-01-14T08:00:00", "2030-01-14T09:00:00"]
+    assert mock_conn.call_count == 2
@@ -1,4 +1,7 @@
 import pytest
+from unittest.mock import patch
+from Back_end import email_api
+from Back_end.circuit_breaker import CircuitBreaker
 from Back_end.email_api import generate_confirmation_token, verify_confirmation_token
 
 def test_generate_and_verify_token():
@@ -7,3 +10,30 @@ def test_generate_and_verify_token():
     assert isinstance(token, str)
     decoded = verify_confirmation_token(token)
     assert decoded == email
+
+
+def _breaker():
+    return CircuitBreaker("teste", janela=10, taxa_falha=0.5, minimo_chamadas=4, tempo_aberto=30)
+
+
+def test_send_bulk_email_agrupa_e_so_reenvia_lote_que_falhou():
+    destinatarios = [(f"c{i}@x.com", {"-nome-": f"C{i}"}) for i in range(1500)]
+    with patch.dict(email_api._breakers, {"sendgrid": _breaker()}), \
+         patch('Back_end.email_api._sendgrid_configurado', return_value=True), \
+         patch('Back_end.email_api._enviar_lote_sendgrid', side_effect=[(202, ""), (400, "bad")]) as mock_lote, \
+         patch('Back_end.email_api.send_email', return_value=(202, "smtp")) as mock_individual:
+        resultados = email_api.send_bulk_email(destinatarios, "Olá -nome-", "Lembrete para -nome-")
+    assert [len(chamada[0][0]) for chamada in mock_lote.call_args_list] == [1000, 500]
+    assert mock_individual.call_count == 500
+    assert mock_individual.call_args_list[0][0] == ("c1000@x.com", "Olá C1000", "Lembrete para C1000")
+    assert resultados["c0@x.com"][0] == 202 and resultados["c1499@x.com"] == (202, "smtp")
+
+
+def test_send_bulk_email_envia_uma_vez_para_destinatario_repetido():
+    destinatarios = [(" a@x.com", {"-nome-": "Ana"}), "b@x.com", ("A@x.com ", {"-nome-": "Outra"})]
+    with patch.dict(email_api._breakers, {"sendgrid": _breaker()}), \
+         patch('Back_end.email_api._sendgrid_configurado', return_value=True), \
+         patch('Back_end.email_api._enviar_lote_sendgrid', return_value=(202, "")) as mock_lote:
+        resultados = email_api.send_bulk_email(destinatarios, "Olá -nome-", "Oi")
+    assert mock_lote.call_args[0][0] == [("a@x.com", {"-nome-": "Ana"}), ("b@x.com", {})]
+    assert set(resultados) == {"a@x.com", "b@x.com"}
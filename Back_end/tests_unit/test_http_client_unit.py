@@ -0,0 +1,64 @@
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+
+from Back_end import http_client
+
+
+@pytest.fixture(autouse=True)
+def sem_espera():
+    http_client.fechar()
+    with patch('Back_end.http_client.time.sleep') as mock_sleep:
+        yield mock_sleep
+    http_client.fechar()
+
+
+def _resposta(status, headers=None):
+    resposta = MagicMock(status_code=status)
+    resposta.headers = headers or {}
+    return resposta
+
+
+def test_sessao_reaproveitada_por_host():
+    a = http_client.obter_sessao("https://api.sendgrid.com/v3/mail/send")
+    b = http_client.obter_sessao("https://api.sendgrid.com/outra")
+    c = http_client.obter_sessao("https://graph.facebook.com/v18.0/1/messages")
+    assert a is b and a is not c
+
+
+def test_repete_em_503_e_usa_timeouts():
+    sessao = MagicMock()
+    sessao.post.side_effect = [_resposta(503), _resposta(202)]
+    with patch('Back_end.http_client.obter_sessao', return_value=sessao):
+        resposta = http_client.post("https://api.sendgrid.com/v3/mail/send", "teste_503", json={})
+    assert resposta.status_code == 202
+    assert sessao.post.call_count == 2
+    assert sessao.post.call_args[1]["timeout"] == (http_client.TIMEOUT_CONEXAO, http_client.TIMEOUT_LEITURA)
+    stats = http_client.estatisticas()["teste_503"]
+    assert stats["requisicoes"] == 2 and stats["erros"] == 1 and stats["novas_tentativas"] == 1
+
+
+def test_retry_after_respeitado(sem_espera):
+    sessao = MagicMock()
+    sessao.post.side_effect = [_resposta(429, {"Retry-After": "2"}), _resposta(202)]
+    with patch('Back_end.http_client.obter_sessao', return_value=sessao):
+        http_client.post("https://api.sendgrid.com/v3/mail/send", "teste_429")
+    sem_espera.assert_called_once_with(2.0)
+
+
+def test_nao_repete_timeout_de_leitura():
+    sessao = MagicMock()
+    sessao.post.side_effect = requests.exceptions.ReadTimeout()
+    with patch('Back_end.http_client.obter_sessao', return_value=sessao):
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            http_client.post("https://api.sendgrid.com/v3/mail/send", "teste_timeout")
+    assert sessao.post.call_count == 1
+
+
+def test_falha_de_conexao_esgota_tentativas():
+    sessao = MagicMock()
+    sessao.post.side_effect = requests.ConnectionError()
+    with patch('Back_end.http_client.obter_sessao', return_value=sessao):
+        with pytest.raises(requests.ConnectionError):
+            http_client.post("https://api.sendgrid.com/v3/mail/send", "teste_conexao")
+    assert sessao.post.call_count == http_client.MAX_TENTATIVAS
@@ -0,0 +1,80 @@
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+from Back_end import lembretes_whatsapp
+from Back_end.lembretes_whatsapp import LimitadorTaxa, percentil
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+    def dormir(self, segundos):
+        self.agora += segundos
+
+
+def test_limitador_respeita_rajada_e_taxa():
+    relogio = Relogio()
+    limitador = LimitadorTaxa(taxa=10, capacidade=5, relogio=relogio, dormir=relogio.dormir)
+    for _ in range(5):
+        limitador.adquirir()
+    assert relogio.agora == 0  # rajada inicial sem espera
+    for _ in range(10):
+        limitador.adquirir()
+    assert abs(relogio.agora - 1.0) < 1e-6  # depois, 10 por segundo
+
+
+def test_percentil():
+    assert percentil([], 50) is None
+    valores = list(range(1, 101))
+    assert percentil(valores, 50) == 50
+    assert percentil(valores, 95) == 95
+
+
+def test_resumo_do_envio_diario():
+    amanha = datetime(2030, 1, 2, 10, 0)
+    agendamentos = [
+        (1, amanha, "Ana", "11999990000", "Massoterapeuta", None),
+        (2, amanha, "Bia", "  ", "Massoterapeuta", None),
+        (3, amanha, "Caio", "11999990001", "Massoterapeuta", None),
+    ]
+    whatsapp = MagicMock()
+    whatsapp.send_appointment_reminder.side_effect = lambda phone, **_: {
+        "success": phone.endswith("0"), "message_id": "m", "error": "x"
+    }
+    with patch('Back_end.lembretes_whatsapp._reservar_lembretes', return_value=agendamentos), \
+         patch('Back_end.lembretes_whatsapp._registrar_resultado') as mock_registrar, \
+         patch('Back_end.lembretes_whatsapp.get_whatsapp_api', return_value=whatsapp):
+        resumo = lembretes_whatsapp.enviar_lembretes_diarios(max_concorrencia=2)
+    assert (resumo["total"], resumo["enviados"], resumo["falhas"], resumo["ignorados"]) == (3, 1, 1, 1)
+    assert resumo["latencia_p95_ms"] is not None
+    assert whatsapp.send_appointment_reminder.call_args[1]["data_hora"] == amanha
+    registrados = {chamada[0][0]: chamada[0][1:3] for chamada in mock_registrar.call_args_list}
+    assert registrados == {1: ("enviado", "m"), 2: ("ignorado", None), 3: ("falhou", None)}
+
+
+def test_reserva_usa_janela_deslizante():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.return_value = []
+    with patch('Back_end.lembretes_whatsapp.get_connection', return_value=conn):
+        assert lembretes_whatsapp._reservar_lembretes() == []
+    sql, params = cursor.execute.call_args[0]
+    assert "lembrete_enviado_em IS NULL" in sql and "SKIP LOCKED" in sql
+    antecedencia = lembretes_whatsapp.ANTECEDENCIA.total_seconds()
+    janela = lembretes_whatsapp.JANELA.total_seconds()
+    assert params[1:3] == (antecedencia - janela, antecedencia + janela)
+    # Travas vencidas também respeitam o limite de tentativas
+    assert sql.count("lembrete_tentativas < %s") == 2
+    assert params[3:5] == (lembretes_whatsapp.MAX_TENTATIVAS_LEMBRETE,) * 2
+    conn.commit.assert_called_once()
+
+
+def test_sem_credenciais_nao_reserva_agendamentos():
+    with patch('Back_end.lembretes_whatsapp.get_whatsapp_api', side_effect=ValueError("sem token")), \
+         patch('Back_end.lembretes_whatsapp._reservar_lembretes') as mock_reservar:
+        assert lembretes_whatsapp.enviar_lembretes_diarios() is None
+    mock_reservar.assert_not_called()
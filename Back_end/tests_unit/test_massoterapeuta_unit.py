@@ -34,3 +34,30 @@ def test_listar_massoterapeutas_returns_list(mock_get_conn):
     from Back_end.massoterapeuta import listar_massoterapeutas
     res = listar_massoterapeutas()
     assert isinstance(res, list)
+
+
+def test_buscar_paciente_com_historico_uma_consulta():
+    # Histórico agregado no banco: uma única ida ao banco, mesmo formato de resposta
+    from datetime import datetime, date
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [{
+        'id': 3, 'nome': 'Ana', 'telefone': '11', 'email': 'a@x.com', 'sexo': 'F',
+        'data_nascimento': date(1990, 1, 1), 'created_at': datetime(2024, 1, 1),
+        'agendamentos_futuros': [{'id': 9, 'data_hora': '2030-01-07T13:00:00+00:00', 'sintomas': None,
+                                  'status': 'confirmado', 'criado_em': '2029-12-01T10:00:00', 'periodo': 'futuro'}],
+        'agendamentos_passados': [],
+        'total_sessoes': 1, 'sessoes_futuras': 1, 'sessoes_passadas': 0,
+    }]
+    mock_conn.cursor.return_value = mock_cursor
+
+    with patch('Back_end.massoterapeuta.get_connection', return_value=mock_conn):
+        from Back_end.massoterapeuta import buscar_paciente_com_historico
+        res = buscar_paciente_com_historico(1, 'ana', limite=5)
+
+    assert mock_cursor.execute.call_count == 1
+    assert mock_cursor.execute.call_args[0][1] == (1, '%ana%', 'ana', 5)
+    paciente = res['pacientes'][0]
+    assert res['total_encontrados'] == 1
+    assert paciente['agendamentos_futuros'][0]['data_hora'] == datetime.fromisoformat('2030-01-07T13:00:00+00:00')
+    assert paciente['sessoes_futuras'] == 1 and paciente['agendamentos_passados'] == []
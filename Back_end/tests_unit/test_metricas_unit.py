@@ -0,0 +1,70 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from Back_end import metricas
+from Back_end.database import PooledConnection
+
+
+def test_agregar_soma_arquivos_de_todos_os_processos(tmp_path):
+    registro = metricas.RegistroMetricas(diretorio=str(tmp_path), intervalo_gravacao=3600)
+    registro.observar_requisicao("GET", "/api/x", 200, 0.02, 0.01, {"sendgrid": [0.3, 1]})
+    # Arquivo de outro worker
+    outro = metricas._registro_vazio()
+    metricas._observar(outro["latencia"], "GET|/api/x", 2.0)
+    metricas._observar(outro["banco"], "GET|/api/x", 0.0)
+    outro["requisicoes"]["GET|/api/x|500"] = 1
+    (tmp_path / "metricas_999999.json").write_text(json.dumps(outro))
+
+    total = registro.agregar()
+    assert total["requisicoes"] == {"GET|/api/x|200": 1, "GET|/api/x|500": 1}
+    assert total["latencia"]["GET|/api/x"]["contagem"] == 2
+    assert total["provedores"]["GET|/api/x|sendgrid"] == {"soma": 0.3, "contagem": 1}
+
+    texto = metricas.formatar_prometheus(total)
+    assert 'http_requests_total{method="GET",endpoint="/api/x",status="500"} 1' in texto
+    assert 'http_request_duration_seconds_bucket{method="GET",endpoint="/api/x",le="0.025"} 1' in texto
+    assert 'http_request_duration_seconds_bucket{method="GET",endpoint="/api/x",le="+Inf"} 2' in texto
+    assert 'http_request_provider_calls_total{method="GET",endpoint="/api/x",provider="sendgrid"} 1' in texto
+
+    registro.limpar()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cursor_cronometrado_soma_tempo_de_banco():
+    conn_real = MagicMock()
+    conn = PooledConnection(MagicMock(), MagicMock(conn=conn_real))
+    medicao = metricas.MedicaoRequisicao()
+    token = metricas._medicao_atual.set(medicao)
+    try:
+        with patch("Back_end.database.time.perf_counter", side_effect=[1.0, 1.25]):
+            conn.cursor().execute("SELECT 1")
+    finally:
+        metricas._medicao_atual.reset(token)
+    conn_real.cursor.return_value.execute.assert_called_once_with("SELECT 1", None)
+    assert medicao.tempo_banco == 0.25
+
+
+def test_rota_metrics_registra_requisicoes_por_regra(tmp_path):
+    from Back_end import app
+    registro = metricas.RegistroMetricas(diretorio=str(tmp_path))
+    with patch.object(metricas, "registro", registro):
+        cliente = app.app.test_client()
+        cliente.get("/")
+        resposta = cliente.get("/metrics")
+    assert resposta.status_code == 200
+    assert 'http_requests_total{method="GET",endpoint="/",status="200"} 1' in resposta.get_data(as_text=True)
+
+
+def test_worker_que_sai_soma_contadores_em_arquivo_unico(tmp_path):
+    registro = metricas.RegistroMetricas(diretorio=str(tmp_path), intervalo_gravacao=3600)
+    # Dois "workers" saindo em sequência (max_requests)
+    for status in (200, 500):
+        registro.observar_requisicao("GET", "/api/x", status, 0.02, 0.01, {})
+        registro.gravar()
+        registro.encerrar_processo()
+
+    arquivos = sorted(p.name for p in tmp_path.iterdir())
+    assert arquivos == [metricas.ARQUIVO_ENCERRADOS, metricas.ARQUIVO_LOCK]
+    total = registro.agregar()
+    assert total["requisicoes"] == {"GET|/api/x|200": 1, "GET|/api/x|500": 1}
+    assert total["latencia"]["GET|/api/x"]["contagem"] == 2
@@ -0,0 +1,48 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from Back_end import migrate
+
+
+def test_descobrir_migracoes_ordenadas():
+    migracoes = migrate.descobrir_migracoes()
+    versoes = [m.versao for m in migracoes]
+    assert versoes == sorted(versoes)
+    assert versoes[:2] == [1, 2]
+    # Índices CONCURRENTLY não podem rodar dentro de transação
+    assert migracoes[0].transacional is True
+    assert migracoes[1].transacional is False
+
+
+def test_separar_comandos_ignora_comentarios():
+    sql = "-- comentário;\nCREATE INDEX a ON t (x);\n\nCREATE INDEX b\n    ON t (y);\n"
+    assert migrate.separar_comandos(sql) == ["CREATE INDEX a ON t (x)", "CREATE INDEX b\n    ON t (y)"]
+
+
+def test_verificar_indices_aponta_ausentes_e_invalidos():
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = [("idx_cliente_email", True), ("idx_cliente_telefone", False)]
+    problemas = migrate.verificar_indices(conn, {
+        "idx_cliente_email": "cliente",
+        "idx_cliente_telefone": "cliente",
+        "idx_massoterapeuta_email": "massoterapeuta",
+    })
+    assert len(problemas) == 2
+    assert any("ausente: idx_massoterapeuta_email" in p for p in problemas)
+    assert any("inválido: idx_cliente_telefone" in p for p in problemas)
+
+
+def test_check_falha_quando_falta_indice():
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = []
+    with patch('Back_end.migrate.get_connection', return_value=conn):
+        assert migrate.main(["check"]) == 1
+
+
+def test_migrar_aplica_so_pendentes():
+    conn = MagicMock()
+    conn.autocommit = False
+    conn.cursor.return_value.fetchall.return_value = [(1,)]
+    with patch('Back_end.migrate.aplicar_migracao') as mock_aplicar:
+        aplicadas = migrate.migrar(conn)
+    assert [m.versao for m in aplicadas] == [m.versao for m in migrate.descobrir_migracoes()[1:]]
+    assert mock_aplicar.call_count == len(aplicadas)
@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from Back_end import outbox, outbox_worker
+from Back_end.config import settings
+
+
+def test_enfileirar_usa_cursor_da_transacao():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (11,)
+    assert outbox.enfileirar_email(cursor, "a@x.com", "Assunto", "Corpo", tipo="teste") == 11
+    sql, params = cursor.execute.call_args[0]
+    assert "INSERT INTO email_outbox" in sql
+    assert params == ("a@x.com", "Assunto", "Corpo", "teste")
+
+
+def test_backoff_cresce_e_tem_teto():
+    with patch('Back_end.outbox.random.uniform', return_value=1.0):
+        assert outbox.atraso_nova_tentativa(1) == outbox.BACKOFF_BASE_SEGUNDOS
+        assert outbox.atraso_nova_tentativa(2) == 2 * outbox.BACKOFF_BASE_SEGUNDOS
+        assert outbox.atraso_nova_tentativa(50) == outbox.BACKOFF_MAX_SEGUNDOS
+
+
+def test_marcar_falha_vira_dead_letter_no_limite():
+    conn = MagicMock()
+    assert outbox.marcar_falha(conn, 1, 1, "timeout") == outbox.STATUS_PENDENTE
+    assert outbox.marcar_falha(conn, 1, outbox.MAX_TENTATIVAS, "timeout") == outbox.STATUS_FALHOU
+
+
+def test_processar_lote_registra_sucesso_e_falha():
+    lote = [(1, "a@x.com", "A", "corpo", 1), (2, "b@x.com", "B", "corpo", 3)]
+    enviar = MagicMock(side_effect=[None, RuntimeError("Status 500")])
+    with patch('Back_end.outbox_worker.get_connection', return_value=MagicMock()), \
+         patch('Back_end.outbox.reservar_lote', return_value=lote), \
+         patch('Back_end.outbox.marcar_enviado') as mock_enviado, \
+         patch('Back_end.outbox.marcar_falha', return_value=outbox.STATUS_PENDENTE) as mock_falha:
+        assert outbox_worker.processar_lote(enviar=enviar) == 2
+    assert mock_enviado.call_args[0][1] == 1
+    assert mock_falha.call_args[0][1:3] == (2, 3)
+
+
+def test_contato_responde_sem_esperar_o_provedor():
+    from Back_end.app import app
+    from Back_end import rota_contato
+    dados = {"nome": "Ana", "email": "ana@x.com", "assunto": "Dúvida", "mensagem": "Olá"}
+    with app.test_request_context('/api/contato', method='POST', json=dados), \
+         patch('Back_end.rota_contato.enfileirar_email_avulso', return_value=5) as mock_fila, \
+         patch('Back_end.email_api.send_email') as mock_envio:
+        resposta, status = rota_contato.enviar_mensagem_contato()
+    assert status == 200 and resposta.get_json()["sucesso"] is True
+    assert mock_fila.call_args[0][0] == settings.email_clinica
+    mock_envio.assert_not_called()
+
+
+def test_cancelamento_informa_email_enfileirado():
+    from datetime import datetime
+    from Back_end import massoterapeuta
+    conn = MagicMock()
+    conn.cursor.return_value.fetchone.return_value = {
+        "id": 1, "data_hora": datetime(2030, 1, 7, 10, 0), "status": "confirmado",
+        "cliente_nome": "Ana", "cliente_email": "ana@x.com",
+        "massoterapeuta_nome": "Bia", "massoterapeuta_telefone": "11999990000",
+    }
+    with patch('Back_end.massoterapeuta.get_connection', return_value=conn), \
+         patch('Back_end.massoterapeuta.enfileirar_email', return_value=9) as mock_fila, \
+         patch('Back_end.massoterapeuta.invalidar_disponibilidade'):
+        resultado = massoterapeuta.cancelar_agendamento_com_motivo(1, 1, "Imprevisto na agenda")
+    assert resultado["email_enfileirado"] is True
+    assert resultado["email_enviado"] is True  # chave antiga mantida por uma versão
+    assert mock_fila.call_args[0][1] == "ana@x.com"
+    conn.commit.assert_called_once()
+
+
+def test_trava_vencida_apos_ultima_tentativa_vai_para_falhou():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.rowcount = 1
+    cursor.fetchall.return_value = []
+    assert outbox.reservar_lote(conn, 10) == []
+    (sql_varredura, params_varredura), (sql_reserva, params_reserva) = [c[0] for c in cursor.execute.call_args_list]
+    # Esgotou as tentativas com a trava vencida: dead letter em vez de nova reserva
+    assert "SET status = 'falhou'" in sql_varredura and "tentativas >= %s" in sql_varredura
+    assert params_varredura == (outbox.MAX_TENTATIVAS,)
+    assert "travado_ate < NOW() AND tentativas < %s" in sql_reserva
+    assert params_reserva[1:] == (outbox.MAX_TENTATIVAS, 10)
+    conn.commit.assert_called_once()
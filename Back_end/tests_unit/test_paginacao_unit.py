@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from datetime import datetime, timezone, timedelta
+
+from Back_end import paginacao
+from Back_end.paginacao import ParametroPaginacaoInvalido
+
+
+def test_cursor_ida_e_volta_com_datetime():
+    chave = (datetime(2030, 1, 7, 13, 0, tzinfo=timezone.utc), 42)
+    cursor = paginacao.codificar_cursor(*chave)
+    assert paginacao.decodificar_cursor(cursor, (datetime, int)) == chave
+
+
+def test_cursor_adulterado_e_rejeitado():
+    with pytest.raises(ParametroPaginacaoInvalido):
+        paginacao.decodificar_cursor("nao-e-um-cursor", (str, int))
+    with pytest.raises(ParametroPaginacaoInvalido):
+        paginacao.decodificar_cursor(paginacao.codificar_cursor("Ana", "1"), (str, int))
+
+
+def test_limite_padrao_e_maximo():
+    assert paginacao.ler_limite(None) == paginacao.LIMITE_PADRAO
+    assert paginacao.ler_limite("100000") == paginacao.LIMITE_MAXIMO
+    with pytest.raises(ParametroPaginacaoInvalido):
+        paginacao.ler_limite("0")
+
+
+def test_montar_pagina_usa_linha_extra_para_proximo_cursor():
+    linhas = [{"nome": n, "id": i} for i, n in enumerate(["Ana", "Bia", "Caio"])]
+    itens, proximo = paginacao.montar_pagina(linhas, 2, lambda c: (c["nome"], c["id"]))
+    assert [c["nome"] for c in itens] == ["Ana", "Bia"]
+    assert paginacao.decodificar_cursor(proximo, (str, int)) == ("Bia", 1)
+    itens, proximo = paginacao.montar_pagina(linhas, 3, lambda c: (c["nome"], c["id"]))
+    assert len(itens) == 3 and proximo is None
+
+
+def test_listar_clientes_aplica_after_e_limit():
+    from Back_end import massoterapeuta
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = []
+    with patch('Back_end.massoterapeuta.get_connection', return_value=conn):
+        massoterapeuta.listar_clientes(after=("Bia", 1), limit=3)
+    sql, params = conn.cursor.return_value.execute.call_args[0]
+    assert "(nome, id) > (%s, %s)" in sql and "ORDER BY nome ASC, id ASC" in sql
+    assert params == ["Bia", 1, 3]
+
+
+def test_rota_agendamentos_envia_cursor_nos_cabecalhos():
+    from Back_end.app import app
+    from Back_end import rota_massoterapeuta
+    base = datetime(2030, 1, 7, 13, 0, tzinfo=timezone.utc)
+    linhas = [
+        {"id": 10 - i, "cliente_id": 1, "cliente_nome": "Ana", "data_hora": base - timedelta(hours=i),
+         "sintomas": None, "status": "confirmado", "criado_em": base}
+        for i in range(3)
+    ]
+    with app.test_request_context('/api/massoterapeuta/agendamentos?limit=2'), \
+         patch('Back_end.rota_massoterapeuta.get_jwt_identity', return_value='5'), \
+         patch('Back_end.rota_massoterapeuta.listar_agendamentos_massoterapeuta', return_value=linhas) as mock_listar:
+        # Chama a view sem o decorator de JWT
+        resposta = rota_massoterapeuta.get_agendamentos.__wrapped__()
+    mock_listar.assert_called_once_with('5', after=None, limit=3)
+    assert len(resposta.get_json()) == 2
+    proximo = resposta.headers["X-Next-Cursor"]
+    assert paginacao.decodificar_cursor(proximo, (datetime, int)) == (linhas[1]["data_hora"], 9)
+    assert 'rel="next"' in resposta.headers["Link"]
+
@@ -0,0 +1,55 @@
+import pstats
+import time
+
+from flask import Flask
+
+from Back_end import perfilador
+
+
+def _app_lenta():
+    app = Flask(__name__)
+
+    @app.route("/api/lenta")
+    def lenta():
+        time.sleep(0.03)
+        return "ok"
+
+    return app
+
+
+def test_token_assinado_expira_e_recusa_adulteracao():
+    token = perfilador.gerar_token("segredo", validade=60, agora=1000)
+    assert perfilador.token_valido(token, "segredo", agora=1030)
+    assert not perfilador.token_valido(token, "segredo", agora=1061)
+    assert not perfilador.token_valido(token, "outro", agora=1030)
+    assert not perfilador.token_valido(token.replace(".", ".0", 1), "segredo", agora=1030)
+
+
+def test_cabecalho_assinado_gera_pstats_e_informa_arquivo(tmp_path):
+    app = _app_lenta()
+    app.wsgi_app = perfilador.MiddlewarePerfil(
+        app.wsgi_app, amostragem=0, segredo="segredo", modo="cprofile", diretorio=str(tmp_path))
+    cliente = app.test_client()
+
+    assert "X-Profile-File" not in cliente.get("/api/lenta").headers
+    resposta = cliente.get("/api/lenta", headers={"X-Profile": perfilador.gerar_token("segredo")})
+
+    assert resposta.get_data(as_text=True) == "ok"
+    nome = resposta.headers["X-Profile-File"]
+    assert nome.endswith(".pstats") and "api_lenta" in nome
+    assert pstats.Stats(str(tmp_path / nome)).total_calls > 0
+    assert perfilador.listar_perfis(str(tmp_path)) == [nome]
+
+
+def test_amostragem_grava_pilhas_colapsadas_com_rotacao(tmp_path):
+    app = _app_lenta()
+    app.wsgi_app = perfilador.MiddlewarePerfil(
+        app.wsgi_app, amostragem=1.0, modo="amostragem", diretorio=str(tmp_path), max_arquivos=2)
+    cliente = app.test_client()
+    for _ in range(3):
+        cliente.get("/api/lenta")
+
+    perfis = perfilador.listar_perfis(str(tmp_path))
+    assert len(perfis) == 2 and all(n.endswith(".folded") for n in perfis)
+    conteudo = (tmp_path / perfis[0]).read_text()
+    assert "lenta" in conteudo
@@ -0,0 +1,58 @@
+import smtplib
+from unittest.mock import MagicMock
+
+from Back_end.smtp_pool import PoolSMTP
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def _pool(relogio=None, **kwargs):
+    servidores = []
+
+    def fabrica(host, porta, timeout=None):
+        servidor = MagicMock()
+        servidor.noop.return_value = (250, b"OK")
+        servidores.append(servidor)
+        return servidor
+
+    pool = PoolSMTP("smtp.teste", 587, "u", "s", fabrica=fabrica, relogio=relogio or Relogio(), **kwargs)
+    return pool, servidores
+
+
+def test_lote_sai_pela_mesma_conexao():
+    pool, servidores = _pool()
+    for i in range(5):
+        pool.enviar("de@x.com", f"para{i}@x.com", "msg")
+    assert len(servidores) == 1
+    servidores[0].login.assert_called_once()
+    assert servidores[0].sendmail.call_count == 5
+
+
+def test_reconecta_quando_servidor_desconecta():
+    pool, servidores = _pool()
+    pool.enviar("de@x.com", "a@x.com", "msg")
+    servidores[0].sendmail.side_effect = smtplib.SMTPServerDisconnected("caiu")
+    pool.enviar("de@x.com", "b@x.com", "msg")
+    assert len(servidores) == 2
+    servidores[1].sendmail.assert_called_once_with("de@x.com", "b@x.com", "msg")
+    assert pool.estatisticas()["reconexoes"] == 1
+
+
+def test_noop_em_sessao_ociosa_e_limite_de_mensagens():
+    relogio = Relogio()
+    pool, servidores = _pool(relogio, max_mensagens=2, noop_apos=10)
+    pool.enviar("de@x.com", "a@x.com", "msg")
+    relogio.agora = 60
+    servidores[0].noop.return_value = (421, b"timeout")
+    pool.enviar("de@x.com", "b@x.com", "msg")  # NOOP falhou: nova sessão
+    assert len(servidores) == 2
+    pool.enviar("de@x.com", "c@x.com", "msg")  # segunda mensagem: sessão encerrada no limite
+    servidores[1].quit.assert_called_once()
+    pool.enviar("de@x.com", "d@x.com", "msg")
+    assert len(servidores) == 3
@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from Back_end import telefones
+
+
+def test_formatos_diferentes_viram_o_mesmo_e164():
+    for telefone in ("(11) 98765-4321", "11987654321", "5511987654321", "+55 11 98765-4321"):
+        assert telefones.normalizar_telefone(telefone) == "+5511987654321"
+    assert telefones.normalizar_telefone("123") is None
+    assert telefones.normalizar_telefone(None) is None
+
+
+def test_para_whatsapp_nao_reprocessa_e164():
+    with patch('Back_end.telefones.normalizar_telefone') as mock_normalizar:
+        assert telefones.para_whatsapp("+5511987654321") == "5511987654321"
+    mock_normalizar.assert_not_called()
+    with pytest.raises(ValueError):
+        telefones.para_whatsapp("abc")
+
+
+def test_cadastro_checa_duplicidade_pelo_e164():
+    from Back_end import cliente
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchone.side_effect = [None, (7,)]
+    with patch('Back_end.cliente.get_connection', return_value=conn):
+        resultado = cliente.cadastrar_cliente("Ana", "(11) 98765-4321", "Feminino", "1990-01-01", "a@x.com", "s")
+    assert resultado == {"erro": "Já existe uma conta com este número de telefone."}
+    assert cursor.execute.call_args[0][1] == ("+5511987654321",)
+
+
+def test_migracao_python_descoberta_e_executada():
+    from Back_end import migrate
+    migracao = next(m for m in migrate.descobrir_migracoes() if m.nome == "telefone_e164")
+    assert migracao.sql is None and migracao.transacional is True
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.return_value = [(1, "(11) 98765-4321"), (2, "invalido")]
+    migrate.aplicar_migracao(conn, migracao)
+    atualizados = cursor.executemany.call_args_list[0][0][1]
+    assert atualizados == [("+5511987654321", 1)]
+    conn.commit.assert_called_once()
@@ -0,0 +1,30 @@
+from Back_end import tempo_importacao
+
+SAIDA = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   encodings
+import time:       500 |        600 | site
+import time:       300 |        300 |     flask.json
+import time:       200 |        500 |   flask
+import time:      1000 |       1500 | Back_end.app
+"""
+
+
+def test_interpretar_descarta_inicializacao_do_interpretador():
+    importacoes = tempo_importacao.interpretar(SAIDA)
+    assert [i.modulo for i in importacoes] == ["flask.json", "flask", "Back_end.app"]
+    assert importacoes[-1].profundidade == 0
+    assert importacoes[0].profundidade == 2
+
+
+def test_resumir_agrupa_por_pacote():
+    resumo = tempo_importacao.resumir(tempo_importacao.interpretar(SAIDA), top=1)
+    assert resumo["total_ms"] == 1.5
+    assert resumo["pacotes"] == [("Back_end", 1.0)]
+    assert resumo["modulos"] == [("Back_end.app", 1.0)]
+
+
+def test_app_nao_importa_dependencias_pesadas_na_inicializacao():
+    importacoes = tempo_importacao.medir("Back_end.app")
+    modulos = {i.modulo for i in importacoes}
+    assert "Back_end.app" in modulos
+    assert not {"requests", "phonenumbers", "email.mime.multipart", "smtplib", "pytz"} & modulos
@@ -0,0 +1,124 @@
+from unittest.mock import patch, MagicMock
+
+from Back_end import whatsapp_webhook
+from Back_end.whatsapp_api import extrair_eventos
+
+PAYLOAD_LOTE = {
+    "entry": [
+        {"changes": [{"value": {
+            "contacts": [{"wa_id": "5511900000001", "profile": {"name": "Ana"}},
+                         {"wa_id": "5511900000002", "profile": {"name": "Bia"}}],
+            "messages": [
+                {"id": "wamid.1", "from": "5511900000001", "type": "text", "text": {"body": "oi"}, "timestamp": "1700000000"},
+                {"id": "wamid.2", "from": "5511900000002", "type": "text", "text": {"body": "Quero remarcar"}, "timestamp": "1700000001"},
+            ],
+        }}]},
+        {"changes": [{"value": {
+            "statuses": [{"id": "wamid.9", "status": "failed", "recipient_id": "5511900000003",
+                          "errors": [{"code": 131026, "title": "Message undeliverable"}]}],
+        }}]},
+    ]
+}
+
+
+def test_extrai_todas_as_mensagens_e_status_do_lote():
+    eventos = extrair_eventos(PAYLOAD_LOTE)
+    assert [e["evento_id"] for e in eventos] == ["wamid.1", "wamid.2", "wamid.9:failed"]
+    assert eventos[1]["contact_name"] == "Bia"
+
+
+def test_processar_payload_ignora_eventos_ja_processados():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    # wamid.1 já processado (conflito), os demais são novos
+    cursor.fetchone.side_effect = [None, ("wamid.2",), ("wamid.9:failed",)]
+    whatsapp = MagicMock()
+    with patch('Back_end.whatsapp_webhook.get_whatsapp_api', return_value=whatsapp):
+        assert whatsapp_webhook.processar_payload(conn, PAYLOAD_LOTE) == 2
+    whatsapp.send_message.assert_not_called()  # a saudação era o evento repetido
+    sql, params = cursor.execute.call_args[0]
+    assert "lembrete_message_id" in sql and params == ("Message undeliverable", "wamid.9")
+
+
+def test_webhook_so_enfileira_e_responde():
+    from flask import Flask
+    from Back_end.rota_whatsapp import rota_whatsapp
+    app = Flask(__name__)
+    app.register_blueprint(rota_whatsapp)
+    whatsapp = MagicMock()
+    whatsapp.verify_signature.return_value = True
+    with patch('Back_end.rota_whatsapp.get_whatsapp_api', return_value=whatsapp), \
+         patch('Back_end.rota_whatsapp.enfileirar_webhook', return_value=1) as mock_fila:
+        resposta = app.test_client().post('/api/whatsapp/webhook', json=PAYLOAD_LOTE)
+    assert resposta.status_code == 200
+    mock_fila.assert_called_once()
+    whatsapp.send_message.assert_not_called()
+
+
+class ConexaoDedup:
+    """Simula whatsapp_evento_processado: inserts pendentes só valem após o commit."""
+
+    def __init__(self):
+        self.confirmados = set()
+        self.pendentes = set()
+        self._resultado = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self._resultado = None
+        if "whatsapp_evento_processado" in sql:
+            evento_id = params[0]
+            if evento_id not in self.confirmados | self.pendentes:
+                self.pendentes.add(evento_id)
+                self._resultado = (evento_id,)
+
+    def fetchone(self):
+        return self._resultado
+
+    def commit(self):
+        self.confirmados |= self.pendentes
+        self.pendentes = set()
+
+    def rollback(self):
+        self.pendentes = set()
+
+    def close(self):
+        pass
+
+
+def test_falha_no_segundo_evento_nao_reenvia_a_primeira_saudacao():
+    conn = ConexaoDedup()
+    whatsapp = MagicMock()
+    falhas = [RuntimeError("falha no segundo evento")]
+
+    def tratar_status(cursor, evento):
+        if falhas:
+            raise falhas.pop()
+
+    with patch('Back_end.whatsapp_webhook.get_whatsapp_api', return_value=whatsapp), \
+         patch.dict(whatsapp_webhook.TRATADORES, {'status': tratar_status}):
+        try:
+            whatsapp_webhook.processar_payload(conn, PAYLOAD_LOTE)
+        except RuntimeError:
+            conn.rollback()  # como em processar_lote
+        # Nova tentativa da mesma entrega
+        assert whatsapp_webhook.processar_payload(conn, PAYLOAD_LOTE) == 1
+
+    whatsapp.send_message.assert_called_once()
+    assert conn.confirmados == {"wamid.1", "wamid.2", "wamid.9:failed"}
+
+
+def test_entrega_que_trava_o_worker_na_ultima_tentativa_vai_para_falhou():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.rowcount = 1
+    cursor.fetchall.return_value = []
+    assert whatsapp_webhook._reservar(conn, 10) == []
+    (sql_varredura, params_varredura), (sql_reserva, params_reserva) = [c[0] for c in cursor.execute.call_args_list]
+    assert "SET status = 'falhou'" in sql_varredura and "tentativas >= %s" in sql_varredura
+    assert params_varredura == (whatsapp_webhook.MAX_TENTATIVAS,)
+    assert "travado_ate < NOW() AND tentativas < %s" in sql_reserva
+    assert params_reserva[1:] == (whatsapp_webhook.MAX_TENTATIVAS, 10)
+    conn.commit.assert_called_once()
@@ -9,20 +9,15 @@ Funcionalidades:
 - Tratamento de respostas
 """
 
-import os
 import json
-import requests
 import hmac
 import hashlib
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-import phonenumbers
-from phonenumbers import NumberParseException
-from dotenv import load_dotenv
-
-# Carrega variáveis de ambiente
-load_dotenv(dotenv_path='../.env')
+from typing import Dict, Any, List, Optional
+from Back_end import http_client
+from Back_end.config import settings
+from Back_end.telefones import para_whatsapp
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -35,10 +30,10 @@ class WhatsAppCloudAPI:
     
     def __init__(self):
         """Inicializa a classe com configurações da API"""
-        self.access_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
-        self.phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
-        self.webhook_verify_token = os.getenv('WHATSAPP_WEBHOOK_VERIFY_TOKEN')
-        self.app_secret = os.getenv('FACEBOOK_APP_SECRET')
+        self.access_token = settings.whatsapp_access_token
+        self.phone_number_id = settings.whatsapp_phone_number_id
+        self.webhook_verify_token = settings.whatsapp_webhook_verify_token
+        self.app_secret = settings.facebook_app_secret
         
         if not all([self.access_token, self.phone_number_id]):
             raise ValueError("Variáveis de ambiente WHATSAPP_ACCESS_TOKEN e WHATSAPP_PHONE_NUMBER_ID são obrigatórias")
@@ -58,25 +53,9 @@ class WhatsAppCloudAPI:
             Número formatado no padrão internacional (55XXXXXXXXXXX)
         """
         try:
-            # Remove caracteres não numéricos
-            clean_phone = ''.join(filter(str.isdigit, phone))
-            
-            # Se não tem código do país, adiciona Brasil (55)
-            if len(clean_phone) == 11 and clean_phone.startswith('9'):
-                clean_phone = '55' + clean_phone
-            elif len(clean_phone) == 10:
-                clean_phone = '559' + clean_phone
-            elif not clean_phone.startswith('55'):
-                clean_phone = '55' + clean_phone
-            
-            # Validação usando phonenumbers
-            parsed_number = phonenumbers.parse(f"+{clean_phone}", None)
-            if phonenumbers.is_valid_number(parsed_number):
-                return clean_phone
-            else:
-                raise ValueError(f"Número de telefone inválido: {phone}")
-                
-        except (NumberParseException, ValueError) as e:
+            # E.164 lido do banco passa direto; números avulsos usam o cache LRU do parser
+            return para_whatsapp(phone)
+        except ValueError as e:
             logger.error(f"Erro ao formatar telefone {phone}: {e}")
             raise ValueError(f"Formato de telefone inválido: {phone}")
     
@@ -88,12 +67,15 @@ class WhatsAppCloudAPI:
         Returns:
             Resposta da API
         """
+        import requests  # Já carregado pelo http_client no primeiro envio
         try:
-            response = requests.post(
+            # Cliente compartilhado: conexão keep-alive com graph.facebook.com,
+            # timeouts explícitos e novas tentativas em 429/5xx
+            response = http_client.post(
                 self.api_url,
+                "whatsapp",
                 headers=self.headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             response_data = response.json()
@@ -355,31 +337,63 @@ Você tem um agendamento amanhã:
         Returns:
             Dados processados da mensagem
         """
+        # Compatibilidade: primeira mensagem do lote (o worker usa extrair_eventos)
         try:
-            # Extrai dados da mensagem
-            entry = webhook_data.get('entry', [{}])[0]
-            changes = entry.get('changes', [{}])[0]
-            value = changes.get('value', {})
-            
-            if 'messages' in value:
-                message = value['messages'][0]
-                contact = value.get('contacts', [{}])[0]
-                
-                return {
-                    'message_id': message.get('id'),
-                    'from_number': message.get('from'),
-                    'contact_name': contact.get('profile', {}).get('name'),
-                    'message_type': message.get('type'),
-                    'text': message.get('text', {}).get('body'),
-                    'timestamp': datetime.fromtimestamp(int(message.get('timestamp')))
-                }
-            
+            for evento in extrair_eventos(webhook_data):
+                if evento['tipo'] == 'mensagem':
+                    return {chave: valor for chave, valor in evento.items() if chave not in ('tipo', 'evento_id')}
             return {}
             
         except Exception as e:
             logger.error(f"Erro ao processar mensagem do webhook: {e}")
             return {}
 
+def _data_do_timestamp(timestamp):
+    try:
+        return datetime.fromtimestamp(int(timestamp))
+    except (TypeError, ValueError):
+        return None
+
+def extrair_eventos(webhook_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Lista todas as mensagens e atualizações de status de um webhook
+    A Meta agrupa várias entries/changes/mensagens na mesma entrega.
+    Args:
+        webhook_data: Corpo JSON recebido no webhook
+    Returns:
+        Eventos com 'tipo' ('mensagem' ou 'status') e 'evento_id' (chave de deduplicação)
+    """
+    eventos = []
+    for entry in webhook_data.get('entry') or []:
+        for change in entry.get('changes') or []:
+            value = change.get('value') or {}
+            contatos = {
+                contato.get('wa_id'): contato.get('profile', {}).get('name')
+                for contato in value.get('contacts') or []
+            }
+            for message in value.get('messages') or []:
+                eventos.append({
+                    'tipo': 'mensagem',
+                    'evento_id': message.get('id'),
+                    'message_id': message.get('id'),
+                    'from_number': message.get('from'),
+                    'contact_name': contatos.get(message.get('from')),
+                    'message_type': message.get('type'),
+                    'text': (message.get('text') or {}).get('body'),
+                    'timestamp': _data_do_timestamp(message.get('timestamp'))
+                })
+            for status in value.get('statuses') or []:
+                eventos.append({
+                    'tipo': 'status',
+                    'evento_id': f"{status.get('id')}:{status.get('status')}",
+                    'message_id': status.get('id'),
+                    'status': status.get('status'),
+                    'recipient_id': status.get('recipient_id'),
+                    'errors': status.get('errors') or [],
+                    'timestamp': _data_do_timestamp(status.get('timestamp'))
+                })
+    return [evento for evento in eventos if evento['message_id']]
+
 # Instância global da API (singleton pattern)  
 # Criada sob demanda para evitar erro na importação
 whatsapp_api = None
@@ -0,0 +1,266 @@
+"""
+Fila e worker dos webhooks do WhatsApp
+
+O endpoint POST /api/whatsapp/webhook só confere a assinatura, grava o
+corpo em whatsapp_webhook_fila e responde 200 (a Meta espera resposta
+rápida e reenvia o que não for confirmado). Este worker processa cada
+entrega: todas as entries, changes, mensagens e atualizações de status,
+não só a primeira. Cada evento é registrado em whatsapp_evento_processado
+na mesma transação do seu tratamento, confirmada evento a evento: se um
+evento posterior falhar, os anteriores (e as respostas já enviadas) não
+são refeitos quando a entrega volta da fila. Reentregas da Meta são
+ignoradas.
+
+Uso:
+    python -m Back_end.whatsapp_webhook        # processa a fila continuamente
+    python -m Back_end.whatsapp_webhook once   # processa o que está pendente e sai
+"""
+
+import json
+import os
+import sys
+import threading
+
+from Back_end.database import get_connection
+from Back_end.whatsapp_api import extrair_eventos, get_whatsapp_api
+
+# ===== CONFIGURAÇÕES =====
+INTERVALO_SEGUNDOS = float(os.getenv("WHATSAPP_WEBHOOK_INTERVALO", "2"))
+TAMANHO_LOTE = int(os.getenv("WHATSAPP_WEBHOOK_LOTE", "20"))
+MAX_TENTATIVAS = int(os.getenv("WHATSAPP_WEBHOOK_MAX_TENTATIVAS", "5"))
+TRAVA_SEGUNDOS = int(os.getenv("WHATSAPP_WEBHOOK_TRAVA_SEGUNDOS", "120"))
+
+SAUDACOES = ('oi', 'olá', 'hello')
+RESPOSTA_SAUDACAO = "Olá! Obrigado por entrar em contato. Em breve nossa equipe retornará sua mensagem! 😊"
+
+
+def enfileirar_webhook(payload):
+    """
+    Grava o corpo do webhook na fila. Retorna o id, ou None se o banco
+    falhar (o endpoint responde erro e a Meta reenvia).
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO whatsapp_webhook_fila (payload) VALUES (%s::jsonb) RETURNING id",
+            (payload if isinstance(payload, str) else json.dumps(payload),),
+        )
+        webhook_id = cursor.fetchone()[0]
+        conn.commit()
+        return webhook_id
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao enfileirar webhook do WhatsApp: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+# ===== TRATAMENTO DOS EVENTOS =====
+def tratar_mensagem(cursor, evento):
+    """Mensagem recebida de um cliente: log e resposta automática a saudações."""
+    print(f"📩 WhatsApp: mensagem de {evento['from_number']}: {evento.get('text')}")
+    if (evento.get('text') or '').strip().lower() in SAUDACOES:
+        get_whatsapp_api().send_message(evento['from_number'], RESPOSTA_SAUDACAO)
+
+
+def tratar_status(cursor, evento):
+    """Status de uma mensagem enviada: lembrete não entregue volta a ser 'falhou'."""
+    if evento['status'] != 'failed':
+        return
+    erro = "; ".join(str(e.get('title') or e.get('code')) for e in evento['errors']) or "falha na entrega"
+    cursor.execute("""
+        UPDATE agendamento
+        SET lembrete_status = 'falhou', lembrete_enviado_em = NULL, lembrete_ultimo_erro = %s
+        WHERE lembrete_message_id = %s
+    """, (erro[:1000], evento['message_id']))
+
+
+TRATADORES = {
+    'mensagem': tratar_mensagem,
+    'status': tratar_status,
+}
+
+
+def processar_payload(conn, payload):
+    """
+    Trata todos os eventos de uma entrega, pulando os já processados.
+    Cada evento tratado é confirmado (commit) antes do próximo. Levanta
+    exceção se algum tratamento falhar: só o evento que falhou é desfeito
+    e a entrega volta para a fila. Retorna quantos eventos foram tratados.
+    """
+    tratados = 0
+    cursor = conn.cursor()
+    try:
+        for evento in extrair_eventos(payload):
+            cursor.execute("""
+                INSERT INTO whatsapp_evento_processado (evento_id, tipo)
+                VALUES (%s, %s)
+                ON CONFLICT (evento_id) DO NOTHING
+                RETURNING evento_id
+            """, (evento['evento_id'], evento['tipo']))
+            if cursor.fetchone() is None:
+                continue  # Reentrega: já tratado
+            TRATADORES[evento['tipo']](cursor, evento)
+            # Confirma já: uma falha num evento seguinte não pode desfazer
+            # este registro (a saudação seria reenviada na nova tentativa)
+            conn.commit()
+            tratados += 1
+        return tratados
+    finally:
+        cursor.close()
+
+
+def _reservar(conn, limite):
+    """
+    Reserva entregas pendentes e as de workers mortos (trava vencida)
+    enquanto restarem tentativas; a que venceu a trava na última tentativa
+    (derrubou ou travou o worker) vai para 'falhou'.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE whatsapp_webhook_fila
+            SET status = 'falhou', travado_ate = NULL,
+                ultimo_erro = 'Trava expirada na última tentativa (worker interrompido no processamento)'
+            WHERE status = 'processando' AND travado_ate < NOW() AND tentativas >= %s
+        """, (MAX_TENTATIVAS,))
+        if cursor.rowcount:
+            print(f"❌ Webhooks: {cursor.rowcount} entrega(s) desistida(s) após travar o worker na última tentativa")
+        cursor.execute("""
+            UPDATE whatsapp_webhook_fila
+            SET status = 'processando',
+                tentativas = tentativas + 1,
+                travado_ate = NOW() + make_interval(secs => %s)
+            WHERE id IN (
+                SELECT id FROM whatsapp_webhook_fila
+                WHERE status = 'pendente'
+                   OR (status = 'processando' AND travado_ate < NOW() AND tentativas < %s)
+                ORDER BY recebido_em
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, payload, tentativas
+        """, (TRAVA_SEGUNDOS, MAX_TENTATIVAS, limite))
+        lote = cursor.fetchall()
+        conn.commit()
+        return lote
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _finalizar(conn, webhook_id, tentativas, erro=None):
+    if erro is None:
+        status = 'processado'
+    else:
+        status = 'falhou' if tentativas >= MAX_TENTATIVAS else 'pendente'
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE whatsapp_webhook_fila
+            SET status = %s, travado_ate = NULL, ultimo_erro = %s,
+                processado_em = CASE WHEN %s = 'processado' THEN NOW() ELSE processado_em END
+            WHERE id = %s
+        """, (status, str(erro)[:1000] if erro else None, status, webhook_id))
+        conn.commit()
+    finally:
+        cursor.close()
+    return status
+
+
+def processar_lote(limite=TAMANHO_LOTE):
+    """Reserva e processa um lote de entregas. Retorna quantas foram processadas."""
+    conn = get_connection()
+    if not conn:
+        return 0
+    try:
+        lote = _reservar(conn, limite)
+        for webhook_id, payload, tentativas in lote:
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            try:
+                processar_payload(conn, payload)
+                erro = None
+            except Exception as e:
+                conn.rollback()
+                erro = e
+            status = _finalizar(conn, webhook_id, tentativas, erro)
+            if erro is not None:
+                print(f"⚠️ Webhook {webhook_id} ({status}, tentativa {tentativas}): {erro}")
+        return len(lote)
+    finally:
+        conn.close()
+
+
+def executar(parar=None, intervalo=INTERVALO_SEGUNDOS):
+    """Laço principal: drena lotes cheios em sequência e dorme quando a fila esvazia."""
+    parar = parar or threading.Event()
+    while not parar.is_set():
+        try:
+            processados = processar_lote()
+        except Exception as e:
+            print(f"Erro no worker de webhooks do WhatsApp: {e}")
+            processados = 0
+        if processados < TAMANHO_LOTE:
+            parar.wait(intervalo)
+
+
+# ===== EXECUÇÃO EM THREAD (DENTRO DO SERVIDOR WEB) =====
+_thread = None
+_parar_thread = threading.Event()
+
+
+def iniciar_em_thread():
+    """Inicia o worker como thread daemon (uma por processo)."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return _thread
+    _parar_thread.clear()
+    _thread = threading.Thread(target=executar, args=(_parar_thread,), name="whatsapp-webhook", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def parar_thread(timeout=5.0):
+    global _thread
+    _parar_thread.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    _thread = None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else "run"
+    if comando == "once":
+        total = 0
+        while True:
+            processados = processar_lote()
+            total += processados
+            if processados < TAMANHO_LOTE:
+                break
+        print(f"✅ {total} webhook(s) processado(s)")
+        return 0
+    if comando != "run":
+        print(__doc__)
+        return 2
+    print("📩 Worker de webhooks do WhatsApp iniciado")
+    try:
+        executar()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+# ===== EXECUÇÃO DIRETA =====
+if __name__ == "__main__":
+    sys.exit(main())